@@ -1,9 +1,12 @@
-from chatbot.workflow_manager import add_node, edit_node, delete_node, list_nodes
+from chatbot.workflow_manager import add_node, edit_node, delete_node, list_nodes, WORKFLOW_PATH
+from chatbot.compiled_tree import compile_file
+from chatbot.profiler import request_profiling
+from chatbot.validator import format_report, validate_file
 
 
 def main():
     print("\n=== Troubleshooting Workflow Admin ===")
-    print("Options: add | edit | delete | list | exit")
+    print("Options: add | edit | delete | list | compile | validate | profile | exit")
 
     while True:
         command = input("\n> Command: ").strip().lower()
@@ -66,12 +69,30 @@ def main():
             for n in nodes:
                 print("-", n)
 
+        elif command == "compile":
+            try:
+                print(f"Compiled tree written to {compile_file(WORKFLOW_PATH)}")
+            except Exception as e:
+                print(f"Failed to compile tree: {e}")
+
+        elif command == "validate":
+            try:
+                print(format_report(validate_file(WORKFLOW_PATH)))
+            except Exception as e:
+                print(f"Failed to check tree: {e}")
+
+        elif command == "profile":
+            # Running chatbots pick this up within a second, no restart needed
+            mode = input("Mode (sample | cprofile | off): ").strip().lower()
+            output = input("Output file (blank for profile-<pid>...): ").strip() if mode != "off" else None
+            print(request_profiling(mode, output))
+
         elif command == "exit":
             print("Exiting Admin Tool.")
             break
 
         else:
-            print("Unknown command. Use: add | edit | delete | list | exit")
+            print("Unknown command. Use: add | edit | delete | list | compile | validate | profile | exit")
 
 
 if __name__ == '__main__':
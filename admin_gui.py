@@ -1,6 +1,16 @@
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, scrolledtext
-from chatbot.workflow_manager import add_node, edit_node, delete_node, list_nodes, load_tree
+from chatbot.tk_widgets import VirtualListbox
+from chatbot.search_index import NodeSearchIndex
+from chatbot.tree_loader import TreeLoader
+
+# Search runs once typing pauses for this long
+SEARCH_DEBOUNCE_MS = 150
+# Most search results listed
+SEARCH_LIMIT = 1000
+# How often the loader's progress and results are picked up while it runs
+LOAD_POLL_MS = 50
 
 class WorkflowAdminApp(tk.Tk):
     def __init__(self):
@@ -15,6 +25,14 @@ class WorkflowAdminApp(tk.Tk):
         self.nodes = []
         self.selected_node = None
         self.tree = {}
+        self.search_index = NodeSearchIndex()
+        self._search_job = None
+        # Reads, parses and diffs the tree file off the UI thread. The tree
+        # loaded at startup is most of what this process keeps alive, and a
+        # full collection scanning it stalls the UI for a few hundred ms at
+        # 100k nodes, so it is frozen out of the collector once loaded.
+        self.loader = TreeLoader(index=self.search_index, freeze_first=True)
+        self._load_job = None
 
         self._build_ui()
         self._load_nodes()
@@ -78,15 +96,12 @@ class WorkflowAdminApp(tk.Tk):
         list_label = tk.Label(list_frame, text="📋 Available Nodes", font=('Helvetica', 16, 'bold'), fg='white', bg='#2b2b2b')
         list_label.pack(anchor='w', pady=(0,5))
 
-        self.node_listbox = tk.Listbox(list_frame, width=40, height=25, bg='#404040', fg='white',
-                                       font=('Consolas', 11), selectbackground='#0078d4', selectforeground='white',
-                                       activestyle='none', highlightthickness=0, borderwidth=0)
-        self.node_listbox.pack(side='left', fill='y')
-        self.node_listbox.bind('<<ListboxSelect>>', self._on_node_select)
-
-        scrollbar = tk.Scrollbar(list_frame, command=self.node_listbox.yview)
-        scrollbar.pack(side='right', fill='y')
-        self.node_listbox.config(yscrollcommand=scrollbar.set)
+        # Only the rows in view are materialized, so large trees refresh instantly
+        self.node_listbox = VirtualListbox(list_frame, width=40, height=25, bg='#404040', fg='white',
+                                           font=('Consolas', 11), selectbackground='#0078d4', selectforeground='white',
+                                           activestyle='none', highlightthickness=0, borderwidth=0)
+        self.node_listbox.pack(fill='both', expand=True)
+        self.node_listbox.bind('<<VirtualListSelect>>', self._on_node_select)
 
         # Buttons below node list
         btn_frame = tk.Frame(list_frame, bg="#2b2b2b")
@@ -131,6 +146,8 @@ class WorkflowAdminApp(tk.Tk):
         self.status_var = tk.StringVar(value="Status: Ready")
         status_bar = tk.Label(self, textvariable=self.status_var, font=('Helvetica', 9), fg='#28a745', bg='#2b2b2b', anchor='w')
         status_bar.pack(fill='x', side='bottom', ipady=3)
+        # Shown while a large tree loads
+        self.load_progress = ttk.Progressbar(self, orient='horizontal', mode='determinate', maximum=1.0)
 
     def _set_status(self, message, color='#28a745'):
         self.status_var.set(f"Status: {message}")
@@ -140,21 +157,82 @@ class WorkflowAdminApp(tk.Tk):
         self.children['!label'].config(fg=color)
 
     def _load_nodes(self):
-        try:
-            self.tree = load_tree()
-            self.nodes = list_nodes()
-            self._update_node_list()
+        # The loader thread reads and diffs the file; results are applied
+        # by _drain_loader on the UI thread.
+        self.loader.load()
+        self._watch_loader()
+        self._set_status("Loading nodes...")
+
+    def _save(self, method, *args, **kwargs):
+        # Edits are saved on the loader thread too; _drain_loader shows the
+        # outcome and applies the nodes it changed.
+        self.loader.edit(method, *args, **kwargs)
+        self._watch_loader()
+        self._set_status("Saving...")
+
+    def _watch_loader(self):
+        if self._load_job is None:
+            self._load_job = self.after(LOAD_POLL_MS, self._drain_loader)
+
+    def _drain_loader(self):
+        self._load_job = None
+        progress = None
+        while True:
+            try:
+                event = self.loader.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == 'progress':
+                # Only the latest progress is worth drawing
+                progress = event[1:]
+            elif kind == 'loaded':
+                progress = None
+                self._apply_load(event[1])
+            elif kind == 'indexed':
+                if self.search_var.get().strip():
+                    self._run_search()
+            elif kind == 'error':
+                progress = None
+                messagebox.showerror("Error", f"Failed to load nodes: {event[1]}")
+                self._set_status("Failed to load nodes", '#dc3545')
+            elif kind == 'saved':
+                self._apply_load(event[2])
+                messagebox.showinfo("Result", event[1], parent=self)
+            elif kind == 'save-error':
+                messagebox.showerror("Error", f"Failed to save: {event[1]}", parent=self)
+                self._set_status("Failed to save", '#dc3545')
+
+        if progress is not None:
+            stage, fraction = progress
+            if not self.load_progress.winfo_ismapped():
+                self.load_progress.pack(fill='x', side='bottom', before=self.children['!label'])
+            self.load_progress['value'] = fraction
+            self._set_status(f"Loading nodes: {stage} {fraction:.0%}")
+        if self.loader.loading or not self.loader.events.empty():
+            self._load_job = self.after(LOAD_POLL_MS, self._drain_loader)
+        else:
+            self.load_progress.pack_forget()
+
+    def _apply_load(self, diff):
+        self.tree = diff.tree
+        # Nothing to redraw when the file did not change
+        if diff:
+            self.nodes = diff.nodes
+            self._run_search()
+        # The selection survives the refresh if the node still exists
+        selected = self.node_listbox.selected
+        if not selected:
             self._clear_details()
-            self._set_status("Node list refreshed")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load nodes: {e}")
-            self._set_status("Failed to load nodes", '#dc3545')
+        elif selected != self.selected_node or selected in diff.touched:
+            self.selected_node = selected
+            self.selected_node_label.config(text=selected)
+            self._show_node_details(selected)
+        self._set_status(f"Node list refreshed ({len(diff.added)} added, "
+                         f"{len(diff.changed)} changed, {len(diff.removed)} removed)")
 
     def _update_node_list(self, filtered=None):
-        self.node_listbox.delete(0, tk.END)
-        data = filtered if filtered is not None else self.nodes
-        for node in data:
-            self.node_listbox.insert(tk.END, node)
+        self.node_listbox.set_items(filtered if filtered is not None else self.nodes)
 
     def _clear_details(self):
         self.selected_node = None
@@ -164,21 +242,32 @@ class WorkflowAdminApp(tk.Tk):
         self.details_text.config(state='disabled')
 
     def _on_search(self, *args):
-        search_term = self.search_var.get().lower()
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+            self._search_job = None
+        search_term = self.search_var.get().strip()
         if search_term:
-            filtered = [node for node in self.nodes if search_term in node.lower()]
+            # Matches ids, keywords, prompts and responses, best first
+            filtered = self.search_index.search(search_term, limit=SEARCH_LIMIT)
             self._update_node_list(filtered)
+            if len(filtered) == SEARCH_LIMIT:
+                self._set_status(f"Showing the best {SEARCH_LIMIT} matches")
+            else:
+                self._set_status(f"{len(filtered)} matching nodes")
         else:
             self._update_node_list()
 
     def _on_node_select(self, event):
-        sel = self.node_listbox.curselection()
-        if not sel:
+        node_id = self.node_listbox.selected
+        if not node_id:
             self._clear_details()
             self._set_status("No node selected")
             return
-        idx = sel[0]
-        node_id = self.node_listbox.get(idx)
         self.selected_node = node_id
         self.selected_node_label.config(text=node_id)
         self._show_node_details(node_id)
@@ -204,6 +293,11 @@ class WorkflowAdminApp(tk.Tk):
             else:
                 details += f"{key.title()}: {val}\n\n"
 
+        incoming = self.loader.incoming_edges(node_id)
+        details += f"Incoming ({len(incoming)}):\n"
+        for parent, keyword in incoming:
+            details += f"  {keyword} ← {parent}\n"
+
         self.details_text.insert(tk.END, details)
         self.details_text.config(state='disabled')
 
@@ -217,11 +311,7 @@ class WorkflowAdminApp(tk.Tk):
             response = simpledialog.askstring("Terminal Node", "Enter response text:", parent=self)
             if response is None:
                 return
-            try:
-                msg = add_node(node_id=node_id, response=response, terminal=True)
-                messagebox.showinfo("Success", msg, parent=self)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to add node: {e}", parent=self)
+            self._save('add_node', node_id=node_id, response=response, terminal=True)
         else:
             prompt = simpledialog.askstring("Non-Terminal Node", "Enter prompt text:", parent=self)
             if prompt is None:
@@ -237,13 +327,7 @@ class WorkflowAdminApp(tk.Tk):
                     if ':' in line:
                         k, v = line.split(':', 1)
                         edges[k.strip()] = v.strip()
-            try:
-                msg = add_node(node_id=node_id, prompt=prompt, edges=edges)
-                messagebox.showinfo("Success", msg, parent=self)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to add node: {e}", parent=self)
-
-        self._load_nodes()
+            self._save('add_node', node_id=node_id, prompt=prompt, edges=edges)
 
     def _edit_node(self):
         if not self.selected_node:
@@ -260,31 +344,26 @@ class WorkflowAdminApp(tk.Tk):
             return
         field = field.strip().lower()
 
-        try:
-            if field == "edges":
-                edges_text = simpledialog.askstring("Edit Edges", "Enter edges (keyword:next_node), one per line:", parent=self)
-                if edges_text is None:
-                    return
-                edges = {}
-                for line in edges_text.splitlines():
-                    if ':' in line:
-                        k, v = line.split(':', 1)
-                        edges[k.strip()] = v.strip()
-                updates = {'edges': edges}
-            elif field == "terminal":
-                val = messagebox.askyesno("Terminal Status", "Set terminal? Yes for True, No for False", parent=self)
-                updates = {'terminal': val}
-            else:
-                val = simpledialog.askstring("Edit Field", f"New value for {field}:", parent=self)
-                if val is None:
-                    return
-                updates = {field: val}
+        if field == "edges":
+            edges_text = simpledialog.askstring("Edit Edges", "Enter edges (keyword:next_node), one per line:", parent=self)
+            if edges_text is None:
+                return
+            edges = {}
+            for line in edges_text.splitlines():
+                if ':' in line:
+                    k, v = line.split(':', 1)
+                    edges[k.strip()] = v.strip()
+            updates = {'edges': edges}
+        elif field == "terminal":
+            val = messagebox.askyesno("Terminal Status", "Set terminal? Yes for True, No for False", parent=self)
+            updates = {'terminal': val}
+        else:
+            val = simpledialog.askstring("Edit Field", f"New value for {field}:", parent=self)
+            if val is None:
+                return
+            updates = {field: val}
 
-            msg = edit_node(self.selected_node, updates)
-            messagebox.showinfo("Success", msg, parent=self)
-            self._load_nodes()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to edit node: {e}", parent=self)
+        self._save('edit_node', self.selected_node, updates)
 
     def _delete_node(self):
         if not self.selected_node:
@@ -299,14 +378,7 @@ class WorkflowAdminApp(tk.Tk):
         if not confirm:
             return
 
-        try:
-            msg = delete_node(self.selected_node)
-            messagebox.showinfo("Success", msg, parent=self)
-            self.selected_node = None
-            self._load_nodes()
-            self._clear_details()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete node: {e}", parent=self)
+        self._save('delete_node', self.selected_node)
 
 if __name__ == "__main__":
     app = WorkflowAdminApp()
@@ -0,0 +1,132 @@
+"""
+Admin GUI refresh on a generated tree: how long the UI thread stalls.
+
+Before: _load_nodes parsed the file with load_tree(), parsed it again
+through list_nodes() and re-synced the search index, all on the UI thread,
+so the stall is the whole refresh. After: TreeLoader reads, parses, diffs
+and indexes on a daemon thread while a stand-in event loop on the main
+thread wakes every --tick ms and drains the loader's queue the way
+WorkflowAdminApp._drain_loader does. The stall is how late those wake-ups
+ran; the apply column is the UI-thread work per refresh. Runs headless.
+
+    python benchmarks/bench_admin_load.py [--nodes 300000] [--tick 10]
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.search_index import NodeSearchIndex
+from chatbot.tree_loader import TreeLoader
+from chatbot.virtual_list import VirtualListModel
+
+WORDS = ("check restart cable power driver signal screen noise light reset firmware router "
+         "button port adapter settings network password account device fan slow error blue").split()
+
+
+def make_tree(n, seed=3):
+    rng = random.Random(seed)
+    ids = [f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}" for i in range(n)]
+    tree = {'root': {'prompt': "What issue are you facing?", 'edges': {'start': ids[0]}}}
+    for node_id in ids:
+        if rng.random() < 0.5:
+            tree[node_id] = {'response': ' '.join(rng.choices(WORDS, k=12)) + '.', 'terminal': True}
+        else:
+            edges = {rng.choice(WORDS): ids[rng.randrange(n)] for _ in range(rng.randint(1, 3))}
+            tree[node_id] = {'prompt': ' '.join(rng.choices(WORDS, k=10)) + '?', 'edges': edges}
+    return tree
+
+
+def write(path, tree):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tree, f, indent=2)
+
+
+def old_refresh(path, index):
+    # load_tree() and list_nodes() each parsed the file, then the index re-synced.
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    with open(path, 'r', encoding='utf-8') as f:
+        nodes = list(json.load(f))
+    index.sync(tree)
+    return time.perf_counter() - start, nodes
+
+
+def new_refresh(loader, model, tick):
+    """
+    Runs one background load while ticking on the main thread; returns
+    (wall time, lateness of each tick, UI-thread apply time).
+    """
+    late = []
+    applied = 0.0
+    start = time.perf_counter()
+    loader.load()
+    done = False
+    while not done:
+        due = time.perf_counter() + tick
+        time.sleep(tick)
+        late.append(max(0.0, time.perf_counter() - due))
+        t0 = time.perf_counter()
+        while True:
+            try:
+                event = loader.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'loaded' and event[1]:
+                model.set_items(event[1].nodes)
+            elif event[0] == 'error':
+                raise RuntimeError(event[1])
+        applied += time.perf_counter() - t0
+        done = not loader.loading and loader.events.empty()
+    return time.perf_counter() - start, late, applied
+
+
+def report(label, wall, late, applied):
+    late_ms = sorted(x * 1000 for x in late)
+    p99 = late_ms[min(len(late_ms) - 1, int(len(late_ms) * 0.99))]
+    print(f"  {label:<22} {wall:7.2f} s  stall max {late_ms[-1]:6.1f} ms  p99 {p99:5.1f} ms  "
+          f"median {statistics.median(late_ms):4.1f} ms  apply {applied * 1000:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--nodes', type=int, default=300000)
+    parser.add_argument('--tick', type=float, default=10, help="event loop wake-up interval, ms")
+    args = parser.parse_args()
+    tick = args.tick / 1000
+
+    tree = make_tree(args.nodes)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tree.json')
+        write(path, tree)
+        print(f"{len(tree)} nodes, {os.path.getsize(path) / 1e6:.0f} MB")
+
+        print("Before (everything on the UI thread; the stall is the whole refresh):")
+        index = NodeSearchIndex()
+        elapsed, _ = old_refresh(path, index)
+        print(f"  {'first load':<22} stall {elapsed:7.2f} s")
+        elapsed, _ = old_refresh(path, index)
+        print(f"  {'reload, no change':<22} stall {elapsed:7.2f} s")
+        del index
+
+        print(f"After (TreeLoader thread, UI ticking every {args.tick:g} ms):")
+        loader = TreeLoader(path, index=NodeSearchIndex(), freeze_first=True)
+        model = VirtualListModel(visible_rows=30)
+        report('first load', *new_refresh(loader, model, tick))
+        report('reload, no change', *new_refresh(loader, model, tick))
+        node_id = next(iter(tree))
+        tree[node_id] = dict(tree[node_id], prompt="Edited prompt?")
+        write(path, tree)
+        report('reload, one edit', *new_refresh(loader, model, tick))
+
+
+if __name__ == '__main__':
+    main()
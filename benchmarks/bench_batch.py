@@ -0,0 +1,81 @@
+"""
+Replays synthetic helpdesk transcripts through the engine one message at a
+time (respond_for) and through respond_batch, then end to end through the
+JSONL replay used by `python -m chatbot.batch`.
+
+    python benchmarks/bench_batch.py [--messages 200000] [--users 50000]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from chatbot.batch import replay
+from chatbot.engine import ChatbotEngine
+from chatbot.session_store import MemorySessionStore
+from loadgen import FLOWS
+
+
+def make_transcript(n_messages, n_users, rng):
+    # Users interleave; each one walks a flow, sometimes with a stray message.
+    progress = {}
+    items = []
+    for _ in range(n_messages):
+        user = f"user-{rng.randrange(n_users)}"
+        flow, step = progress.get(user, (rng.choice(FLOWS), 0))
+        text = flow[step] if rng.random() > 0.1 else rng.choice(["hello", "thanks", "restart", "my keyboard is slow"])
+        progress[user] = (flow, (step + 1) % len(flow))
+        items.append((user, text))
+    return items
+
+
+def new_engine(cache_size=10000):
+    return ChatbotEngine(store=MemorySessionStore(max_sessions=10**7, ttl=None), cache_size=cache_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--chunk', type=int, default=10000)
+    args = parser.parse_args()
+
+    items = make_transcript(args.messages, args.users, random.Random(15))
+
+    n = len(items)
+    print(f"{n} messages, {args.users} users")
+    for cache_size in (0, 10000):
+        engine = new_engine(cache_size)
+        start = time.perf_counter()
+        one_by_one = [engine.respond_for(session_id, text) for session_id, text in items]
+        sequential = time.perf_counter() - start
+
+        engine = new_engine(cache_size)
+        start = time.perf_counter()
+        batched = []
+        for i in range(0, len(items), args.chunk):
+            batched.extend(engine.respond_batch(items[i:i + args.chunk]))
+        batch = time.perf_counter() - start
+        assert batched == one_by_one, "respond_batch diverged from respond_for"
+
+        label = f"result cache {cache_size}" if cache_size else "result cache off"
+        print(f"{label:<18}: respond_for loop {n / sequential:>8.0f} msg/s, "
+              f"respond_batch {n / batch:>8.0f} msg/s ({sequential / batch:.1f}x)")
+
+    lines = io.StringIO(''.join(json.dumps({'session': s, 'text': t}) + '\n' for s, t in items))
+    start = time.perf_counter()
+    replay(new_engine(), lines, io.StringIO(), args.chunk)
+    cli = time.perf_counter() - start
+
+    print(f"{'JSONL replay':<18}: {n / cli:>8.0f} msg/s (1M lines in {1e6 / (n / cli):.0f} s)")
+
+
+if __name__ == '__main__':
+    main()
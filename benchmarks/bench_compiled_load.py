@@ -0,0 +1,82 @@
+"""
+Startup cost of a generated N-node tree: json.load + WorkflowGraph versus
+mapping the compiled binary form.
+
+    python benchmarks/bench_compiled_load.py [--nodes 200000]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.compiled_tree import compile_file, load_compiled
+from chatbot.graph import WorkflowGraph
+
+
+def make_tree(n):
+    tree = {"root": {"prompt": "What issue are you facing?", "edges": {}}}
+    for i in range(n - 1):
+        if i % 3 == 2:
+            tree[f"node_{i}"] = {"response": f"Apply fix number {i} and reboot.", "terminal": True}
+        else:
+            tree[f"node_{i}"] = {
+                "prompt": f"Does step {i} help with the issue?",
+                "edges": {"yes": f"node_{i + 1}", "no": f"node_{i + 2}", "not sure": "root"},
+            }
+    return tree
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=200000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(workdir, 'tree.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(make_tree(args.nodes), f, indent=4)
+
+        start = time.perf_counter()
+        bin_path = compile_file(json_path)
+        compile_s = time.perf_counter() - start
+
+        def from_json():
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return WorkflowGraph(json.load(f))
+
+        # Map the compiled tree first, before the JSON graph's garbage is around.
+        bin_graph, bin_s, bin_peak = measure(lambda: WorkflowGraph(load_compiled(json_path)))
+        json_graph, json_s, json_peak = measure(from_json)
+
+        probe = f"node_{args.nodes // 2}"
+        assert json_graph.next_node(probe, "yes") == bin_graph.next_node(probe, "yes")
+        assert dict(json_graph.get_node(probe)) == {k: v for k, v in bin_graph.get_node(probe).items()}
+
+        print(f"{args.nodes} nodes: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, "
+              f"compiled {os.path.getsize(bin_path) / 1e6:.1f} MB in {compile_s:.2f} s")
+        print(f"  json.load + graph  {json_s * 1000:9.1f} ms  {json_peak / 1e6:8.1f} MB Python heap")
+        print(f"  mmap compiled      {bin_s * 1000:9.1f} ms  {bin_peak / 1e6:8.1f} MB Python heap")
+        bin_graph.nodes.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
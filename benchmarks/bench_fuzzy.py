@@ -0,0 +1,104 @@
+"""
+Memory and lookup latency of the SymSpell typo index at several vocabulary
+sizes, against a pairwise edit-distance scan of the whole vocabulary.
+
+    python benchmarks/bench_fuzzy.py [--sizes 1000,10000,100000] [--queries 2000]
+
+Queries are vocabulary words with one or two random edits (deletion,
+insertion, substitution or transposition) applied.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.fuzzy import SymSpellIndex, edit_distance
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))))
+    return sorted(words)
+
+
+def misspell(word, edits, rng):
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        kind = rng.choice('dist') if len(word) > 2 else 'i'
+        if kind == 'd':
+            word = word[:i] + word[i + 1:]
+        elif kind == 'i':
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+        elif kind == 's':
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        elif i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def build_index(vocabulary):
+    index = SymSpellIndex(max_distance=2)
+    for word in vocabulary:
+        index.add(word)
+    return index
+
+
+def scan(vocabulary, word, max_distance):
+    best, best_distance = None, max_distance + 1
+    for candidate in vocabulary:
+        distance = edit_distance(word, candidate, best_distance)
+        if distance < best_distance:
+            best, best_distance = candidate, distance
+    return best
+
+
+def per_query(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--scan-queries', type=int, default=20, help="queries for the (slow) pairwise scan")
+    args = parser.parse_args()
+
+    rng = random.Random(13)
+    print(f"{'keywords':>9} {'build s':>8} {'memory MB':>10} {'d=1 us':>8} {'d=2 us':>8} {'found':>6} {'scan us':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        vocabulary = make_vocabulary(size, rng)
+
+        tracemalloc.start()
+        index = build_index(vocabulary)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del index
+        # Timed separately: tracing allocations slows the build down several times.
+        start = time.perf_counter()
+        index = build_index(vocabulary)
+        build = time.perf_counter() - start
+
+        one = [misspell(rng.choice(vocabulary), 1, rng) for _ in range(args.queries)]
+        two = [misspell(rng.choice(vocabulary), 2, rng) for _ in range(args.queries)]
+        d1 = per_query(lambda w: index.lookup(w, 1), one)
+        d2 = per_query(lambda w: index.lookup(w, 2), two)
+        found = sum(index.lookup(w, 2) is not None for w in two) / len(two)
+        for word in two[:args.scan_queries]:
+            hit = index.lookup(word, 2)
+            assert (hit is None) == (scan(vocabulary, word, 2) is None), word
+        baseline = per_query(lambda w: scan(vocabulary, w, 2), two[:args.scan_queries])
+        print(f"{size:>9} {build:>8.2f} {memory / 2**20:>10.1f} {d1 * 1e6:>8.1f} {d2 * 1e6:>8.1f} "
+              f"{found:>6.0%} {baseline * 1e6:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
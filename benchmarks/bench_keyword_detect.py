@@ -0,0 +1,86 @@
+"""
+Compares the original nested-loop keyword_detect with the compiled automaton.
+The automaton timings include normalizing each message (cache cleared first).
+
+    python benchmarks/bench_keyword_detect.py [--messages 2000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.nlp_utils import _normalize_cached, build_intent_matcher, keyword_detect
+
+
+def legacy_keyword_detect(user_input, keyword_bank):
+    for intent, keywords in keyword_bank.items():
+        for keyword in keywords:
+            if keyword in user_input:
+                return intent
+    return None
+
+
+def make_bank(n_keywords, rng, keywords_per_intent=25):
+    bank = {}
+    seen = set()
+    while len(seen) < n_keywords:
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        if word in seen:
+            continue
+        seen.add(word)
+        intent = f"intent_{len(seen) // keywords_per_intent}"
+        bank.setdefault(intent, []).append(word)
+    return bank
+
+
+def make_messages(bank, n_messages, rng):
+    keywords = [kw for kws in bank.values() for kw in kws]
+    filler = ["my", "laptop", "keeps", "doing", "something", "weird", "since", "yesterday", "please", "help"]
+    messages = []
+    for i in range(n_messages):
+        words = rng.sample(filler, 6)
+        # Roughly half the messages hit a keyword, the rest fall through to fallback.
+        if i % 2 == 0:
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        messages.append(' '.join(words))
+    return messages
+
+
+def time_per_message(fn, messages):
+    start = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return (time.perf_counter() - start) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--sizes', default='10,1000,50000')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'keywords':>9} {'build ms':>9} {'loop us/msg':>12} {'automaton us/msg':>17} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        bank = make_bank(size, rng)
+        messages = make_messages(bank, args.messages, rng)
+
+        start = time.perf_counter()
+        matcher = build_intent_matcher(bank)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for message in messages:
+            assert keyword_detect(message, None, matcher) == legacy_keyword_detect(message, bank)
+
+        loop = time_per_message(lambda m: legacy_keyword_detect(m, bank), messages)
+        _normalize_cached.cache_clear()
+        auto = time_per_message(lambda m: keyword_detect(m, None, matcher), messages)
+        print(f"{size:>9} {build_ms:>9.1f} {loop * 1e6:>12.1f} {auto * 1e6:>17.1f} {loop / auto:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
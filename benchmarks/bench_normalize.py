@@ -0,0 +1,142 @@
+"""
+Runs the known false-positive corpus through ChatbotEngine.respond(), typo
+correction and retrieval included, and measures the cost of normalization
+per message, cold and from the LRU cache. Each case is judged on the stage
+it targets: the intent entered, the edge followed, the retrieval jump, or
+the fallback reply. tests/test_false_positives.py runs the same corpus.
+
+    python benchmarks/bench_normalize.py [--messages 20000]
+
+Exits non-zero if any corpus case gives the wrong result.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from chatbot.engine import ENTER, FINISH, JUMP, MOVE, SWITCH, ChatbotEngine
+from chatbot.graph import DEFAULT_WORKFLOW_PATH, WorkflowGraph
+from chatbot.nlp_utils import INTENT_KEYWORDS, _normalize_cached, normalize
+
+CORPUS_PATH = os.path.join(HERE, 'false_positive_corpus.json')
+
+# The outcomes that count as a match at each stage.
+STAGE_ACTIONS = {'intent': (ENTER, SWITCH), 'edge': (MOVE, FINISH), 'retrieval': (JUMP,)}
+
+
+class _OutcomeEngine(ChatbotEngine):
+    # Keeps the outcome of the last turn, which respond() only applies.
+    last_outcome = None
+
+    def _apply(self, session, outcome):
+        self.last_outcome = outcome
+        return super()._apply(session, outcome)
+
+
+def legacy_result(case, tree):
+    """
+    What the original substring pipeline (lower().strip() + `in`) returned.
+    """
+    text = case['input'].lower().strip()
+    if case['stage'] == 'intent':
+        for intent, keywords in INTENT_KEYWORDS.items():
+            if any(keyword in text for keyword in keywords):
+                return intent
+        return None
+    if case['stage'] == 'edge':
+        for keyword, target in tree.get(case['node'], {}).get('edges', {}).items():
+            if keyword in text:
+                return target
+        return None
+    if case['stage'] == 'retrieval':
+        # It had no retrieval stage: nothing ever jumped.
+        return None
+    for needle, answer in (("slow", "Try closing background apps and restarting. Also check for viruses."),
+                           ("blue screen", "Check for driver updates or recent hardware changes."),
+                           ("keyboard", "Try unplugging and reconnecting it. Test on another device.")):
+        if needle in text:
+            return answer
+    return "Sorry, I couldn't identify the issue clearly. Can you describe it differently?"
+
+
+def current_result(case, engine):
+    """
+    What engine.respond() makes of the case, from a fresh session at the
+    case's node: the node its stage led to (None if that stage did not
+    match), or the reply for fallback cases.
+    """
+    session = engine.new_session()
+    if case.get('node'):
+        session.current_node = case['node']
+    reply = engine.respond(case['input'], session)
+    if case['stage'] == 'fallback':
+        return reply
+    action, node_id, _ = engine.last_outcome
+    return node_id if action in STAGE_ACTIONS[case['stage']] else None
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_corpus(corpus, graph):
+    """
+    Returns (case, result) for every case engine.respond() gets wrong.
+    """
+    engine = _OutcomeEngine(graph=graph)
+    results = ((case, current_result(case, engine)) for case in corpus)
+    return [(case, got) for case, got in results if got != case['expect']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(DEFAULT_WORKFLOW_PATH, encoding='utf-8') as f:
+        tree = json.load(f)
+    corpus = load_corpus()
+    failures = check_corpus(corpus, WorkflowGraph(tree))
+    for case, got in failures:
+        print(f"FAIL [{case['stage']}] {case['input']!r}: expected {case['expect']!r}, got {got!r}")
+    legacy_wrong = sum(legacy_result(case, tree) != case['expect'] for case in corpus)
+    print(f"corpus: {len(corpus) - len(failures)}/{len(corpus)} correct now, "
+          f"{len(corpus) - legacy_wrong}/{len(corpus)} with the old substring matching")
+
+    rng = random.Random(3)
+    words = "my laptop wifi is hot and the fan keeps shutting down since i installed photoshop yesterday".split()
+    messages = [' '.join(rng.choices(words, k=8)).capitalize() + '!' for _ in range(args.messages)]
+
+    _normalize_cached.cache_clear()
+    start = time.perf_counter()
+    for message in messages:
+        normalize(message)
+    cold = (time.perf_counter() - start) / len(messages)
+
+    hot_messages = messages[:1000]
+    for message in hot_messages:
+        normalize(message)
+    start = time.perf_counter()
+    for _ in range(args.messages // len(hot_messages)):
+        for message in hot_messages:
+            normalize(message)
+    cached = (time.perf_counter() - start) / (len(hot_messages) * (args.messages // len(hot_messages)))
+
+    start = time.perf_counter()
+    for message in messages:
+        message.lower().strip()
+    baseline = (time.perf_counter() - start) / len(messages)
+
+    print(f"normalize: {cold * 1e6:.2f} us/msg cold, {cached * 1e6:.2f} us/msg cached "
+          f"(lower().strip() alone: {baseline * 1e6:.2f} us)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Cost of profiling the respond path: the same message mix with profiling
+off, under the sampling profiler at a few intervals, and under cProfile.
+
+    python benchmarks/bench_profiler.py [--turns 30000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from chatbot.engine import ChatbotEngine
+from chatbot.profiler import Profiling
+from bench_timings import best_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = ChatbotEngine(cache_size=0)
+    profiling = Profiling(engine)
+    off = best_of(engine, args.turns, args.repeat)
+    print(f"{'off':<16} {off * 1e6:7.2f} us/turn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, mode, interval in (('sample 1 ms', 'sample', 0.001), ('sample 5 ms', 'sample', 0.005),
+                                      ('sample 20 ms', 'sample', 0.02), ('cprofile', 'cprofile', None)):
+            profiler = profiling.start(mode, os.path.join(tmp, 'profile'), interval=interval)
+            on = best_of(engine, args.turns, args.repeat)
+            profiling.stop()
+            extra = f"{profiler.samples} samples" if mode == 'sample' else f"{profiler.calls} calls"
+            print(f"{label:<16} {on * 1e6:7.2f} us/turn ({on / off - 1:+.0%}, {extra})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Replays a Zipf-distributed message stream through the engine with the turn
+result cache off and at several sizes, reporting time per turn and hit ratio.
+
+    python benchmarks/bench_result_cache.py [--messages 100000] [--phrases 5000] [--zipf 1.1]
+
+Each simulated user sends a few messages drawn from the same popularity
+distribution, so cache keys also vary with where users are in the tree.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from chatbot.engine import ChatbotEngine
+from chatbot.nlp_utils import _normalize_cached
+from loadgen import FLOWS
+
+OPENERS = ["", "hi, ", "hello ", "help! ", "um ", "so ", "please help, "]
+CLOSERS = ["", ".", "!", "?", " please", " again", " since yesterday", " at work", " all the time"]
+EXTRA = ["my screen is slow", "the fan", "vents blocked", "i forgot the password", "keyboard not typing",
+         "wfii keeps dropping", "ruter lights blinking", "no display", "restart", "it's overheatting"]
+
+
+def make_phrases(n_phrases, rng):
+    base = [text for flow in FLOWS for text in flow] + EXTRA
+    phrases = list(dict.fromkeys(base))
+    variants = [o + b + c for b in base for o in OPENERS for c in CLOSERS]
+    rng.shuffle(variants)
+    for variant in variants:
+        if len(phrases) >= n_phrases:
+            break
+        if variant not in phrases:
+            phrases.append(variant)
+    # Beyond the variants, pad with one-off messages nobody else sends.
+    while len(phrases) < n_phrases:
+        phrases.append(f"{rng.choice(base)} #{len(phrases)}")
+    return phrases
+
+
+def make_replay(phrases, n_messages, s, rng):
+    weights = [1 / (rank + 1) ** s for rank in range(len(phrases))]
+    stream = rng.choices(phrases, weights, k=n_messages)
+    replay = []
+    users = itertools.count()
+    i = 0
+    while i < len(stream):
+        turns = rng.randint(1, 4)
+        replay.extend((next(users), text) for text in stream[i:i + turns])
+        i += turns
+    return replay
+
+
+def run(replay, cache_size):
+    engine = ChatbotEngine(cache_size=cache_size)
+    sessions = {}
+    _normalize_cached.cache_clear()
+    start = time.perf_counter()
+    for user, text in replay:
+        session = sessions.get(user)
+        if session is None:
+            session = sessions[user] = engine.new_session(user)
+        engine.respond(text, session)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(replay), engine.cache.stats() if engine.cache else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--phrases', type=int, default=5000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--sizes', default='0,100,1000,10000')
+    args = parser.parse_args()
+
+    rng = random.Random(14)
+    replay = make_replay(make_phrases(args.phrases, rng), args.messages, args.zipf, rng)
+    print(f"{len(replay)} messages, {args.phrases} distinct phrases, zipf s={args.zipf}")
+    baseline = None
+    for size in (int(s) for s in args.sizes.split(',')):
+        per_turn, stats = run(replay, size)
+        baseline = baseline or per_turn
+        ratio = f"hit ratio {stats['hit_ratio']:6.1%}  evictions {stats['evictions']:>7}" if stats else "cache off"
+        print(f"cache size {size:>6}: {per_turn * 1e6:7.2f} us/turn ({baseline / per_turn:4.1f}x)  {ratio}")
+
+
+if __name__ == '__main__':
+    main()
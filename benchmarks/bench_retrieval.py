@@ -0,0 +1,104 @@
+"""
+Builds the BM25 fallback index over a synthetic compiled tree and measures
+query latency, plus the cost of re-syncing it after a small edit to the
+tree: diffed against the previous version, as a reload does, and by
+walking every node, as it did before.
+
+    python benchmarks/bench_retrieval.py [--nodes 100000] [--queries 2000] [--edits 100]
+
+Runs the NumPy scorer when numpy is installed and the pure-Python one always.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.compiled_tree import CompiledTree, compile_tree
+from chatbot.graph import WorkflowGraph
+from chatbot.retrieval import BM25Index, index_graph_nodes, np
+
+VOCABULARY = """
+    laptop desktop screen display monitor keyboard mouse touchpad battery charger
+    fan vent dust heat cooling wifi router network adapter driver update restart
+    boot bios password login account printer paper toner speaker audio microphone
+    camera bluetooth usb port cable power button flicker crash freeze slow virus
+    malware disk storage memory ram cpu gpu graphics signal connection firmware
+""".split()
+
+
+def make_tree(n_nodes, rng):
+    # A Zipf-like vocabulary, as in real text: a few words are everywhere.
+    words = VOCABULARY + [f"part{i}" for i in range(n_nodes // 20)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    tree = {}
+    for i in range(n_nodes):
+        text = ' '.join(rng.choices(words, weights, k=rng.randint(6, 14)))
+        if i % 3 == 0:
+            tree[f"node_{i}"] = {'response': text, 'terminal': True}
+        else:
+            tree[f"node_{i}"] = {'prompt': text + '?', 'edges': {}}
+    return tree
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--edits', type=int, default=100, help="nodes changed before the incremental re-sync")
+    args = parser.parse_args()
+
+    rng = random.Random(12)
+    tree = make_tree(args.nodes, rng)
+    queries = [' '.join(rng.choices(VOCABULARY, k=rng.randint(2, 6))) + f" part{rng.randrange(args.nodes // 20)}"
+               for _ in range(args.queries)]
+
+    edited = dict(tree)
+    for node_id in rng.sample(sorted(tree), args.edits):
+        edited[node_id] = {'prompt': 'replace the cmos battery and reset the bios?', 'edges': {}}
+    workdir = tempfile.mkdtemp(prefix='bench-retrieval-')
+    before = CompiledTree(compile_tree(tree, os.path.join(workdir, 'before.bin')))
+    after = CompiledTree(compile_tree(edited, os.path.join(workdir, 'after.bin')))
+
+    print(f"{args.nodes} nodes, {args.queries} queries")
+    for use_numpy in ([True, False] if np is not None else [False]):
+        start = time.perf_counter()
+        index = WorkflowGraph(before, index=BM25Index(use_numpy=use_numpy)).retrieval_index()
+        build = time.perf_counter() - start
+
+        for query in queries[:50]:
+            index.search(query)  # materialize the per-term arrays
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k=3)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+        start = time.perf_counter()
+        WorkflowGraph(after, index=index).retrieval_index()
+        diffed = time.perf_counter() - start
+        start = time.perf_counter()
+        index_graph_nodes(before, index)
+        walked = time.perf_counter() - start
+
+        name = 'numpy' if use_numpy else 'python'
+        print(f"{name:>7}: build {build:6.2f} s  query p50 {percentile(latencies, 50) * 1e3:6.3f} ms  "
+              f"p99 {percentile(latencies, 99) * 1e3:6.3f} ms  re-sync after {args.edits} edits "
+              f"{diffed * 1e3:6.1f} ms diffed, {walked * 1e3:6.1f} ms walking every node")
+
+    before.close()
+    after.close()
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
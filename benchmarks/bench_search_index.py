@@ -0,0 +1,108 @@
+"""
+Admin search on a generated tree: index build time and size, re-sync with
+nothing or one node changed, and query latency for a mix of id fragments,
+keywords, prompt words, multi-word and one/two-letter queries, against the
+old linear `term in node_id.lower()` scan (which only searched ids).
+
+    python benchmarks/bench_search_index.py [--nodes 500000] [--queries 300] [--limit 1000] [--memory]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.search_index import NodeSearchIndex
+
+TOPICS = ["printer", "wifi", "battery", "display", "keyboard", "audio", "camera", "bluetooth",
+          "overheating", "storage", "update", "login", "vpn", "email", "charger", "mouse"]
+WORDS = ("check restart cable power driver signal screen noise light reset firmware router "
+         "button port adapter settings network password account device fan slow error blue "
+         "flicker paper jam toner offline sync backup disk full memory crash freeze boot").split()
+
+
+def make_tree(n, seed=3):
+    rng = random.Random(seed)
+    tree = {'root': {'prompt': "What issue are you facing?", 'edges': {}}}
+    ids = [f"{rng.choice(TOPICS)}_{rng.choice(WORDS)}_{i}" for i in range(n)]
+    for i, node_id in enumerate(ids):
+        if rng.random() < 0.5:
+            tree[node_id] = {'response': ' '.join(rng.choices(WORDS, k=12)).capitalize() + '.', 'terminal': True}
+        else:
+            edges = {' '.join(rng.choices(WORDS, k=rng.randint(1, 2))): ids[rng.randrange(n)]
+                     for _ in range(rng.randint(1, 3))}
+            tree[node_id] = {'prompt': ' '.join(rng.choices(WORDS, k=10)).capitalize() + '?', 'edges': edges}
+    return tree, ids
+
+
+def make_queries(ids, count, seed=5):
+    rng = random.Random(seed)
+    kinds = {
+        'id fragment': lambda: rng.choice(ids)[-7:],
+        'full id': lambda: rng.choice(ids),
+        'word': lambda: rng.choice(WORDS),
+        'two words': lambda: f"{rng.choice(TOPICS)} {rng.choice(WORDS)}",
+        'prefix 2': lambda: rng.choice(WORDS)[:2],
+        'no match': lambda: f"zq{rng.randrange(1000)}x",
+    }
+    return {kind: [make() for _ in range(count)] for kind, make in kinds.items()}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=500000)
+    parser.add_argument('--queries', type=int, default=300, help="queries per kind")
+    parser.add_argument('--limit', type=int, default=1000, help="results kept per query, as in the admin GUI")
+    parser.add_argument('--memory', action='store_true', help="also measure the index size (slow)")
+    args = parser.parse_args()
+
+    tree, ids = make_tree(args.nodes)
+    index = NodeSearchIndex()
+    build, _ = timed(index.sync, tree)
+    print(f"{len(tree)} nodes: build {build:.2f} s", end='')
+    if args.memory:
+        # tracemalloc slows the build several times over, so it gets its own run.
+        tracemalloc.start()
+        NodeSearchIndex().sync(tree)
+        print(f", {tracemalloc.get_traced_memory()[0] / 2**20:.0f} MiB", end='')
+        tracemalloc.stop()
+    print()
+
+    resync, _ = timed(index.sync, tree)
+    node_id = ids[len(ids) // 2]
+    tree[node_id] = dict(tree[node_id], prompt="Is the flux capacitor charged?", terminal=False, edges={'yes': 'root'})
+    one, _ = timed(index.sync, tree)
+    update, _ = timed(index.add, node_id, dict(tree[node_id], prompt="Is it charged now?"))
+    print(f"sync unchanged {resync * 1e3:.0f} ms, sync one change {one * 1e3:.0f} ms, "
+          f"add one node {update * 1e6:.0f} us")
+
+    lowered = [(n, n.lower()) for n in tree]
+    print(f"\n{'query kind':<12} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'hits p50':>9} {'linear p50 ms':>14}")
+    for kind, queries in make_queries(ids, args.queries).items():
+        times, hits = [], []
+        for query in queries:
+            elapsed, result = timed(index.search, query, args.limit)
+            times.append(elapsed * 1e3)
+            hits.append(len(result))
+        linear = []
+        for query in queries[:20]:
+            term = query.lower()
+            elapsed, _ = timed(lambda: [n for n, low in lowered if term in low])
+            linear.append(elapsed * 1e3)
+        times.sort()
+        print(f"{kind:<12} {statistics.median(times):>7.2f} {times[int(len(times) * 0.99) - 1]:>7.2f} "
+              f"{times[-1]:>7.2f} {statistics.median(hits):>9.0f} {statistics.median(linear):>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the memory cost of an extra Session served by one shared graph,
+and exits non-zero when it exceeds the budget. tests/test_session_memory.py runs
+the same measurement.
+
+    python benchmarks/bench_session_memory.py [--sessions 10000] [--budget 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.engine import ChatbotEngine
+from chatbot.graph import load_graph
+
+
+DEFAULT_BUDGET = 1000
+
+
+def measure(n_sessions):
+    """
+    Returns (graph bytes, node count, bytes per session mid-flow, seconds
+    per turn) for n_sessions sessions two turns into a flow.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    graph = load_graph(force=True)
+    graph_bytes = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+
+    engine = ChatbotEngine()
+    # Engines for the same file share the graph instead of re-parsing it.
+    assert ChatbotEngine().graph is engine.graph is graph
+
+    # Session ids are created outside the measured window; they belong to the caller.
+    ids = [f"user-{i}" for i in range(n_sessions)]
+    start_bytes, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    sessions = []
+    for session_id in ids:
+        session = engine.new_session(session_id)
+        engine.respond("my laptop is overheating", session)
+        engine.respond("it keeps shutting down", session)
+        sessions.append(session)
+    elapsed = time.perf_counter() - start
+    end_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The list holding the sessions is the caller's, not the session's.
+    per_session = (end_bytes - start_bytes - sys.getsizeof(sessions)) / n_sessions
+    return graph_bytes, len(graph), per_session, elapsed / (2 * n_sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET, help="max bytes per session")
+    args = parser.parse_args()
+
+    graph_bytes, n_nodes, per_session, per_turn = measure(args.sessions)
+    print(f"graph: {graph_bytes / 1024:.1f} KiB for {n_nodes} nodes")
+    print(f"sessions: {args.sessions}, {per_session:.0f} bytes/session mid-flow, "
+          f"{per_turn * 1e6:.1f} us/turn")
+    if per_session > args.budget:
+        print(f"FAIL: over budget of {args.budget} bytes/session")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Cost of the per-stage latency timers in ChatbotEngine.respond: the same
+message mix with timings disabled and enabled, with and without the
+result cache, then the per-stage breakdown gathered while enabled.
+
+    python benchmarks/bench_timings.py [--turns 60000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from chatbot.engine import ChatbotEngine
+from loadgen import FLOWS
+
+MESSAGES = [text for flow in FLOWS for text in flow] + ["hello there", "ruter", "the fan", "my keyboard is slow"]
+
+
+def per_turn(engine, turns):
+    session = engine.new_session('bench')
+    messages = (MESSAGES * (turns // len(MESSAGES) + 1))[:turns]
+    start = time.perf_counter()
+    for message in messages:
+        engine.respond(message, session)
+    return (time.perf_counter() - start) / turns
+
+
+def best_of(engine, turns, repeat):
+    return min(per_turn(engine, turns) for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=60000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for cache_size in (10000, 0):
+        engine = ChatbotEngine(cache_size=cache_size)
+        off = best_of(engine, args.turns, args.repeat)
+        engine.enable_timings()
+        on = best_of(engine, args.turns, args.repeat)
+        label = "cache on " if cache_size else "cache off"
+        print(f"{label}: disabled {off * 1e6:6.2f} us/turn, enabled {on * 1e6:6.2f} us/turn "
+              f"(+{(on - off) * 1e6:.2f} us, {on / off - 1:+.0%})")
+
+    print(f"\n{'stage':<10} {'count':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>9}  (cache off)")
+    for name, histogram in engine.timings.stages.items():
+        print(f"{name:<10} {histogram.count:>8} {histogram.percentile(50) / 1e3:>8.2f} "
+              f"{histogram.percentile(99) / 1e3:>8.2f} {histogram.max / 1e3:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Cost of adding one message to the user GUI's chat as the conversation
+grows: message 10 against message 10,000 (and --sizes). Runs headless
+against Transcript and TranscriptWindow, the work ChatTranscript does per
+message besides the Text insert, and times export streaming from the
+transcript. With --tk (needs a display) it also times the old unbounded
+ScrolledText append against the ChatTranscript widget.
+
+    python benchmarks/bench_transcript.py [--sizes 10,10000,100000] [--scrollback 200] [--tk]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.transcript import Transcript, TranscriptWindow, SCROLLBACK
+
+MESSAGE = ("Check that the printer is powered on and connected to the same network as your "
+           "computer, then try printing a test page.")
+REPEAT = 100
+
+
+def fill(add, n):
+    for i in range(n):
+        add("You" if i % 2 else "Bot", f"{MESSAGE} ({i})")
+
+
+def per_message(add, repeat=REPEAT, batches=5):
+    # Mean of `repeat` appends starting at about the current length, best
+    # of a few batches so an occasional list resize does not dominate.
+    times = []
+    for _ in range(batches):
+        start = time.perf_counter()
+        fill(add, repeat)
+        times.append((time.perf_counter() - start) / repeat)
+    return min(times)
+
+
+def bench_model(n, scrollback):
+    transcript = Transcript()
+    window = TranscriptWindow(transcript, scrollback)
+
+    def add(sender, text):
+        index = transcript.append(sender, text)
+        window.appended()
+        transcript.segments(index)
+
+    tracemalloc.start()
+    fill(add, n - 1)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    cost = per_message(add)
+    start = time.perf_counter()
+    transcript.write(io.StringIO())
+    export = time.perf_counter() - start
+    return cost, size / max(1, n - 1), export
+
+
+def bench_tk(n, scrollback):
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from chatbot.tk_widgets import ChatTranscript
+
+    root = tk.Tk()
+    plain = scrolledtext.ScrolledText(root, wrap=tk.WORD, state='disabled')
+    plain.pack()
+
+    def plain_add(sender, message):
+        # What ModernChatbotGUI.add_message used to do
+        plain.config(state='normal')
+        plain.insert(tk.END, "[12:00:00] ", 'timestamp')
+        plain.insert(tk.END, "👤 You: " if sender == "You" else "🤖 Bot: ", 'user' if sender == "You" else 'bot')
+        plain.insert(tk.END, f"{message}\n\n")
+        plain.see(tk.END)
+        plain.config(state='disabled')
+        root.update_idletasks()
+
+    widget = ChatTranscript(root, scrollback=scrollback, wrap=tk.WORD)
+    widget.pack()
+
+    def widget_add(sender, message):
+        widget.add_message(sender, message)
+        root.update_idletasks()
+
+    results = []
+    for add in (plain_add, widget_add):
+        fill(add, n - 1)
+        results.append(per_message(add))
+    root.destroy()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,10000,100000')
+    parser.add_argument('--scrollback', type=int, default=SCROLLBACK)
+    parser.add_argument('--tk', action='store_true', help="also time the Tk widgets (needs a display)")
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sizes.split(',')]
+
+    print(f"{'message':>9} {'append µs':>10} {'bytes/message':>14} {'export ms':>10}")
+    for n in sizes:
+        cost, size, export = bench_model(n, args.scrollback)
+        print(f"{n:>9} {cost * 1e6:>10.1f} {size:>14.0f} {export * 1000:>10.1f}")
+
+    if args.tk:
+        print(f"\n{'message':>9} {'ScrolledText ms':>16} {'ChatTranscript ms':>18}")
+        for n in sizes:
+            plain, widget = bench_tk(n, args.scrollback)
+            print(f"{n:>9} {plain * 1000:>16.2f} {widget * 1000:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Per-turn latency of ChatbotEngine.traverse_decision_tree for nodes with
+5 to 500 edges, against the original loop over edges.items(). The scan
+and automaton columns time both edge matchers on the normalized input;
+the engine uses the scan up to graph.AUTOMATON_MIN_EDGES edges.
+
+    python benchmarks/bench_traverse.py [--turns 5000] [--sizes 5,20,50,100,200,500]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.engine import ChatbotEngine
+from chatbot.graph import AUTOMATON_MIN_EDGES, WorkflowGraph
+from chatbot.matcher import KeywordAutomaton, KeywordList
+from chatbot.nlp_utils import normalize, phrase_key
+
+
+def legacy_traverse(workflows, current_node, user_input):
+    edges = workflows.get(current_node, {}).get('edges', {})
+    for keyword, next_node in edges.items():
+        if keyword in user_input:
+            return next_node
+    return None
+
+
+def make_tree(n_edges, rng):
+    edges = {}
+    while len(edges) < n_edges:
+        words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+                 for _ in range(rng.randint(1, 3))]
+        edges[' '.join(words)] = f"leaf_{len(edges)}"
+    tree = {
+        "root": {"prompt": "What issue are you facing?", "edges": {}},
+        "hub": {"prompt": "Pick one.", "edges": edges},
+    }
+    for target in edges.values():
+        tree[target] = {"response": "Done.", "terminal": True}
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=5000)
+    parser.add_argument('--sizes', default='5,20,50,100,200,500')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"automaton above {AUTOMATON_MIN_EDGES} edges")
+    print(f"{'edges':>6} {'loop us':>8} {'scan us':>8} {'automaton us':>13} {'engine us':>10} {'speedup':>8}")
+    for n_edges in map(int, args.sizes.split(',')):
+        tree = make_tree(n_edges, rng)
+        keywords = list(tree['hub']['edges'])
+        inputs = [f"i think it is {rng.choice(keywords)} now" if i % 2 else "i am not sure what you mean"
+                  for i in range(args.turns)]
+
+        engine = ChatbotEngine(graph=WorkflowGraph(tree))
+        patterns = [(phrase_key(keyword), target) for keyword, target in tree['hub']['edges'].items()]
+        keys = [normalize(text).key() for text in inputs]
+        matchers = []
+        for matcher in (KeywordList(patterns), KeywordAutomaton(patterns)):
+            start = time.perf_counter()
+            for key in keys:
+                matcher.longest_match(key)
+            matchers.append((time.perf_counter() - start) / len(keys))
+
+        start = time.perf_counter()
+        for text in inputs:
+            legacy_traverse(tree, 'hub', text)
+        loop = (time.perf_counter() - start) / len(inputs)
+
+        start = time.perf_counter()
+        for text in inputs:
+            engine.traverse_decision_tree('hub', text)
+        compiled = (time.perf_counter() - start) / len(inputs)
+
+        scan, automaton = matchers
+        print(f"{n_edges:>6} {loop * 1e6:>8.2f} {scan * 1e6:>8.2f} {automaton * 1e6:>13.2f} "
+              f"{compiled * 1e6:>10.2f} {loop / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
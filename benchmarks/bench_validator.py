@@ -0,0 +1,69 @@
+"""
+Validator run time on generated trees: a branching tree of N nodes with
+extra cross edges, a few cycles and a few deliberate mistakes, checked
+in memory by chatbot.validator.validate_tree. Times should grow linearly
+with nodes + edges.
+
+    python benchmarks/bench_validator.py [--nodes 10000,100000,1000000] [--branching 3]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.validator import validate_tree
+
+
+def make_tree(n, branching=3, seed=7):
+    """
+    Node i > 0 hangs off node (i - 1) // branching, so the tree is about
+    log(n) deep; leaves are terminal. Every 1000th inner node also links
+    back to an ancestor (a cycle) and every 10000th to a missing node.
+    """
+    rng = random.Random(seed)
+    tree = {'root': {'prompt': "What issue are you facing?", 'edges': {}}}
+    ids = ['root'] + [f"node_{i}" for i in range(1, n)]
+    for i in range(1, n):
+        first = i * branching + 1
+        children = [ids[c] for c in range(first, min(first + branching, n))]
+        if children:
+            edges = {f"option {k}": child for k, child in enumerate(children)}
+            if i % 1000 == 0:
+                edges['go back'] = ids[max(1, (i - 1) // branching)]
+            if i % 10000 == 0:
+                edges['broken'] = f"missing_{i}"
+            if rng.random() < 0.05:
+                edges['skip ahead'] = ids[rng.randrange(i + 1, n)]
+            tree[ids[i]] = {'prompt': f"Question {i}?", 'edges': edges}
+        else:
+            tree[ids[i]] = {'response': f"Fix {i}.", 'terminal': True}
+    tree['root']['edges'] = {f"topic {k}": ids[k] for k in range(1, min(branching + 1, n))}
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', default='10000,100000,1000000')
+    parser.add_argument('--branching', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>9} {'edges':>9} {'seconds':>8} {'us/(V+E)':>9} {'errors':>7} {'warnings':>8} {'cycles':>6}")
+    for n in (int(x) for x in args.nodes.split(',')):
+        tree = make_tree(n, args.branching)
+        gc.collect()
+        start = time.perf_counter()
+        report = validate_tree(tree, intents=())
+        elapsed = time.perf_counter() - start
+        stats = report.stats
+        size = stats['nodes'] + stats['edges']
+        print(f"{stats['nodes']:>9} {stats['edges']:>9} {elapsed:>8.2f} {elapsed / size * 1e6:>9.2f} "
+              f"{len(report.errors):>7} {len(report.warnings):>8} {stats['cycles']:>6}")
+        del tree, report
+
+
+if __name__ == '__main__':
+    main()
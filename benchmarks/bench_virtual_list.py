@@ -0,0 +1,100 @@
+"""
+Refresh and scroll cost of the admin GUI's virtualized node list at 10k,
+100k and 1M node ids. Runs headless against VirtualListModel: a refresh
+replaces the ids and keeps the selection (the worst case, selected row
+near the end), a scroll step moves three rows and fetches the rows in
+view. With --tk (needs a display) it also times a plain tk.Listbox
+refilled with every id against the VirtualListbox widget.
+
+    python benchmarks/bench_virtual_list.py [--sizes 10000,100000,1000000] [--tk]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot.virtual_list import VirtualListModel
+
+
+def best(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_model(n, steps=10000):
+    ids = [f"node_{i}" for i in range(n)]
+    model = VirtualListModel(ids, visible_rows=25)
+    model.select_row(n - 10)
+    # A refresh hands over a new list with one node inserted near the top.
+    refreshed = ids[:5] + ['node_new'] + ids[5:]
+
+    def refresh():
+        model.set_items(refreshed)
+        model.visible()
+        model.set_items(ids)
+        model.visible()
+
+    def scroll():
+        model.scroll_to(0)
+        for _ in range(steps):
+            if model.scroll(3) == model.max_top():
+                model.scroll_to(0)
+            model.visible()
+            model.yview()
+
+    return best(refresh) / 2, best(scroll) / steps
+
+
+def bench_tk(n):
+    import tkinter as tk
+    from chatbot.tk_widgets import VirtualListbox
+    ids = [f"node_{i}" for i in range(n)]
+    root = tk.Tk()
+    plain = tk.Listbox(root, height=25)
+    virtual = VirtualListbox(root, height=25)
+    plain.pack()
+    virtual.pack()
+    root.update()
+
+    def refill_plain():
+        plain.delete(0, tk.END)
+        for node in ids:
+            plain.insert(tk.END, node)
+        root.update_idletasks()
+
+    def refill_virtual():
+        virtual.set_items(ids)
+        root.update_idletasks()
+
+    result = best(refill_plain, 1), best(refill_virtual, 3)
+    root.destroy()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--tk', action='store_true', help="also time the Tk widgets (needs a display)")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(',')]
+
+    print(f"{'nodes':>9} {'refresh ms':>11} {'scroll step us':>15}")
+    for n in sizes:
+        refresh, step = bench_model(n)
+        print(f"{n:>9} {refresh * 1e3:>11.3f} {step * 1e6:>15.2f}")
+
+    if args.tk:
+        print(f"\n{'nodes':>9} {'tk.Listbox refill ms':>21} {'VirtualListbox ms':>18}")
+        for n in sizes:
+            plain, virtual = bench_tk(n)
+            print(f"{n:>9} {plain * 1e3:>21.1f} {virtual * 1e3:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
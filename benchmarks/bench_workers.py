@@ -0,0 +1,78 @@
+"""
+Throughput of `chatbot.server --workers N` for N = 1..--max-workers, driven
+by several load generator processes so the client is not the bottleneck.
+
+    python benchmarks/bench_workers.py [--max-workers 4] [--clients 4] [--users 4000]
+
+Scaling is bounded by the machine's cores: the workers and the client
+processes all share them, so on a single core more workers only add
+overhead. The supervisor column is the CPU time the supervisor spent during
+the run (Linux only); it handles no messages, so it should stay near zero.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import loadgen
+
+
+def _client(args):
+    port, users, connections, rounds, prefix = args
+    return asyncio.run(loadgen.run_load('127.0.0.1', port, users, connections, rounds,
+                                        session_prefix=prefix, keep_samples=True))
+
+
+def cpu_seconds(pid):
+    # utime + stime of pid, from /proc; None where that is not available.
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def run_clients(port, clients, users, connections, rounds):
+    jobs = [(port, users // clients, max(1, connections // clients), rounds, f"c{i}") for i in range(clients)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(clients) as pool:
+        reports = pool.map(_client, jobs)
+    elapsed = time.perf_counter() - start
+    latencies = [lat for report in reports for lat in report['latencies']]
+    return loadgen.summarize(latencies, sum(r['errors'] for r in reports), elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--clients', type=int, default=4, help="load generator processes")
+    parser.add_argument('--users', type=int, default=4000)
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--port', type=int, default=18800)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes")
+    baseline = None
+    for n in range(1, args.max_workers + 1):
+        port = args.port + n
+        proc = loadgen.spawn_server(port, ['--workers', str(n)])
+        try:
+            before = cpu_seconds(proc.pid)
+            report = run_clients(port, args.clients, args.users, args.connections, args.rounds)
+            after = cpu_seconds(proc.pid)
+        finally:
+            proc.terminate()
+            proc.wait()
+        baseline = baseline or report['throughput']
+        supervisor = f"  supervisor {(after - before) * 1000:.0f} ms CPU" if before is not None else ""
+        print(f"workers={n:<3} {report['throughput'] / baseline:5.2f}x  {loadgen.format_report(report)}{supervisor}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Imports N nodes into a scratch copy of the tree through:
+  legacy       - the original add_node: parse the JSON, add, rewrite the file
+  per-call     - workflow_manager.add_node: one atomic write per call
+  transaction  - WorkflowRepository.transaction(): one atomic write in total
+
+The first two are O(N^2) overall; use --nodes to shorten the run. The
+pre-save tree check is off so all three measure the same work.
+
+    python benchmarks/bench_workflow_import.py [--nodes 20000] [--skip legacy,per-call]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import workflow_manager
+from chatbot.workflow_manager import WorkflowRepository
+
+
+def legacy_add_node(path, node_id, prompt, edges):
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    if node_id in tree:
+        return
+    tree[node_id] = {'prompt': prompt, 'edges': edges}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tree, f, indent=4)
+
+
+def make_nodes(n):
+    return [(f"imported_{i}", f"Prompt for imported node {i}?",
+             {"yes": f"imported_{i + 1}", "no": "root"}) for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--skip', default='', help="comma separated: legacy,per-call,transaction")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(',')))
+    nodes = make_nodes(args.nodes)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        def fresh_copy(name):
+            path = os.path.join(workdir, f"{name}.json")
+            shutil.copy(workflow_manager.WORKFLOW_PATH, path)
+            return path
+
+        results = {}
+        if 'legacy' not in skip:
+            path = fresh_copy('legacy')
+            start = time.perf_counter()
+            for node_id, prompt, edges in nodes:
+                legacy_add_node(path, node_id, prompt, edges)
+            results['legacy'] = time.perf_counter() - start
+
+        if 'per-call' not in skip:
+            repo = WorkflowRepository(fresh_copy('per_call'), check='off')
+            start = time.perf_counter()
+            for node_id, prompt, edges in nodes:
+                repo.add_node(node_id, prompt=prompt, edges=edges)
+            results['per-call'] = time.perf_counter() - start
+
+        if 'transaction' not in skip:
+            repo = WorkflowRepository(fresh_copy('transaction'), check='off')
+            start = time.perf_counter()
+            with repo.transaction():
+                for node_id, prompt, edges in nodes:
+                    repo.add_node(node_id, prompt=prompt, edges=edges)
+            results['transaction'] = time.perf_counter() - start
+            with open(repo.path, encoding='utf-8') as f:
+                assert len(json.load(f)) >= args.nodes
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"importing {args.nodes} nodes")
+    for name, seconds in results.items():
+        print(f"  {name:<12} {seconds:9.3f} s  {seconds / args.nodes * 1e6:10.1f} us/node")
+
+
+if __name__ == '__main__':
+    main()
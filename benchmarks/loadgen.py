@@ -0,0 +1,157 @@
+"""
+Load generator for chatbot.server: drives simulated users through the
+overheating and wifi flows and reports latency percentiles and throughput.
+
+    python benchmarks/loadgen.py --spawn [--users 2000] [--connections 200] [--rounds 3] [--http]
+    python benchmarks/loadgen.py --host 127.0.0.1 --port 8765 ...
+
+Every user is a session; a pool of connections takes users from a queue and
+plays each one's flow message by message, waiting for every reply.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLOWS = [
+    ["my laptop is overheating", "it keeps shutting down", "the vents are blocked"],
+    ["laptop is hot", "just hot to the touch", "yes, gaming all day"],
+    ["wifi not working", "yes", "no"],
+    ["no internet on my wifi", "no", "yes"],
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class LineClient:
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    async def send(self, session_id, text):
+        self.writer.write(f"{session_id}\t{text}\n".encode('utf-8'))
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())['response']
+
+
+class HttpClient(LineClient):
+    async def send(self, session_id, text):
+        body = json.dumps({'session': session_id, 'text': text}).encode('utf-8')
+        self.writer.write(b"POST /chat HTTP/1.1\r\nHost: loadgen\r\nContent-Type: application/json\r\n"
+                          b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        await self.writer.drain()
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':', 1)[1])
+        return json.loads(await self.reader.readexactly(length))['response']
+
+
+async def run_load(host, port, users, connections, rounds, http=False, session_prefix='user', keep_samples=False):
+    queue = asyncio.Queue()
+    for i in range(users):
+        queue.put_nowait(i)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        client = (HttpClient if http else LineClient)(reader, writer)
+        try:
+            while True:
+                try:
+                    user = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                flow = FLOWS[user % len(FLOWS)]
+                for _ in range(rounds):
+                    for text in flow:
+                        start = time.perf_counter()
+                        try:
+                            await client.send(f"{session_prefix}-{user}", text)
+                        except (ConnectionError, ValueError, KeyError):
+                            errors += 1
+                            continue
+                        latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(connections, users))))
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed, keep_samples)
+
+
+def summarize(latencies, errors, elapsed, keep_samples=False):
+    latencies.sort()
+    report = {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+    if keep_samples:
+        report['latencies'] = latencies
+    return report
+
+
+def spawn_server(port, extra_args=()):
+    """
+    Starts chatbot.server in a child process and waits until it accepts.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'chatbot.server', '--port', str(port), '--no-reload', *extra_args],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    line = proc.stdout.readline()
+    if not line.startswith('Serving on'):
+        proc.kill()
+        raise RuntimeError(f"server failed to start: {line!r}")
+    return proc
+
+
+def format_report(report):
+    return (f"{report['requests']} requests in {report['seconds']:.2f} s "
+            f"({report['throughput']:.0f} req/s, {report['errors']} errors)  "
+            f"p50 {report['p50_ms']:.2f} ms  p95 {report['p95_ms']:.2f} ms  p99 {report['p99_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--spawn', action='store_true', help="start a server for the run")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3, help="times each user replays its flow")
+    parser.add_argument('--http', action='store_true', help="use HTTP instead of the line protocol")
+    args = parser.parse_args()
+
+    proc = spawn_server(args.port) if args.spawn else None
+    try:
+        report = asyncio.run(run_load(args.host, args.port, args.users, args.connections, args.rounds, args.http))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Stress check for the chat window's EngineWorker: fires hundreds of messages
+at it as fast as they can be queued, from the main thread and from a few
+typing threads at once, while a stand-in UI loop drains replies every
+--poll ms. The replies must come back in the order sent and match a plain
+sequential replay of the same messages on a fresh engine, and the session
+must end in the same node with the same history. A second round cancels
+halfway: nothing queued before the cancel may be delivered after it.
+With --old it also reports how the previous thread-per-message approach
+fares on the same messages (not asserted; it races on the session).
+
+Exits 1 on any mismatch. tests/test_engine_worker.py runs the same checks.
+
+    python benchmarks/stress_engine_worker.py [--messages 500] [--typists 4] [--poll 50] [--old]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from chatbot.engine import ChatbotEngine
+from chatbot.worker import EngineWorker
+from loadgen import FLOWS
+
+
+def make_messages(n, rng):
+    # One user walking the flows, with stray messages mixed in.
+    messages = []
+    while len(messages) < n:
+        for text in rng.choice(FLOWS):
+            messages.append(text if rng.random() > 0.15 else rng.choice(["hello", "thanks", "restart", "reset"]))
+    return messages[:n]
+
+
+def sequential(messages):
+    engine = ChatbotEngine()
+    replies = [engine.respond(message) for message in messages]
+    return replies, engine.session
+
+
+def drain_until_done(worker, poll, expected):
+    # What ModernChatbotGUI.drain_responses does, on a timer
+    received = []
+    ticks = 0
+    while worker.pending or len(received) < expected:
+        time.sleep(poll)
+        ready = worker.drain()
+        ticks += 1 if ready else 0
+        received.extend(ready)
+    return received, ticks
+
+
+def check(label, ok, detail=""):
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}{': ' + detail if detail and not ok else ''}")
+    return ok
+
+
+def run_ordered(messages, expected, session, typists, poll):
+    engine = ChatbotEngine()
+    worker = EngineWorker(engine)
+    # Typists each queue their slice as one burst; a lock hands out slots
+    # so the submission order is known.
+    order = []
+    lock = threading.Lock()
+    cursor = iter(range(len(messages)))
+
+    def typist():
+        while True:
+            with lock:
+                index = next(cursor, None)
+                if index is None:
+                    return
+                order.append((worker.submit(messages[index]), index))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=typist) for _ in range(typists)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    received, ticks = drain_until_done(worker, poll, len(messages))
+    elapsed = time.perf_counter() - start
+    worker.stop()
+
+    print(f"{len(messages)} messages from {typists} threads in {elapsed * 1000:.0f} ms, "
+          f"{len(received)} replies over {ticks} UI updates")
+    ids = [request_id for request_id, _, _, _ in received]
+    by_id = dict(order)
+    ok = check("no errors", all(error is None for _, _, _, error in received))
+    ok &= check("one reply per message", len(received) == len(messages), f"{len(received)} replies")
+    ok &= check("replies in submission order", ids == sorted(ids))
+    ok &= check("replies match a sequential replay",
+                [reply for _, _, reply, _ in received] == [expected[by_id[i]] for i in ids])
+    ok &= check("final node and history match", (engine.session.current_node, engine.session.history)
+                == (session.current_node, session.history),
+                f"{engine.session.current_node} vs {session.current_node}")
+    return ok
+
+
+def run_cancel(messages, poll):
+    worker = EngineWorker(ChatbotEngine())
+    half = len(messages) // 2
+    stale = {worker.submit(message) for message in messages[:half]}
+    worker.cancel()
+    fresh = [worker.submit(message) for message in messages[half:]]
+    received, _ = drain_until_done(worker, poll, len(fresh))
+    worker.stop()
+    ids = [request_id for request_id, _, _, _ in received]
+    print(f"cancel after {half} queued messages:")
+    ok = check("no stale reply delivered", not stale.intersection(ids))
+    ok &= check("every later message answered, in order", ids == fresh)
+    ok &= check("nothing left pending", worker.pending == 0)
+    return ok
+
+
+def run_old(messages, expected):
+    # The old send_message: one thread per message on the shared session
+    engine = ChatbotEngine()
+    replies = [None] * len(messages)
+
+    def process(index):
+        replies[index] = engine.respond(messages[index])
+
+    threads = [threading.Thread(target=process, args=(i,)) for i in range(len(messages))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wrong = sum(reply != want for reply, want in zip(replies, expected))
+    print(f"thread per message (old): {wrong} of {len(messages)} replies differ from a sequential replay")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--typists', type=int, default=4)
+    parser.add_argument('--poll', type=float, default=50, help="UI drain interval, ms")
+    parser.add_argument('--seed', type=int, default=25)
+    parser.add_argument('--old', action='store_true')
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, random.Random(args.seed))
+    expected, session = sequential(messages)
+    ok = run_ordered(messages, expected, session, args.typists, args.poll / 1000)
+    ok &= run_cancel(messages, args.poll / 1000)
+    if args.old:
+        run_old(messages, expected)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Offline replay and bulk classification: reads JSONL messages on stdin and
+writes one JSONL result per input line, in order, to stdout.
+
+    python -m chatbot.batch [--tree path] [--chunk 10000] [--sessions sessions.db] < in.jsonl > out.jsonl
+
+Input lines are {"session": "...", "text": "..."}; each output line adds
+"response" and the session's "node" and "intent" after the message, or
+"error" for lines that could not be read. Messages are handed to
+ChatbotEngine.respond_batch one chunk at a time; sessions carry over from
+one chunk to the next through the session store.
+"""
+import argparse
+import json
+import sys
+from chatbot.engine import ChatbotEngine
+from chatbot.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+def _parse(line):
+    data = json.loads(line)
+    return str(data['session']), str(data['text'])
+
+
+def _run_chunk(engine, lines, out):
+    items, parsed = [], []
+    for line in lines:
+        try:
+            item = _parse(line)
+        except (ValueError, KeyError, TypeError) as e:
+            parsed.append({'error': f"bad input line: {e}"})
+            continue
+        parsed.append(item)
+        items.append(item)
+    results = iter(engine.respond_batch(items, details=True))
+    for entry in parsed:
+        if isinstance(entry, tuple):
+            response, node, intent = next(results)
+            entry = {'session': entry[0], 'text': entry[1], 'response': response, 'node': node, 'intent': intent}
+        out.write(json.dumps(entry, ensure_ascii=False))
+        out.write('\n')
+
+
+def replay(engine, infile, out, chunk=10000):
+    """
+    Streams JSONL messages from infile through engine, chunk lines at a time.
+    Returns the number of input lines handled.
+    """
+    count = 0
+    lines = []
+    for line in infile:
+        if not line.strip():
+            continue
+        lines.append(line)
+        if len(lines) >= chunk:
+            _run_chunk(engine, lines, out)
+            count += len(lines)
+            lines = []
+    if lines:
+        _run_chunk(engine, lines, out)
+        count += len(lines)
+    out.flush()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay JSONL chat messages through the engine")
+    parser.add_argument('--tree', default=None, help="path to troubleshooting_tree.json")
+    parser.add_argument('--chunk', type=int, default=10000, help="messages per respond_batch call")
+    parser.add_argument('--sessions', default=None, help="SQLite file to keep sessions in (default: memory)")
+    parser.add_argument('--max-sessions', type=int, default=1000000, help="in-memory session limit")
+    args = parser.parse_args(argv)
+
+    if args.sessions:
+        store = SQLiteSessionStore(args.sessions, ttl=None, batch_size=args.chunk)
+    else:
+        # Replays run faster than real time: idle timeouts would drop live sessions.
+        store = MemorySessionStore(max_sessions=args.max_sessions, ttl=None)
+    engine = ChatbotEngine(workflow_path=args.tree, store=store)
+    try:
+        replay(engine, sys.stdin, sys.stdout, args.chunk)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
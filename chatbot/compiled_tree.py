@@ -0,0 +1,417 @@
+"""
+Compact binary form of troubleshooting_tree.json, loaded with mmap.
+
+JSON stays the authoring format; compile_tree() turns it into a file made of
+flat uint32 arrays and one interned string table, so loading is a header
+read and every worker process maps the same pages. Layout (native uint32,
+every section 8-byte aligned):
+
+    header      magic, version, counts, source JSON stamp and section offsets
+    str_offsets n_strings + 1 offsets into blob
+    node_order  node index of every node, in declaration order
+    prompt      string index or NONE, per node
+    response    string index or NONE, per node
+    extra       string index of a JSON object with any other keys, or NONE
+    flags       TERMINAL / HAS_TERMINAL / HAS_EDGES bits, per node
+    edge_start  CSR offsets into the edge arrays, n_nodes + 1
+    edge_kw     string index of each edge keyword
+    edge_target string index of each edge target
+    digest      8-byte hash of each node's id and JSON, as two uint32
+    blob        UTF-8 bytes of every string
+
+Node ids occupy string indices 0..n_nodes-1, sorted by their UTF-8 bytes, so
+a node's integer id is also its string index, lookups are a binary search
+and an edge target below n_nodes is a node id (anything else is dangling).
+
+The header records the st_mtime_ns and st_size of the JSON it was compiled
+from; the compiled file is only used while the JSON still has exactly that
+stamp, so restoring an older JSON (cp -p) or editing it mid-compile forces
+a rebuild. changed_nodes() compares the digests of two compiled trees, so a
+reload can find the few nodes an edit touched without decoding every node.
+
+    python -m chatbot.compiled_tree compile [tree.json] [out.bin]
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+
+MAGIC = b'STREE\x00' + (b'LE' if sys.byteorder == 'little' else b'BE')
+VERSION = 3
+NONE = 0xFFFFFFFF
+
+TERMINAL = 1
+HAS_TERMINAL = 2
+HAS_EDGES = 4
+
+_SECTIONS = ('str_offsets', 'node_order', 'prompt', 'response', 'extra', 'flags',
+             'edge_start', 'edge_kw', 'edge_target', 'digest', 'blob')
+_HEADER = struct.Struct('=8sIIIIqQ' + 'Q' * len(_SECTIONS))
+
+
+def compiled_path_for(json_path):
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def source_stamp(json_path):
+    """
+    (st_mtime_ns, st_size) of json_path, as stored in compiled headers.
+    """
+    st = os.stat(json_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _node_digest(node_id, node):
+    # Edge order matters (the first declared edge wins ties), so the node's
+    # JSON is hashed in declaration order.
+    payload = node_id.encode('utf-8') + b'\0' + json.dumps(node).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=8).digest()
+
+
+def compile_tree(tree, out_path, source=None):
+    """
+    Writes tree (the parsed JSON dict) to out_path in the compiled format.
+    source is the source_stamp() of the JSON tree was read from; without
+    one the file never counts as fresh for any JSON. The file is replaced
+    atomically, so running readers keep their mapping.
+    """
+    node_ids = sorted(tree, key=lambda n: n.encode('utf-8'))
+    strings = list(node_ids)
+    interned = {s: i for i, s in enumerate(strings)}
+
+    def intern(value):
+        idx = interned.get(value)
+        if idx is None:
+            idx = interned[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    sections = {name: array('I') for name in _SECTIONS if name != 'blob'}
+    sections['node_order'].extend(interned[node_id] for node_id in tree)
+    sections['edge_start'].append(0)
+    for node_id in node_ids:
+        node = tree[node_id]
+        extra = {}
+        flags = 0
+        prompt = response = NONE
+        for key, value in node.items():
+            if key == 'prompt' and isinstance(value, str):
+                prompt = intern(value)
+            elif key == 'response' and isinstance(value, str):
+                response = intern(value)
+            elif key == 'terminal' and isinstance(value, bool):
+                flags |= HAS_TERMINAL | (TERMINAL if value else 0)
+            elif key == 'edges' and isinstance(value, dict):
+                flags |= HAS_EDGES
+                for keyword, target in value.items():
+                    sections['edge_kw'].append(intern(str(keyword)))
+                    sections['edge_target'].append(intern(str(target)))
+            else:
+                extra[key] = value
+        sections['prompt'].append(prompt)
+        sections['response'].append(response)
+        sections['extra'].append(intern(json.dumps(extra)) if extra else NONE)
+        sections['flags'].append(flags)
+        sections['edge_start'].append(len(sections['edge_kw']))
+        sections['digest'].frombytes(_node_digest(node_id, node))
+
+    blob = bytearray()
+    str_offsets = sections['str_offsets']
+    for value in strings:
+        str_offsets.append(len(blob))
+        blob += value.encode('utf-8')
+    str_offsets.append(len(blob))
+    if len(blob) >= NONE:
+        raise ValueError("tree too large for the compiled format")
+
+    payloads = [sections[name].tobytes() for name in _SECTIONS if name != 'blob'] + [bytes(blob)]
+    offsets = []
+    pos = _HEADER.size
+    for payload in payloads:
+        pos += -pos % 8
+        offsets.append(pos)
+        pos += len(payload)
+    source_mtime, source_size = source if source is not None else (-1, 0)
+    header = _HEADER.pack(MAGIC, VERSION, len(strings), len(node_ids), len(sections['edge_kw']),
+                          source_mtime, source_size, *offsets)
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tree-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            for offset, payload in zip(offsets, payloads):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return out_path
+
+
+def compile_file(json_path, out_path=None):
+    # Stamped before reading: an edit landing during the compile changes the
+    # JSON's stamp, so the result is rebuilt on the next load.
+    source = source_stamp(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    return compile_tree(tree, out_path or compiled_path_for(json_path), source)
+
+
+class CompiledNode(Mapping):
+    """
+    Read-only dict-like view of one node; fields are decoded on access.
+    """
+    __slots__ = ('_tree', '_idx')
+
+    def __init__(self, tree, idx):
+        self._tree = tree
+        self._idx = idx
+
+    def _keys(self):
+        t, i = self._tree, self._idx
+        keys = []
+        if t._prompt[i] != NONE:
+            keys.append('prompt')
+        if t._response[i] != NONE:
+            keys.append('response')
+        if t._flags[i] & HAS_EDGES:
+            keys.append('edges')
+        if t._flags[i] & HAS_TERMINAL:
+            keys.append('terminal')
+        keys.extend(self._extra())
+        return keys
+
+    def _extra(self):
+        idx = self._tree._extra[self._idx]
+        return {} if idx == NONE else json.loads(self._tree.string(idx))
+
+    def __getitem__(self, key):
+        t, i = self._tree, self._idx
+        if key == 'prompt' and t._prompt[i] != NONE:
+            return t.string(t._prompt[i])
+        if key == 'response' and t._response[i] != NONE:
+            return t.string(t._response[i])
+        if key == 'edges' and t._flags[i] & HAS_EDGES:
+            return dict(t.edges(i))
+        if key == 'terminal' and t._flags[i] & HAS_TERMINAL:
+            return bool(t._flags[i] & TERMINAL)
+        return self._extra()[key]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+
+class CompiledTree(Mapping):
+    """
+    Memory-mapped compiled tree, usable wherever the parsed JSON dict is
+    read: tree[node_id] / tree.get(node_id) return CompiledNode views and
+    iteration follows the original declaration order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = memoryview(self._mmap)
+        try:
+            self._map_sections()
+        except Exception:
+            self.close()
+            raise
+
+    def _map_sections(self):
+        buf = self._buf
+        if len(buf) < _HEADER.size:
+            raise ValueError(f"{self.path} is not a compiled tree")
+        magic, version, n_strings, n_nodes, n_edges, source_mtime, source_size, *offsets = _HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} was compiled for another format or platform")
+        self.source = (source_mtime, source_size)
+        self.n_nodes = n_nodes
+        self.n_edges = n_edges
+        lengths = (n_strings + 1, n_nodes, n_nodes, n_nodes, n_nodes, n_nodes, n_nodes + 1, n_edges, n_edges,
+                   2 * n_nodes)
+        # A truncated or overwritten file must fail here, as a ValueError,
+        # rather than as a stray IndexError on some later lookup.
+        end = _HEADER.size
+        for name, offset, length in zip(_SECTIONS, offsets, lengths):
+            if offset % 8 or offset < end or offset + 4 * length > len(buf):
+                raise ValueError(f"{self.path} is truncated or corrupt ({name} section)")
+            end = offset + 4 * length
+        if offsets[-1] < end or offsets[-1] > len(buf) or n_nodes > n_strings:
+            raise ValueError(f"{self.path} is truncated or corrupt (blob section)")
+        for name, offset, length in zip(_SECTIONS, offsets, lengths):
+            setattr(self, '_' + name, buf[offset:offset + 4 * length].cast('I'))
+        self._blob = buf[offsets[-1]:]
+        if self._str_offsets[n_strings] > len(self._blob) or self._edge_start[n_nodes] != n_edges:
+            raise ValueError(f"{self.path} is truncated or corrupt (string table)")
+
+    def _id_bytes(self):
+        # The node ids exactly as stored: their offsets and UTF-8 bytes.
+        n = self.n_nodes
+        return self._str_offsets[:n + 1].tobytes(), self._blob[:self._str_offsets[n]].tobytes()
+
+    def close(self):
+        # Every view into the mapping must be released before it can close.
+        for name in _SECTIONS:
+            view = getattr(self, '_' + name, None)
+            if view is not None:
+                view.release()
+        self._buf.release()
+        self._mmap.close()
+
+    def string(self, idx):
+        start = self._str_offsets[idx]
+        return str(self._blob[start:self._str_offsets[idx + 1]], 'utf-8')
+
+    def _raw(self, idx):
+        return self._blob[self._str_offsets[idx]:self._str_offsets[idx + 1]]
+
+    def index_of(self, node_id):
+        """
+        Returns the integer id of node_id, or -1. Binary search over the
+        sorted node ids, comparing raw bytes without decoding.
+        """
+        if not isinstance(node_id, str):
+            return -1
+        key = node_id.encode('utf-8')
+        lo, hi = 0, self.n_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._raw(mid).tobytes()
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def edges(self, idx):
+        """
+        Yields (keyword, target id) for node idx, in declaration order.
+        """
+        for e in range(self._edge_start[idx], self._edge_start[idx + 1]):
+            yield self.string(self._edge_kw[e]), self.string(self._edge_target[e])
+
+    def __getitem__(self, node_id):
+        idx = self.index_of(node_id)
+        if idx < 0:
+            raise KeyError(node_id)
+        return CompiledNode(self, idx)
+
+    def __contains__(self, node_id):
+        return self.index_of(node_id) >= 0
+
+    def __iter__(self):
+        for idx in self._node_order:
+            yield self.string(idx)
+
+    def __len__(self):
+        return self.n_nodes
+
+
+def _common_run(same, limit):
+    # Largest n <= limit with same(n), for a same() that holds up to some n.
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if same(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _differing(old, new, lo, hi):
+    # Node indexes in [lo, hi) whose digests differ, halving the run until
+    # each half compares equal.
+    if old[8 * lo:8 * hi] == new[8 * lo:8 * hi]:
+        return []
+    if hi - lo == 1:
+        return [lo]
+    mid = (lo + hi) // 2
+    return _differing(old, new, lo, mid) + _differing(old, new, mid, hi)
+
+
+def _digest_positions(digests, lo, hi):
+    # {digest: node index} for nodes lo..hi-1
+    run = array('Q')
+    run.frombytes(digests[8 * lo:8 * hi])
+    return dict(zip(run, range(lo, hi)))
+
+
+def changed_nodes(old, new):
+    """
+    Returns (changed, removed) from compiled tree old to new: the ids of
+    the nodes new adds or modifies, and of the nodes it drops. With the
+    same node ids, runs of digests are compared in halves down to the
+    nodes that differ; otherwise the identical head and tail are skipped
+    and the rest compared as sets of digests, which cover the id too.
+    Either way only the nodes found have their id decoded.
+    """
+    old_digests, new_digests = old._digest.cast('B'), new._digest.cast('B')
+    n_old, n_new = old.n_nodes, new.n_nodes
+    if n_old == n_new and old._id_bytes() == new._id_bytes():
+        return [new.string(i) for i in _differing(old_digests, new_digests, 0, n_new)], []
+    shorter = min(n_old, n_new)
+    head = _common_run(lambda n: old_digests[:8 * n] == new_digests[:8 * n], shorter)
+    tail = _common_run(lambda n: old_digests[8 * (n_old - n):8 * n_old] == new_digests[8 * (n_new - n):8 * n_new],
+                       shorter - head)
+    old_middle = _digest_positions(old_digests, head, n_old - tail)
+    new_middle = _digest_positions(new_digests, head, n_new - tail)
+    changed = sorted(i for digest, i in new_middle.items() if digest not in old_middle)
+    gone = sorted(i for digest, i in old_middle.items() if digest not in new_middle)
+    return ([new.string(i) for i in changed],
+            [node_id for node_id in map(old.string, gone) if node_id not in new])
+
+
+def load_compiled(json_path, out_path=None):
+    """
+    Maps the compiled form of json_path, rebuilding it first when it is
+    missing, unreadable, truncated or compiled from another version of the
+    JSON (a different modification time or size).
+    """
+    out_path = out_path or compiled_path_for(json_path)
+    try:
+        tree = CompiledTree(out_path)
+    except (FileNotFoundError, ValueError):
+        tree = None
+    if tree is not None:
+        if tree.source == source_stamp(json_path):
+            return tree
+        tree.close()
+    compile_file(json_path, out_path)
+    return CompiledTree(out_path)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'compile' or len(argv) > 3:
+        print("Usage: python -m chatbot.compiled_tree compile [tree.json] [out.bin]")
+        return 2
+    from chatbot.graph import DEFAULT_WORKFLOW_PATH
+    json_path = argv[1] if len(argv) > 1 else DEFAULT_WORKFLOW_PATH
+    out_path = compile_file(json_path, argv[2] if len(argv) > 2 else None)
+    tree = CompiledTree(out_path)
+    print(f"Compiled {len(tree)} nodes, {tree.n_edges} edges -> {out_path} ({os.path.getsize(out_path)} bytes)")
+    tree.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,86 +1,422 @@
-import json
-import os
-from chatbot.nlp_utils import keyword_detect, simple_llm_fallback
+import itertools
+import time
+from chatbot.graph import load_graph
+from chatbot.nlp_utils import INTENT_KEYWORDS, NormalizedInput, keyword_detect, normalize, simple_llm_fallback
+from chatbot.result_cache import ResultCache
+from chatbot.session import Session
+from chatbot.session_store import MemorySessionStore
+
+# BM25 scores below this are too weak to move the user to another node. A
+# lone word ("device", "quickly", even "battery") scores under it on the
+# shipped tree; benchmarks/false_positive_corpus.json has the cases it is
+# checked on.
+RETRIEVAL_MIN_SCORE = 2.2
+
+# Turn outcomes: what a message does to the session (see ChatbotEngine._apply).
+RESET = 'reset'      # start over
+SWITCH = 'switch'    # start over in another intent's flow
+ENTER = 'enter'      # start an intent's flow from root
+MOVE = 'move'        # follow an edge to a node
+JUMP = 'jump'        # go to a retrieval hit, possibly in another flow
+FINISH = 'finish'    # reached a terminal node; start over
+REPLY = 'reply'      # answer without moving
+
+
+def retrieval_target(graph, current_node, user_input):
+    """
+    The node the fallback stage jumps to for user_input: the best BM25 hit
+    other than root and current_node, if it scores RETRIEVAL_MIN_SCORE or
+    more. Only question nodes are indexed, so this is never a terminal answer.
+    """
+    hits = graph.search(user_input, k=1, exclude=('root', current_node))
+    if hits and hits[0][1] >= RETRIEVAL_MIN_SCORE:
+        return hits[0][0]
+    return None
+
 
 class ChatbotEngine:
-    def __init__(self, workflow_path=None):
-        self.workflow_path = workflow_path or os.path.join(os.path.dirname(__file__), '../data/troubleshooting_tree.json')
-        self.workflows = self.load_workflows()
-        self.session = {
-            'current_node': 'root',
-            'context': {},
-            'history': []
-        }
-
-    def load_workflows(self):
-        try:
-            with open(self.workflow_path, 'r', encoding='utf-8') as f:
-                workflows = json.load(f)
-            return workflows
-        except Exception as e:
-            print(f"Error loading workflows: {e}")
-            return {}
-
-    def reset_session(self):
-        self.session = {
-            'current_node': 'root',
-            'context': {},
-            'history': []
-        }
-
-    def respond(self, user_input):
-        # Normalize input
-        user_input = user_input.lower().strip()
+    def __init__(self, workflow_path=None, graph=None, store=None, cache_size=10000):
+        self.workflow_path = workflow_path
+        # The graph is shared process-wide; engines for the same file reuse one copy.
+        self.graph = graph if graph is not None else load_graph(workflow_path)
+        self.store = store if store is not None else MemorySessionStore()
+        # cache_size=0 turns result caching off.
+        self.cache = ResultCache(cache_size) if cache_size else None
+        self.session = Session()
+        self.watcher = None
+        self.recorder = None
+        self.timings = None
+        self.metrics = None
+        # Set by chatbot.profiler in cprofile mode.
+        self.profiler = None
+
+    @property
+    def workflows(self):
+        return self.graph.nodes
+
+    def reload_workflows(self):
+        """
+        Reloads the tree from disk and rebuilds every matcher derived from it.
+        """
+        self.swap_graph(load_graph(self.workflow_path, force=True))
+
+    def swap_graph(self, graph):
+        """
+        Publishes a new graph. Turns already running finish on the graph they
+        started with; sessions move over on their next message.
+        """
+        self.graph = graph
+        if self.cache is not None:
+            self.cache.clear()
+        if self.metrics is not None:
+            self.metrics.reloads += 1
+            self.metrics.set_graph(graph)
+
+    def enable_hot_reload(self, interval=1.0):
+        """
+        Watches the workflow file and swaps in the new tree whenever it changes,
+        without restarting the engine or dropping sessions.
+        """
+        if self.watcher is None:
+            from chatbot.reloader import WorkflowWatcher
+            self.watcher = WorkflowWatcher(self.graph.path or self.workflow_path, interval=interval)
+            self.watcher.subscribe(self.swap_graph)
+            self.watcher.start()
+        return self.watcher
+
+    def disable_hot_reload(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def start_recording(self, path, **options):
+        """
+        Appends every respond() turn to a rotating traffic log at path;
+        options go to TrafficRecorder. Replay it with chatbot.replayer.
+        """
+        if self.recorder is None:
+            from chatbot.recorder import TrafficRecorder
+            self.recorder = TrafficRecorder(path, **options)
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+
+    def enable_timings(self, max_nodes=1000):
+        """
+        Starts timing every stage of respond() into fixed-size histograms
+        (chatbot.latency.LatencyStats) and returns them; read them with
+        engine.timings.to_dict() or to_json(). Stages: session (reload
+        migration), normalize, cache, intent, traverse, typo, fallback,
+        terminal (building the reply for the node reached), apply; plus
+        whole turns, overall and per node.
+        """
+        if self.timings is None:
+            from chatbot.latency import LatencyStats
+            self.timings = LatencyStats(max_nodes=max_nodes)
+        return self.timings
+
+    def disable_timings(self):
+        self.timings = None
+
+    def enable_metrics(self, max_node_labels=1000):
+        """
+        Starts counting turns by outcome and node (chatbot.metrics); serve
+        them with chatbot.metrics.start_metrics_server.
+        """
+        if self.metrics is None:
+            from chatbot.metrics import EngineMetrics
+            metrics = EngineMetrics(max_node_labels=max_node_labels)
+            metrics.set_graph(self.graph)
+            self.metrics = metrics
+        return self.metrics
+
+    def new_session(self, session_id=None):
+        return Session(session_id)
+
+    def reset_session(self, session=None):
+        (session or self.session).reset()
+
+    def respond_for(self, session_id, user_input):
+        """
+        Handles one message for session_id, loading the session from the
+        store and saving it back afterwards.
+        """
+        session = self.store.get_or_create(session_id)
+        response = self.respond(user_input, session)
+        self.store.put(session)
+        return response
+
+    async def respond_async(self, session_id, user_input):
+        """
+        Coroutine form of respond_for for asyncio servers. A turn is a few
+        microseconds of CPU work, so it runs inline on the event loop; nothing
+        awaits between loading and saving the session, so turns of one
+        session never interleave.
+        """
+        return self.respond_for(session_id, user_input)
+
+    def respond(self, user_input, session=None):
+        """
+        Handles one user message. session defaults to the engine's built-in
+        session; pass a Session to serve many users from one engine.
+        """
+        session = session or self.session
+        profiler = self.profiler
+        if self.recorder is None and self.timings is None and profiler is None:
+            return self._respond(user_input, session)
+        if profiler is not None:
+            return profiler.runcall(self._observed_respond, user_input, session)
+        return self._observed_respond(user_input, session)
 
+    def _observed_respond(self, user_input, session):
+        recorder, timings = self.recorder, self.timings
+        if recorder is None and timings is None:
+            return self._respond(user_input, session)
+        node_before, intent_before = session.current_node, session.current_intent
+        start = time.perf_counter_ns()
+        reply = self._respond(user_input, session)
+        elapsed = time.perf_counter_ns() - start
+        if timings is not None:
+            timings.record_turn(node_before, elapsed)
+        if recorder is not None:
+            text = user_input.raw if isinstance(user_input, NormalizedInput) else user_input
+            recorder.record(time.time(), session.session_id, text, node_before, session.current_node, elapsed / 1e9,
+                            intent_before, session.current_intent)
+        return reply
+
+    def _respond(self, user_input, session):
+        # Stage timers: each `if clock` lap costs one truth test when timings are off.
+        clock = self.timings
+        if clock:
+            t = clock.now()
+        # One turn runs entirely on one version of the tree, even if a reload lands meanwhile.
+        graph = self.graph
+
+        # Migrate sessions across reloads: a flow whose node was removed starts over.
+        if session.current_node != 'root' and session.current_node not in graph:
+            session.reset()
+        if clock:
+            t = clock.lap('session', t)
+
+        # Normalize input once; every stage below reuses the tokens
+        user_input = normalize(user_input)
+        if clock:
+            t = clock.lap('normalize', t)
+
+        outcome = self._outcome(graph, session.current_node, session.current_intent, user_input)
+        if self.metrics is not None:
+            self.metrics.observe(outcome[0], outcome[1])
+        if clock:
+            t = clock.now()
+        reply = self._apply(session, outcome)
+        if clock:
+            clock.lap('apply', t)
+        return reply
+
+    def respond_batch(self, items, details=False):
+        """
+        Handles many (session_id, text) messages at once and returns the
+        replies in input order. Messages of one session are applied in the
+        order given; each round takes the next message of every session and
+        resolves each distinct (node, intent, text) group only once.
+        Sessions come from the store and are saved back at the end.
+        With details set, each result is (reply, node, intent) after the turn.
+        Batched turns are not recorded by start_recording().
+        """
+        graph = self.graph
+        results = [None] * len(items)
+        # Only indices are queued: a chunk of a replay can hold many
+        # thousands of messages, and fewer live objects means less GC work.
+        queues = {}
+        for i, (session_id, _) in enumerate(items):
+            queue = queues.get(session_id)
+            if queue is None:
+                queues[session_id] = [i]
+            else:
+                queue.append(i)
+        sessions = {}
+        for session_id in queues:
+            session = sessions[session_id] = self.store.get_or_create(session_id)
+            if session.current_node != 'root' and session.current_node not in graph:
+                session.reset()
+
+        turn = 0
+        active = list(queues)
+        while active:
+            groups = {}
+            for session_id in active:
+                i = queues[session_id][turn]
+                session = sessions[session_id]
+                user_input = normalize(items[i][1])
+                key = (session.current_node, session.current_intent, user_input.text)
+                group = groups.get(key)
+                if group is None:
+                    # The input, then the index of every message that shares it.
+                    groups[key] = [user_input, i]
+                else:
+                    group.append(i)
+            for (node_id, intent, _), group in groups.items():
+                outcome = self._outcome(graph, node_id, intent, group[0])
+                if self.metrics is not None:
+                    self.metrics.observe(outcome[0], outcome[1], len(group) - 1)
+                for i in itertools.islice(group, 1, None):
+                    session = sessions[items[i][0]]
+                    reply = self._apply(session, outcome)
+                    results[i] = (reply, session.current_node, session.current_intent) if details else reply
+            turn += 1
+            active = [session_id for session_id in active if len(queues[session_id]) > turn]
+
+        for session in sessions.values():
+            self.store.put(session)
+        return results
+
+    def _outcome(self, graph, current_node, current_intent, user_input):
+        """
+        _resolve through the result cache. The outcome depends only on the
+        tree, where the session is and the words typed, so repeated phrases
+        are answered from the cache.
+        """
+        cache = self.cache
+        if cache is None:
+            return self._resolve(graph, current_node, current_intent, user_input)
+        clock = self.timings
+        if clock:
+            t = clock.now()
+        key = (graph.version, current_node, current_intent, user_input.text)
+        outcome = cache.get(key)
+        if clock:
+            clock.lap('cache', t)
+        if outcome is None:
+            outcome = self._resolve(graph, current_node, current_intent, user_input)
+            cache.put(key, outcome)
+        return outcome
+
+    def _apply(self, session, outcome):
+        """
+        Applies a turn outcome from _resolve to session and returns the reply.
+        """
+        action, node_id, reply = outcome
+        if action == RESET or action == FINISH:
+            session.reset()
+        elif action == SWITCH or action == ENTER:
+            if action == SWITCH:
+                session.reset()
+            session.current_intent = node_id
+            session.current_node = node_id
+            session.history.append(node_id)
+        elif action == MOVE:
+            session.current_node = node_id
+            session.history.append(node_id)
+        elif action == JUMP:
+            # The previous flow's intent no longer applies: keep it only if
+            # the hit is an intent's own entry node, so a later mention of
+            # that intent (or any other) is detected as a switch.
+            session.current_intent = node_id if node_id in INTENT_KEYWORDS else None
+            session.current_node = node_id
+            session.history.append(node_id)
+        return reply
+
+    def _resolve(self, graph, current_node, current_intent, user_input):
+        """
+        Decides what a message does from current_node without touching any
+        session. Returns an (action, node id, reply) outcome.
+        """
         # Check for session reset commands
-        if user_input in ['restart', 'reset']:
-            self.reset_session()
-            return "Session reset. How can I assist you now?"
+        if user_input.text in ['restart', 'reset']:
+            return (RESET, None, "Session reset. How can I assist you now?")
+
+        outcome = self._match(graph, current_node, current_intent, user_input)
+        if outcome is None:
+            clock = self.timings
+            if clock:
+                t = clock.now()
+            # Nothing matched as typed: retry once with misspelled keywords fixed.
+            corrected = graph.correct(user_input)
+            if clock:
+                clock.lap('typo', t)
+            if corrected is not None:
+                outcome = self._match(graph, current_node, current_intent, corrected)
+        if outcome is None:
+            outcome = self._fallback(graph, current_node, user_input)
+        return outcome
 
+    def _match(self, graph, current_node, current_intent, user_input):
+        """
+        Runs intent detection and edge traversal for one normalized input.
+        Returns the outcome, or None when neither matched.
+        """
+        clock = self.timings
+        if clock:
+            t = clock.now()
         # Detect intent/keywords
-        detected_intent = keyword_detect(user_input, self.workflows)
+        detected_intent = keyword_detect(user_input, graph.nodes, graph.intent_matcher, stem=graph.stem)
+        if clock:
+            clock.lap('intent', t)
 
         if detected_intent:
             # If we detect a new intent and we are not in root, reset to root for new flow
-            if self.session['current_node'] != 'root' and detected_intent != self.session.get('current_intent'):
-                self.reset_session()
-                self.session['current_intent'] = detected_intent
-                self.session['current_node'] = detected_intent
-                self.session['history'].append(f"Intent detected: {detected_intent}")
-                return self.get_current_prompt()
-            
+            if current_node != 'root' and detected_intent != current_intent:
+                return (SWITCH, detected_intent, self._prompt_for(graph, detected_intent))
+
             # Continue existing flow
-            if self.session['current_node'] == 'root':
-                self.session['current_intent'] = detected_intent
-                self.session['current_node'] = detected_intent
-                self.session['history'].append(f"Intent detected: {detected_intent}")
-                return self.get_current_prompt()
-        
+            if current_node == 'root':
+                return (ENTER, detected_intent, self._prompt_for(graph, detected_intent))
+
         # If in a decision tree, traverse based on input
-        if self.session['current_node'] and self.session['current_node'] != 'root':
-            next_node = self.traverse_decision_tree(self.session['current_node'], user_input)
+        if current_node and current_node != 'root':
+            if clock:
+                t = clock.now()
+            next_node = graph.next_node(current_node, user_input)
+            if clock:
+                clock.lap('traverse', t)
             if next_node:
-                self.session['current_node'] = next_node
-                self.session['history'].append(f"Moved to node: {next_node}")
-                # Check if next node is terminal
-                if self.is_terminal_node(next_node):
-                    response = self.workflows[next_node].get('response', "Here's what I suggest.")
-                    self.reset_session()
-                    return response + "\n\nYou can type another issue or 'exit' to quit."
-                else:
-                    return self.get_current_prompt()
-            else:
-                # Unable to traverse, fallback response
-                fallback = simple_llm_fallback(user_input)
-                return fallback
-        
-        # No intent detected and not in flow
-        fallback = simple_llm_fallback(user_input)
-        return fallback
-
-    def get_current_prompt(self):
-        node = self.session['current_node']
-        node_data = self.workflows.get(node, {})
+                return self._move_to(graph, next_node)
+
+        # Unable to traverse, or no intent detected and not in flow
+        return None
+
+    def _fallback(self, graph, current_node, user_input):
+        """
+        Jumps to the node whose text best matches the input, if any matches
+        well enough; otherwise answers with simple_llm_fallback.
+        """
+        clock = self.timings
+        if clock:
+            t = clock.now()
+        target = retrieval_target(graph, current_node, user_input)
+        if target is None:
+            outcome = (REPLY, None, simple_llm_fallback(user_input))
+        else:
+            outcome = (JUMP, target, self._prompt_for(graph, target))
+        if clock:
+            clock.lap('fallback', t)
+        return outcome
+
+    def _move_to(self, graph, node_id):
+        clock = self.timings
+        if clock:
+            t = clock.now()
+        # Check if next node is terminal
+        if graph.is_terminal(node_id):
+            response = graph.get_node(node_id).get('response', "Here's what I suggest.")
+            outcome = (FINISH, node_id, response + "\n\nYou can type another issue or 'exit' to quit.")
+        else:
+            outcome = (MOVE, node_id, self._prompt_for(graph, node_id))
+        if clock:
+            clock.lap('terminal', t)
+        return outcome
+
+    def get_current_prompt(self, session=None):
+        return self._prompt(self.graph, session or self.session)
+
+    def _prompt(self, graph, session):
+        return self._prompt_for(graph, session.current_node)
+
+    def _prompt_for(self, graph, node_id):
+        node_data = graph.get_node(node_id)
         prompt = node_data.get('prompt', "Please provide more details.")
         return prompt
 
@@ -88,18 +424,10 @@ class ChatbotEngine:
         """
         Traverse the workflow decision tree based on user input.
         Matches keywords in user_input with edges defined in workflows.
+        The longest matching keyword wins, then the first one declared.
         Returns the next node id or None if no match.
         """
-        node_data = self.workflows.get(current_node, {})
-        edges = node_data.get('edges', {})
-
-        # Check user input keywords against edges
-        for keyword, next_node in edges.items():
-            if keyword in user_input:
-                return next_node
-        
-        return None
+        return self.graph.next_node(current_node, user_input)
 
     def is_terminal_node(self, node):
-        node_data = self.workflows.get(node, {})
-        return node_data.get('terminal', False)
+        return self.graph.is_terminal(node)
@@ -0,0 +1,217 @@
+"""
+Typo-tolerant matching with a symmetric-delete (SymSpell) index.
+
+Every vocabulary word is stored under all the strings obtained by deleting
+up to max_distance characters from (a prefix of) it. A misspelling reaches
+the same strings by deleting from itself, so finding candidates at edit
+distance 1-2 is a handful of dictionary lookups, whatever the vocabulary
+size; only those candidates are checked with a real edit distance.
+"""
+from collections import deque
+from chatbot.nlp_utils import NormalizedInput, normalize, stem_word, tokenize
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent
+    transpositions) between a and b, or max_distance + 1 once it is known
+    to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous2 = None
+    previous = list(range(len(a) + 1))
+    for j in range(1, len(b) + 1):
+        current = [j] + [0] * len(a)
+        row_min = j
+        cb = b[j - 1]
+        for i in range(1, len(a) + 1):
+            cost = 0 if a[i - 1] == cb else 1
+            value = min(previous[i] + 1, current[i - 1] + 1, previous[i - 1] + cost)
+            if (previous2 is not None and i > 1 and a[i - 1] == b[j - 2] and a[i - 2] == cb):
+                value = min(value, previous2[i - 2] + 1)
+            current[i] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[len(a)], max_distance + 1)
+
+
+class SymSpellIndex:
+    """
+    Symmetric-delete dictionary over a vocabulary of words. lookup(word)
+    returns the closest known word within max_distance edits; ties go to
+    the word added most often, then to the first one added.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []       # word id -> word
+        self.counts = []      # word id -> number of times added
+        self._ids = {}        # word -> word id
+        self._deletes = {}    # delete string -> word id, or list of word ids
+        self._max_length = 0
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self._ids
+
+    def add(self, word, count=1):
+        word_id = self._ids.get(word)
+        if word_id is not None:
+            self.counts[word_id] += count
+            return
+        word_id = len(self.words)
+        self._ids[word] = word_id
+        self.words.append(word)
+        self.counts.append(count)
+        self._max_length = max(self._max_length, len(word))
+        deletes = self._deletes
+        for key in self._edits(word[:self.prefix_length]):
+            # Most delete strings belong to a single word: store the bare id.
+            existing = deletes.get(key)
+            if existing is None:
+                deletes[key] = word_id
+            elif isinstance(existing, list):
+                existing.append(word_id)
+            else:
+                deletes[key] = [existing, word_id]
+
+    def _edits(self, word):
+        edits = {word}
+        frontier = [word]
+        for _ in range(self.max_distance):
+            next_frontier = []
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    deleted = item[:i] + item[i + 1:]
+                    if deleted not in edits:
+                        edits.add(deleted)
+                        next_frontier.append(deleted)
+            frontier = next_frontier
+        return edits
+
+    def lookup(self, word, max_distance=None):
+        """
+        Returns (known word, distance) or None if nothing is close enough.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if word in self._ids:
+            return word, 0
+        if max_distance <= 0 or len(word) - max_distance > self._max_length:
+            return None
+        prefix = word[:self.prefix_length]
+        best = None
+        best_distance = max_distance + 1
+        checked = set()
+        considered = {prefix}
+        queue = deque([prefix])
+        while queue:
+            candidate = queue.popleft()
+            deleted = len(prefix) - len(candidate)
+            # Candidates come out shortest-deletion first; none further can do better.
+            if deleted > best_distance:
+                break
+            ids = self._deletes.get(candidate)
+            if ids is not None:
+                for word_id in (ids if isinstance(ids, list) else (ids,)):
+                    if word_id in checked:
+                        continue
+                    checked.add(word_id)
+                    suggestion = self.words[word_id]
+                    if abs(len(suggestion) - len(word)) > max_distance:
+                        continue
+                    distance = edit_distance(word, suggestion, min(best_distance, max_distance))
+                    if distance > max_distance:
+                        continue
+                    if (distance < best_distance
+                            or (distance == best_distance and self._better(word_id, best))):
+                        best, best_distance = word_id, distance
+            if deleted < max_distance and len(candidate) > 1:
+                for i in range(len(candidate)):
+                    shorter = candidate[:i] + candidate[i + 1:]
+                    if shorter not in considered:
+                        considered.add(shorter)
+                        queue.append(shorter)
+        return (self.words[best], best_distance) if best is not None else None
+
+    def _better(self, word_id, best):
+        return best is None or (self.counts[word_id], -word_id) > (self.counts[best], -best)
+
+
+# Keywords shorter than this are never the result of a correction: one edit
+# away from "hot" or "yes" lies half the dictionary ("host", "eyes").
+MIN_CORRECTED_LENGTH = 4
+
+
+def max_typos(word):
+    """
+    How many edits a word of this length may be corrected by: none for
+    short words, where almost every word is a typo of some keyword, and
+    two only from nine letters ("internal" is two edits from "internet").
+    """
+    if len(word) < 5:
+        return 0
+    if len(word) < 9:
+        return 1
+    return 2
+
+
+def plausible_correction(word, keyword, distance):
+    """
+    Whether a typo of `keyword` is a likelier reading of `word` than the
+    word itself. Corrections never shorten a word or produce a keyword
+    under MIN_CORRECTED_LENGTH letters ("heart" is not "heat"), and a
+    single edit must keep the first letter, which people rarely mistype
+    ("netwrok" and "chargng" are still corrected).
+    """
+    if len(keyword) < MIN_CORRECTED_LENGTH or len(keyword) < len(word):
+        return False
+    return distance != 1 or word[0] == keyword[0]
+
+
+class TypoCorrector:
+    """
+    Corrects misspelled words of a message towards a keyword vocabulary.
+    Words that are already known, or whose stem is, are left alone.
+    """
+
+    def __init__(self, phrases=(), max_distance=2):
+        self.index = SymSpellIndex(max_distance=max_distance)
+        self.stems = set()
+        for phrase in phrases:
+            self.add(phrase)
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, phrase):
+        for word in tokenize(phrase):
+            self.index.add(word)
+            self.stems.add(stem_word(word))
+
+    def correct(self, user_input):
+        """
+        Returns a NormalizedInput with misspelled words replaced, or None if
+        no word needed correcting.
+        """
+        user_input = normalize(user_input)
+        tokens = list(user_input.tokens)
+        changed = False
+        for i, token in enumerate(tokens):
+            if token in self.index or stem_word(token) in self.stems:
+                continue
+            hit = self.index.lookup(token, max_typos(token))
+            if hit is not None and plausible_correction(token, *hit):
+                tokens[i] = hit[0]
+                changed = True
+        return NormalizedInput(' '.join(tokens)) if changed else None
@@ -0,0 +1,231 @@
+import itertools
+import json
+import os
+import threading
+from types import MappingProxyType
+from chatbot.compiled_tree import CompiledTree, changed_nodes, load_compiled
+from chatbot.fuzzy import TypoCorrector
+from chatbot.matcher import KeywordAutomaton, KeywordList
+from chatbot.nlp_utils import INTENT_KEYWORDS, build_intent_matcher, normalize, phrase_key
+from chatbot.retrieval import index_graph_nodes
+
+DEFAULT_WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), '../data/troubleshooting_tree.json')
+
+_EMPTY = MappingProxyType({})
+
+# Nodes with more edges than this match them with an Aho-Corasick automaton;
+# below it a plain scan of the keywords is faster (benchmarks/bench_traverse.py).
+AUTOMATON_MIN_EDGES = 100
+
+_versions = itertools.count(1)
+
+
+def _changes(old, new):
+    """
+    (changed ids, removed ids) from one version of a tree to the next, or
+    None when they cannot be compared cheaply (a compiled tree and a dict).
+    """
+    if isinstance(old, CompiledTree) and isinstance(new, CompiledTree):
+        return changed_nodes(old, new)
+    if isinstance(old, CompiledTree) or isinstance(new, CompiledTree):
+        return None
+    return ([node_id for node_id, node in new.items() if old.get(node_id) != node],
+            [node_id for node_id in old if node_id not in new])
+
+
+def _freeze(tree):
+    nodes = {}
+    for node_id, node_data in tree.items():
+        node = dict(node_data)
+        if isinstance(node.get('edges'), dict):
+            node['edges'] = MappingProxyType(dict(node['edges']))
+        nodes[node_id] = MappingProxyType(node)
+    return MappingProxyType(nodes)
+
+
+class WorkflowGraph:
+    """
+    Read-only, compiled view of a troubleshooting tree.
+    One instance is shared by every engine and session in the process;
+    per-user state lives in chatbot.session.Session. Keywords are matched
+    on whole words of the normalized input, stemmed unless stem=False.
+
+    Misspelled keywords are matched through a typo corrector built over all
+    intent and edge keywords. A BM25 index over the text of every node
+    backs the fallback stage.
+    Passing the index of the previous version of the tree as `index` lets
+    a reload re-index only the nodes that changed: the two versions are
+    diffed, by digest for compiled trees.
+    """
+
+    def __init__(self, tree, path=None, mtime=None, stem=True, index=None):
+        self.path = path
+        self.mtime = mtime
+        self.stem = stem
+        # Unique per loaded tree; keys caches of results computed on it.
+        self.version = next(_versions)
+        self.intent_matcher = build_intent_matcher(stem=stem)
+        # node id -> KeywordList or KeywordAutomaton, or None for nodes without edges
+        self.edge_matchers = {}
+        self._retrieval = None
+        self._retrieval_base = index
+        self._retrieval_lock = threading.Lock()
+        self._corrector = None
+        self._corrector_lock = threading.Lock()
+        if isinstance(tree, CompiledTree):
+            # Memory-mapped trees can be huge: edge matchers are built on
+            # first use, the corrector and index by warm().
+            self.nodes = tree
+        else:
+            self.nodes = _freeze(tree)
+            for node_id in self.nodes:
+                self._edge_matcher(node_id)
+            self.warm()
+
+    @classmethod
+    def from_file(cls, path, compiled=True, strict=False, index=None):
+        """
+        Loads the JSON tree at path. With compiled=True the tree is served
+        from its memory-mapped compiled form, rebuilt when the JSON is newer;
+        plain JSON parsing is the fallback. Unreadable files give an empty
+        graph, or raise when strict is set. The graph comes back warmed.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if compiled:
+                try:
+                    graph = cls(load_compiled(path), path=path, mtime=mtime, index=index)
+                except Exception as e:
+                    print(f"Compiled tree unavailable, parsing JSON: {e}")
+                else:
+                    return graph.warm()
+            with open(path, 'r', encoding='utf-8') as f:
+                tree = json.load(f)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Error loading workflows: {e}")
+            return cls({}, path=path)
+        return cls(tree, path=path, mtime=mtime, index=index)
+
+    def typo_corrector(self):
+        """
+        Returns the TypoCorrector over every intent and edge keyword,
+        building it on first call.
+        """
+        if self._corrector is None:
+            with self._corrector_lock:
+                if self._corrector is None:
+                    corrector = TypoCorrector(keyword for keywords in INTENT_KEYWORDS.values()
+                                              for keyword in keywords)
+                    for node_data in self.nodes.values():
+                        for keyword in node_data.get('edges') or ():
+                            corrector.add(keyword)
+                    self._corrector = corrector
+        return self._corrector
+
+    def warm(self):
+        """
+        Builds the typo corrector and retrieval index now, rather than on
+        the first message that needs them. Returns the graph.
+        """
+        self.typo_corrector()
+        self.retrieval_index()
+        return self
+
+    def correct(self, user_input):
+        """
+        Returns user_input with misspelled keywords fixed, as a
+        NormalizedInput, or None if there was nothing to fix.
+        """
+        return self.typo_corrector().correct(user_input)
+
+    def retrieval_index(self):
+        """
+        Returns the BM25 index over this tree's nodes, building it on first
+        call. An index inherited from the previous tree is synced in place,
+        so only added, changed and removed nodes are (re)indexed and, when
+        the two trees can be diffed, only those nodes are read; the
+        previous graph may see the new documents meanwhile, which is why
+        search results are always checked against the graph's own nodes.
+        """
+        if self._retrieval is None:
+            with self._retrieval_lock:
+                if self._retrieval is None:
+                    base = self._retrieval_base
+                    changes = None
+                    if base is not None and base.source is not None:
+                        changes = _changes(base.source, self.nodes)
+                    self._retrieval = index_graph_nodes(self.nodes, base, changes)
+                    self._retrieval_base = None
+        return self._retrieval
+
+    def search(self, user_input, k=3, exclude=()):
+        """
+        Returns up to k (node id, score) pairs for the nodes whose prompt,
+        response or id best match user_input, best first.
+        """
+        hits = self.retrieval_index().search(user_input, k + len(exclude))
+        return [(node_id, score) for node_id, score in hits
+                if node_id in self.nodes and node_id not in exclude][:k]
+
+    def _edge_matcher(self, node_id):
+        try:
+            return self.edge_matchers[node_id]
+        except KeyError:
+            pass
+        edges = self.get_node(node_id).get('edges') or {}
+        matcher = None
+        if edges:
+            patterns = [(phrase_key(keyword, self.stem), target) for keyword, target in edges.items()]
+            matcher = (KeywordAutomaton if len(patterns) > AUTOMATON_MIN_EDGES else KeywordList)(patterns)
+        self.edge_matchers[node_id] = matcher
+        return matcher
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get_node(self, node_id):
+        return self.nodes.get(node_id, _EMPTY)
+
+    def next_node(self, node_id, user_input):
+        """
+        Returns the target of the longest edge keyword of node_id found in
+        user_input (ties go to the first declared edge), or None.
+        user_input may be a string or a NormalizedInput.
+        """
+        matcher = self._edge_matcher(node_id)
+        if matcher is None:
+            return None
+        hit = matcher.longest_match(normalize(user_input).key(self.stem))
+        return hit[1] if hit else None
+
+    def is_terminal(self, node_id):
+        return self.get_node(node_id).get('terminal', False)
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def load_graph(path=None, force=False, compiled=True, strict=False):
+    """
+    Returns the process-wide graph for path, loading the file only when it
+    has not been loaded yet, has changed on disk, or force is set.
+    With strict set, load errors raise and the cached graph is kept.
+    """
+    path = os.path.realpath(path or DEFAULT_WORKFLOW_PATH)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _graphs_lock:
+        graph = _graphs.get(path)
+        if force or graph is None or graph.mtime != mtime:
+            previous = graph._retrieval if graph is not None else None
+            graph = WorkflowGraph.from_file(path, compiled=compiled, strict=strict, index=previous)
+            _graphs[path] = graph
+        return graph
@@ -0,0 +1,176 @@
+"""
+Fixed-memory latency histograms for the engine's per-stage timers.
+
+Buckets are log-linear, as in HdrHistogram: every power of two is split
+into 2**sub_bits equal sub-buckets, so each recorded value is known to
+within 1 / 2**sub_bits of itself (about 6% with the default 4 bits) and a
+histogram covering 1 ns to 2**max_bits ns is a flat list of a few
+hundred counters, however many values it has seen.
+"""
+import json
+import threading
+import time
+
+_now = time.perf_counter_ns
+
+
+class LatencyHistogram:
+    __slots__ = ('sub_bits', 'max_value', 'counts', 'count', 'total', 'min', 'max', '_linear')
+
+    def __init__(self, sub_bits=4, max_bits=40):
+        self.sub_bits = sub_bits
+        self.max_value = (1 << max_bits) - 1
+        # Values below this get a bucket each.
+        self._linear = 2 << sub_bits
+        self.counts = [0] * (self._index(self.max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = self.max_value
+        self.max = 0
+
+    def _index(self, value):
+        if value < (2 << self.sub_bits):
+            return value
+        shift = value.bit_length() - self.sub_bits - 1
+        return (shift << self.sub_bits) + (value >> shift)
+
+    def _upper(self, index):
+        # Highest value that lands in bucket index.
+        if index < (2 << self.sub_bits):
+            return index
+        shift = (index >> self.sub_bits) - 1
+        top = index - (shift << self.sub_bits)
+        return ((top + 1) << shift) - 1
+
+    def record(self, ns):
+        """
+        Records one duration in integer nanoseconds; values past the range
+        are clamped to its top. _index is inlined: this runs several times
+        per turn when timings are on.
+        """
+        if ns >= self._linear:
+            if ns > self.max_value:
+                ns = self.max_value
+            shift = ns.bit_length() - self.sub_bits - 1
+            self.counts[(shift << self.sub_bits) + (ns >> shift)] += 1
+        else:
+            if ns < 0:
+                ns = 0
+            self.counts[ns] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        if ns < self.min:
+            self.min = ns
+
+    def percentile(self, pct):
+        """
+        Returns the value (ns) at or below which pct percent of the recorded
+        values fall, rounded up to its bucket's upper edge.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(self._upper(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        """
+        Summary in microseconds, plus the non-empty buckets as
+        {upper edge in ns: count} so dumps can be merged later.
+        """
+        return {
+            'count': self.count,
+            'min_us': (self.min if self.count else 0) / 1e3,
+            'mean_us': self.mean() / 1e3,
+            'p50_us': self.percentile(50) / 1e3,
+            'p90_us': self.percentile(90) / 1e3,
+            'p99_us': self.percentile(99) / 1e3,
+            'p999_us': self.percentile(99.9) / 1e3,
+            'max_us': self.max / 1e3,
+            'buckets': {self._upper(i): n for i, n in enumerate(self.counts) if n},
+        }
+
+
+class LatencyStats:
+    """
+    Histograms per engine stage and of whole turns per node (the node the
+    session was at). At most max_nodes nodes get their own histogram; the
+    rest share OTHER_NODES. Counters are not locked: under many threads a
+    few increments may be lost, which is fine for latency statistics.
+    """
+    OTHER_NODES = '(other)'
+
+    def __init__(self, max_nodes=1000, sub_bits=4):
+        self.max_nodes = max_nodes
+        self.sub_bits = sub_bits
+        self.stages = {}
+        self.nodes = {}
+        self._lock = threading.Lock()
+
+    now = staticmethod(_now)
+
+    def _histogram(self, table, key):
+        with self._lock:
+            histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = LatencyHistogram(self.sub_bits)
+            return histogram
+
+    def lap(self, stage, start):
+        """
+        Records the time since start (from now()) under stage and returns
+        the current time, so consecutive stages can chain laps.
+        """
+        end = _now()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self._histogram(self.stages, stage)
+        histogram.record(end - start)
+        return end
+
+    def record_turn(self, node_id, ns):
+        histogram = self.stages.get('turn') or self._histogram(self.stages, 'turn')
+        histogram.record(ns)
+        histogram = self.nodes.get(node_id)
+        if histogram is None:
+            if len(self.nodes) >= self.max_nodes:
+                node_id = self.OTHER_NODES
+            histogram = self.nodes.get(node_id) or self._histogram(self.nodes, node_id)
+        histogram.record(ns)
+
+    def stage(self, name):
+        return self.stages.get(name)
+
+    def node(self, node_id):
+        return self.nodes.get(node_id)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.nodes = {}
+
+    def to_dict(self):
+        return {
+            'stages': {name: h.to_dict() for name, h in list(self.stages.items())},
+            'nodes': {node_id: h.to_dict() for node_id, h in list(self.nodes.items())},
+        }
+
+    def to_json(self, path=None):
+        """
+        Returns the statistics as JSON, also writing them to path if given.
+        """
+        data = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        return data
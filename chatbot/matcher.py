@@ -0,0 +1,144 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of keywords.
+    Every keyword carries a value (e.g. an intent or a target node) and is
+    remembered with its declaration order, so callers can rebuild the
+    "first keyword wins" behaviour of a plain loop over the keywords.
+    """
+
+    def __init__(self, patterns=None):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._dict_link = [0]
+        self.patterns = []
+        self._built = False
+        if patterns:
+            for keyword, value in patterns:
+                self.add(keyword, value)
+            self.build()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def add(self, keyword, value):
+        # An empty keyword would match everywhere; it is never useful as a trigger.
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._dict_link.append(0)
+            state = nxt
+        self._out[state].append(len(self.patterns))
+        self.patterns.append((keyword, value))
+        self._built = False
+
+    def build(self):
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            dict_link[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                # Link straight to the nearest suffix state that ends a keyword.
+                link = fail[nxt]
+                dict_link[nxt] = link if out[link] else dict_link[link]
+        self._built = True
+        return self
+
+    def iter_matches(self, text):
+        """
+        Yields (start, end, pattern_index) for every keyword occurrence in text,
+        in a single pass over the input.
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        state = 0
+        for pos, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            hit = state if out[state] else dict_link[state]
+            while hit:
+                end = pos + 1
+                for idx in out[hit]:
+                    yield end - len(self.patterns[idx][0]), end, idx
+                hit = dict_link[hit]
+
+    def find_all(self, text):
+        """
+        Returns every hit as (start, end, keyword, value), ordered by position.
+        """
+        patterns = self.patterns
+        hits = [(start, end, patterns[idx][0], patterns[idx][1])
+                for start, end, idx in self.iter_matches(text)]
+        hits.sort(key=lambda h: (h[0], h[1]))
+        return hits
+
+    def first_declared(self, text):
+        """
+        Returns the (keyword, value) declared earliest among all keywords found
+        in text, or None. Same result as looping over the keywords in order.
+        """
+        best = None
+        for _, _, idx in self.iter_matches(text):
+            if best is None or idx < best:
+                best = idx
+                if best == 0:
+                    break
+        return None if best is None else self.patterns[best]
+
+    def longest_match(self, text):
+        """
+        Returns the (keyword, value) of the longest keyword found in text,
+        ties broken by declaration order, or None.
+        """
+        best = None
+        best_len = 0
+        patterns = self.patterns
+        for start, end, idx in self.iter_matches(text):
+            length = end - start
+            if length > best_len or (length == best_len and idx < best):
+                best, best_len = idx, length
+        return None if best is None else patterns[best]
+
+
+class KeywordList:
+    """
+    The few-keywords counterpart of KeywordAutomaton.longest_match: a plain
+    scan of substring tests, longest keyword first. Below a few dozen
+    keywords this beats walking the automaton one character at a time.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = [(keyword, value) for keyword, value in patterns if keyword]
+        # sorted() is stable: keywords of equal length keep declaration order.
+        self._longest_first = sorted(self.patterns, key=lambda pattern: -len(pattern[0]))
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def longest_match(self, text):
+        for pattern in self._longest_first:
+            if pattern[0] in text:
+                return pattern
+        return None
@@ -0,0 +1,301 @@
+"""
+Engine counters in Prometheus text format, served by a stdlib HTTP server.
+
+Each thread that handles messages gets its own counter object, so the hot
+path only ever increments counters no other thread writes and takes no
+lock; a scrape copies and sums every thread's counters. Node visit counts
+are labelled with the node id for the first max_node_labels nodes of the
+tree (in file order) and reported under node="(other)" beyond that, so a
+huge tree cannot blow up the number of series.
+
+    engine.enable_metrics()
+    start_metrics_server(engine, port=9108)     # GET /metrics
+
+In worker mode every worker process serves its own metrics on a loopback
+port and the supervisor serves their sum (WorkerMetrics).
+"""
+import itertools
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# One per outcome constant of chatbot.engine.
+OUTCOMES = ('enter', 'switch', 'move', 'jump', 'finish', 'reply', 'reset')
+OTHER_NODES = '(other)'
+
+
+class _ThreadCounters:
+    __slots__ = ('outcomes', 'nodes')
+
+    def __init__(self):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.nodes = {}
+
+
+class EngineMetrics:
+    def __init__(self, max_node_labels=1000):
+        self.max_node_labels = max_node_labels
+        self.started = time.time()
+        self.reloads = 0
+        self.node_labels = frozenset()
+        self._label_order = ()
+        self._local = threading.local()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def set_graph(self, graph):
+        """
+        Picks the node ids that get their own label from graph.
+        """
+        order = tuple(itertools.islice(graph.nodes, self.max_node_labels))
+        self._label_order = order
+        self.node_labels = frozenset(order)
+
+    def _register(self):
+        counters = self._local.counters = _ThreadCounters()
+        # Kept after the thread exits, so its counts are never lost.
+        with self._lock:
+            self._threads.append(counters)
+        return counters
+
+    def observe(self, action, node_id, n=1):
+        """
+        Counts n turns with the given outcome, reaching node_id (or None).
+        """
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self._register()
+        counters.outcomes[action] += n
+        if node_id is not None:
+            if node_id not in self.node_labels:
+                node_id = OTHER_NODES
+            nodes = counters.nodes
+            nodes[node_id] = nodes.get(node_id, 0) + n
+
+    def snapshot(self):
+        """
+        Sums the counters of every thread: {'outcomes': {...}, 'nodes': {...}}.
+        """
+        with self._lock:
+            threads = list(self._threads)
+        outcomes = dict.fromkeys(OUTCOMES, 0)
+        nodes = dict.fromkeys(self._label_order, 0)
+        for counters in threads:
+            # dict() copies in one step under the GIL, so a writer never
+            # changes the dict mid-iteration.
+            for action, n in dict(counters.outcomes).items():
+                outcomes[action] += n
+            for node_id, n in dict(counters.nodes).items():
+                nodes[node_id] = nodes.get(node_id, 0) + n
+        return {'outcomes': outcomes, 'nodes': nodes}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(engine):
+    """
+    Returns the Prometheus text exposition of engine's metrics.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    metrics = engine.metrics
+    snapshot = metrics.snapshot()
+    outcomes = snapshot['outcomes']
+    metric('chatbot_messages_total', 'counter', "Messages handled by the engine.",
+           [((), sum(outcomes.values()))])
+    metric('chatbot_turns_total', 'counter', "Turns by outcome.",
+           [((('outcome', action),), n) for action, n in outcomes.items()])
+    metric('chatbot_intent_hits_total', 'counter', "Turns that started an intent's flow.",
+           [((), outcomes['enter'] + outcomes['switch'])])
+    metric('chatbot_retrieval_jumps_total', 'counter', "Turns the fallback sent to a retrieval hit.",
+           [((), outcomes['jump'])])
+    metric('chatbot_fallbacks_total', 'counter', "Turns answered by the fallback without moving.",
+           [((), outcomes['reply'])])
+    metric('chatbot_terminal_resolutions_total', 'counter', "Turns that reached a terminal node.",
+           [((), outcomes['finish'])])
+    metric('chatbot_node_visits_total', 'counter',
+           f"Turns that reached each node; nodes past the first {metrics.max_node_labels} "
+           f"are counted as {OTHER_NODES}.",
+           [((('node', node_id),), n) for node_id, n in snapshot['nodes'].items()])
+
+    metric('chatbot_active_sessions', 'gauge', "Sessions held by the session store.",
+           [((), len(engine.store))])
+    store = engine.store
+    metric('chatbot_session_store_lookups_total', 'counter', "Session store lookups by result.",
+           [((('result', 'hit'),), store.hits), ((('result', 'miss'),), store.misses)])
+    metric('chatbot_session_store_evictions_total', 'counter', "Sessions evicted or expired.",
+           [((), store.evictions)])
+    if engine.cache is not None:
+        cache = engine.cache
+        metric('chatbot_result_cache_lookups_total', 'counter', "Turn result cache lookups by result.",
+               [((('result', 'hit'),), cache.hits), ((('result', 'miss'),), cache.misses)])
+        metric('chatbot_result_cache_evictions_total', 'counter', "Turn results evicted from the cache.",
+               [((), cache.evictions)])
+        metric('chatbot_result_cache_entries', 'gauge', "Turn results held by the cache.",
+               [((), len(cache))])
+
+    metric('chatbot_tree_nodes', 'gauge', "Nodes in the current tree.", [((), len(engine.graph))])
+    metric('chatbot_tree_reloads_total', 'counter', "Trees swapped in since start.", [((), metrics.reloads)])
+    watcher = engine.watcher
+    metric('chatbot_tree_reload_failures_total', 'counter', "Tree reloads rejected by the watcher.",
+           [((), watcher.failures if watcher is not None else 0)])
+    metric('chatbot_start_time_seconds', 'gauge', "Unix time the metrics started.", [((), metrics.started)])
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def _sample_name(sample):
+    return sample.split('{', 1)[0]
+
+
+def parse(text):
+    """
+    Reads a text exposition back: ({name: (type, help)}, {sample: value}),
+    where a sample is its line up to the value, labels included.
+    """
+    meta = {}
+    helps = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            name, _, help_text = line[7:].partition(' ')
+            helps[name] = help_text
+        elif line.startswith('# TYPE '):
+            name, _, kind = line[7:].partition(' ')
+            meta[name] = (kind, helps.get(name, ''))
+        elif line and not line.startswith('#'):
+            sample, _, value = line.rpartition(' ')
+            samples[sample] = float(value)
+    return meta, samples
+
+
+# How WorkerMetrics merges a gauge over the workers; the others are summed.
+_MERGED_GAUGES = {'chatbot_tree_nodes': max, 'chatbot_start_time_seconds': min}
+
+
+class WorkerMetrics:
+    """
+    The sum of the metrics worker processes serve on their own ports, for
+    the pool supervisor to serve as one endpoint. A worker that does not
+    answer a scrape keeps its last counter values in the sums, and they
+    are carried over once its replacement (a new start time) answers, so
+    the totals never go back.
+    """
+
+    def __init__(self, ports, host='127.0.0.1', timeout=2.0):
+        self.urls = [f"http://{host}:{port}/metrics" for port in ports]
+        self.timeout = timeout
+        self.meta = {}
+        self._order = {}          # every sample seen, in exposition order
+        self._carried = {}        # counter sample -> total of replaced workers
+        self._last = [(None, {}) for _ in self.urls]   # per worker: start time, counters
+        self._lock = threading.Lock()
+
+    def _scrape(self, url):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return parse(response.read().decode('utf-8'))
+
+    def render(self):
+        with self._lock:
+            up = 0
+            gauges = {}
+            for i, url in enumerate(self.urls):
+                try:
+                    meta, samples = self._scrape(url)
+                except (OSError, ValueError):
+                    continue
+                up += 1
+                self.meta.update(meta)
+                self._order.update(dict.fromkeys(samples))
+                started = samples.get('chatbot_start_time_seconds')
+                last_started, last_counters = self._last[i]
+                if last_started is not None and started != last_started:
+                    for sample, value in last_counters.items():
+                        self._carried[sample] = self._carried.get(sample, 0) + value
+                counters = {}
+                for sample, value in samples.items():
+                    if meta.get(_sample_name(sample), ('',))[0] == 'counter':
+                        counters[sample] = value
+                    else:
+                        gauges.setdefault(sample, []).append(value)
+                self._last[i] = (started, counters)
+            totals = dict(self._carried)
+            for _, counters in self._last:
+                for sample, value in counters.items():
+                    totals[sample] = totals.get(sample, 0) + value
+            for sample, values in gauges.items():
+                totals[sample] = _MERGED_GAUGES.get(_sample_name(sample), sum)(values)
+
+            by_name = {}
+            for sample in self._order:
+                if sample in totals:
+                    by_name.setdefault(_sample_name(sample), []).append(sample)
+            lines = []
+            for name, (kind, help_text) in self.meta.items():
+                if name not in by_name:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample in by_name[name]:
+                    value = totals[sample]
+                    lines.append(f"{sample} {int(value) if value.is_integer() else value}")
+            lines.append("# HELP chatbot_workers_up Workers that answered this scrape.")
+            lines.append("# TYPE chatbot_workers_up gauge")
+            lines.append(f"chatbot_workers_up {up}")
+            lines.append('')
+            return '\n'.join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    render = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console.
+        pass
+
+
+def _serve(render_text, host, port):
+    handler = type('MetricsHandler', (_MetricsHandler,), {'render': staticmethod(render_text)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_metrics_server(engine, host='127.0.0.1', port=9108):
+    """
+    Serves GET /metrics for engine from a daemon thread and returns the
+    server; call shutdown() on it to stop. Enables metrics on engine.
+    """
+    engine.enable_metrics()
+    return _serve(lambda: render(engine), host, port)
+
+
+def start_worker_metrics_server(ports, host='127.0.0.1', port=9108):
+    """
+    Serves GET /metrics with the sum of the worker metrics served on
+    127.0.0.1 at ports, like start_metrics_server.
+    """
+    return _serve(WorkerMetrics(ports).render, host, port)
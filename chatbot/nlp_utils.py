@@ -1,4 +1,6 @@
 import re
+from functools import lru_cache
+from chatbot.matcher import KeywordAutomaton
 
 # Sample keyword bank (can be expanded)
 INTENT_KEYWORDS = {
@@ -6,26 +8,153 @@ INTENT_KEYWORDS = {
     "wifi_issue": ["wifi", "internet", "network", "router", "no connection"]
 }
 
-def keyword_detect(user_input, workflows):
+# Apostrophes and hyphens inside a word are dropped ("don't" -> "dont",
+# "wi-fi" -> "wifi"); any other non-alphanumeric character separates words.
+_JOINERS = re.compile(r"(?<=\w)['’\-](?=\w)")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+_NORMALIZE_CACHE_SIZE = 4096
+
+
+def tokenize(text):
+    text = _JOINERS.sub('', text.casefold())
+    return tuple(_SEPARATORS.sub(' ', text).split())
+
+
+def stem_word(word):
     """
-    Detects which issue tree (intent) the input matches based on keywords.
+    Light suffix stripping so "overheating", "overheated" and "overheats" all
+    meet "overheat". Applied to keywords and input alike, so stems only need
+    to be consistent, not dictionary words.
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith('ing') or (word.endswith('ed') and not word.endswith('eed')):
+        stem = word[:-3] if word.endswith('ing') else word[:-2]
+        if len(stem) >= 3 and any(c in 'aeiouy' for c in stem):
+            # shutting -> shut, blocked -> block
+            if len(stem) > 3 and stem[-1] == stem[-2] and stem[-1] not in 'lsz':
+                stem = stem[:-1]
+            return stem
+        return word
+    if (word.endswith('es') and word[-3] in 'sxz') or word.endswith(('ches', 'shes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+class NormalizedInput:
+    """
+    One user message after casefolding, punctuation stripping and
+    tokenization. Matchers search the space-padded forms, so a keyword can
+    only match whole words: "hot" no longer fires on "screenshot".
+    """
+    __slots__ = ('raw', 'text', 'tokens', 'padded', 'stemmed')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.tokens = tokenize(raw)
+        self.text = ' '.join(self.tokens)
+        self.padded = f" {self.text} "
+        self.stemmed = f" {' '.join(stem_word(t) for t in self.tokens)} "
+
+    def key(self, stem=True):
+        return self.stemmed if stem else self.padded
+
+    def __repr__(self):
+        return f"NormalizedInput({self.raw!r})"
+
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _normalize_cached(raw):
+    return NormalizedInput(raw)
+
+
+def normalize(user_input):
+    """
+    Returns the NormalizedInput for a message; repeated messages come from
+    an LRU cache. Already normalized input is passed through.
     """
-    for intent, keywords in INTENT_KEYWORDS.items():
+    if isinstance(user_input, NormalizedInput):
+        return user_input
+    return _normalize_cached(user_input)
+
+
+def phrase_key(phrase, stem=True):
+    """
+    Normalizes a keyword exactly like user input, padded so that it only
+    matches on word boundaries. Returns '' for phrases without words.
+    """
+    tokens = tokenize(phrase)
+    if not tokens:
+        return ''
+    if stem:
+        tokens = [stem_word(t) for t in tokens]
+    return f" {' '.join(tokens)} "
+
+
+_default_matcher = None
+
+def build_intent_matcher(keyword_bank=None, stem=True):
+    """
+    Compiles the intent keyword bank into a single automaton.
+    Build it once per workflow load and pass it to keyword_detect.
+    """
+    bank = INTENT_KEYWORDS if keyword_bank is None else keyword_bank
+    matcher = KeywordAutomaton()
+    for intent, keywords in bank.items():
         for keyword in keywords:
-            if keyword in user_input:
-                return intent
-    return None
+            matcher.add(phrase_key(keyword, stem), intent)
+    return matcher.build()
+
+def _get_default_matcher():
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = build_intent_matcher()
+    return _default_matcher
+
+def detect_intents(user_input, matcher=None, stem=True):
+    """
+    Finds all keyword hits in one pass over the input.
+    Returns a list of (intent, keyword, start, end) ordered by position;
+    keyword and offsets refer to the normalized text.
+    """
+    if matcher is None:
+        matcher = _get_default_matcher()
+    text = normalize(user_input).key(stem)
+    # Hits include the padding spaces around the keyword.
+    return [(intent, keyword.strip(), start, end - 2)
+            for start, end, keyword, intent in matcher.find_all(text)]
+
+def keyword_detect(user_input, workflows, matcher=None, mode='first', stem=True):
+    """
+    Detects which issue tree (intent) the input matches based on keywords.
+    mode='first' keeps the keyword bank order (first declared intent wins),
+    mode='leftmost' picks the intent mentioned earliest in the input.
+    """
+    if matcher is None:
+        matcher = _get_default_matcher()
+    text = normalize(user_input).key(stem)
+    if mode == 'first':
+        hit = matcher.first_declared(text)
+        return hit[1] if hit else None
+    if mode == 'leftmost':
+        hits = matcher.find_all(text)
+        return hits[0][3] if hits else None
+    raise ValueError(f"Unknown keyword_detect mode: {mode}")
 
 def simple_llm_fallback(user_input):
     """
     Basic fallback logic when decision tree fails.
     """
-    if "slow" in user_input:
+    text = normalize(user_input).stemmed
+    if " slow " in text:
         return "Try closing background apps and restarting. Also check for viruses."
-    if "blue screen" in user_input:
+    if " blue screen " in text:
         return "Check for driver updates or recent hardware changes."
-    if "keyboard" in user_input:
+    if " keyboard " in text:
         return "Try unplugging and reconnecting it. Test on another device."
-    
+
     # Generic fallback
     return "Sorry, I couldn't identify the issue clearly. Can you describe it differently?"
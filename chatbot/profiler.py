@@ -0,0 +1,269 @@
+"""
+Profiling for the respond path, in two modes:
+
+  sample    a daemon thread snapshots every thread's stack each interval
+            and counts the ones inside ChatbotEngine.respond/respond_batch.
+            Turns run untouched, so it can stay on in a live session. The
+            output is collapsed stacks ("outer;inner count" per line), the
+            input format of flamegraph.pl, speedscope and inferno.
+  cprofile  cProfile around every respond() call, for exact call counts on
+            short runs. The output is a pstats file (python -m pstats, snakeviz).
+
+Entry points take --profile MODE [--profile-output PATH]; the GUI also reads
+TROUBLESHOOTER_PROFILE and TROUBLESHOOTER_PROFILE_OUTPUT. Running processes
+poll a control file, so the admin tool can switch profiling on and off
+without a restart (request_profiling, or "profile" in admin.py).
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+from chatbot.graph import DEFAULT_WORKFLOW_PATH
+
+MODES = ('sample', 'cprofile')
+CONTROL_PATH = os.path.join(os.path.dirname(DEFAULT_WORKFLOW_PATH), 'profile_control.json')
+PROFILE_ENV = 'TROUBLESHOOTER_PROFILE'
+PROFILE_OUTPUT_ENV = 'TROUBLESHOOTER_PROFILE_OUTPUT'
+
+
+def default_output(mode):
+    return f"profile-{os.getpid()}.{'collapsed' if mode == 'sample' else 'prof'}"
+
+
+def _frame_name(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, roots=None):
+        from chatbot.engine import ChatbotEngine
+        self.interval = interval
+        # Stacks are cut at the outermost of these frames; others are ignored.
+        self.roots = frozenset(roots or (ChatbotEngine.respond.__code__, ChatbotEngine.respond_batch.__code__))
+        self.samples = 0
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        roots = self.roots
+        counts = self.counts
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                # Stacks are kept as tuples of code objects, innermost first,
+                # and only turned into text when written.
+                stack = []
+                depth = 0
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(code)
+                    if code in roots:
+                        depth = len(stack)
+                    frame = frame.f_back
+                if depth:
+                    key = tuple(stack[:depth])
+                    counts[key] = counts.get(key, 0) + 1
+                    self.samples += 1
+
+    def collapsed(self):
+        """
+        Returns the samples as collapsed-stack lines, outermost frame first.
+        """
+        lines = []
+        for stack, n in sorted(self.counts.items(), key=lambda item: -item[1]):
+            lines.append(';'.join(_frame_name(code) for code in reversed(stack)) + f" {n}")
+        return lines
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
+        return path
+
+
+class CallProfiler:
+    """
+    cProfile over engine turns. cProfile only follows the thread that
+    enabled it, so each turn is profiled on its own thread under a lock:
+    turns are serialized while this mode is on.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def runcall(self, func, *args):
+        with self._lock:
+            self.calls += 1
+            return self.profile.runcall(func, *args)
+
+    def write(self, path):
+        with self._lock:
+            self.profile.dump_stats(path)
+        return path
+
+
+class Profiling:
+    """
+    The profiler of one engine: start(mode) and stop() from code or the
+    command line, or watch() a control file written by request_profiling.
+    """
+
+    def __init__(self, engine, control_path=None, poll_interval=1.0):
+        self.engine = engine
+        self.control_path = control_path or CONTROL_PATH
+        self.poll_interval = poll_interval
+        self.mode = None
+        self.output = None
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+        self._last_seen = None
+
+    def start(self, mode='sample', output=None, interval=0.005):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; use one of {', '.join(MODES)}")
+        with self._lock:
+            self._stop()
+            self.mode = mode
+            self.output = (output or default_output(mode)).replace('{pid}', str(os.getpid()))
+            if mode == 'sample':
+                self.profiler = SamplingProfiler(interval).start()
+            else:
+                self.profiler = self.engine.profiler = CallProfiler()
+        return self.profiler
+
+    def stop(self):
+        """
+        Stops profiling and writes the output; returns its path, or None if
+        profiling was off.
+        """
+        with self._lock:
+            return self._stop()
+
+    def _stop(self):
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        if isinstance(profiler, SamplingProfiler):
+            profiler.stop()
+        else:
+            self.engine.profiler = None
+        self.profiler = self.mode = None
+        return profiler.write(self.output)
+
+    def _signature(self):
+        try:
+            st = os.stat(self.control_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def watch(self):
+        """
+        Polls the control file from a daemon thread. Requests written before
+        the watch started are ignored.
+        """
+        if self._watch_thread is None:
+            self._last_seen = self._signature()
+            self._watch_stop.clear()
+            self._watch_thread = threading.Thread(target=self._run_watch, name='profile-control', daemon=True)
+            self._watch_thread.start()
+        return self
+
+    def unwatch(self):
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+            self._watch_thread = None
+
+    def _run_watch(self):
+        while not self._watch_stop.wait(self.poll_interval):
+            self.check()
+
+    def check(self):
+        """
+        Applies the control file if it changed since the last check.
+        """
+        signature = self._signature()
+        if signature is None or signature == self._last_seen:
+            return False
+        self._last_seen = signature
+        try:
+            with open(self.control_path, encoding='utf-8') as f:
+                request = json.load(f)
+            mode = request.get('mode')
+            if mode in MODES:
+                self.start(mode, request.get('output'))
+                print(f"Profiling ({mode}) started by the admin tool")
+            else:
+                path = self.stop()
+                if path:
+                    print(f"Profile written to {path}")
+        except Exception as e:
+            print(f"Ignoring profile control file: {e}")
+            return False
+        return True
+
+
+def request_profiling(mode, output=None, control_path=None):
+    """
+    Asks every running chatbot to start (mode 'sample' or 'cprofile') or
+    stop (mode 'off') profiling. output may contain {pid}, replaced by
+    each process's id; the default is profile-<pid>.collapsed or .prof.
+    """
+    if mode not in MODES + ('off',):
+        return f"Unknown profile mode '{mode}'. Use: sample | cprofile | off"
+    path = control_path or CONTROL_PATH
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'mode': mode, 'output': output or None}, f)
+    os.replace(tmp, path)
+    if mode == 'off':
+        return "Profiling stop requested."
+    return f"Profiling ({mode}) requested."
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', choices=MODES, default=None,
+                        help="profile the respond path (sample: collapsed stacks; cprofile: pstats)")
+    parser.add_argument('--profile-output', default=None, metavar='PATH',
+                        help="profile output file (default profile-<pid>.collapsed/.prof)")
+
+
+def setup_profiling(engine, mode=None, output=None, environ=None):
+    """
+    Starts profiling from --profile/--profile-output, falling back to the
+    TROUBLESHOOTER_PROFILE* environment variables, and watches the control
+    file. Returns the Profiling; call stop() on it at exit.
+    """
+    environ = os.environ if environ is None else environ
+    mode = mode or environ.get(PROFILE_ENV) or None
+    output = output or environ.get(PROFILE_OUTPUT_ENV) or None
+    profiling = Profiling(engine)
+    if mode:
+        try:
+            profiling.start(mode, output)
+        except ValueError as e:
+            print(e)
+    return profiling.watch()
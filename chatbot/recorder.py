@@ -0,0 +1,122 @@
+"""
+Traffic recording for ChatbotEngine.respond.
+
+Each turn is one line of a rotating log, a compact JSON array:
+
+    [timestamp, session id, input, node before, node after, latency in us,
+     intent before, intent after]
+
+Logs written before the intents were recorded have only the first six
+fields; read_log() passes records through as they were written.
+
+When the log passes max_bytes it is renamed to <path>.1 (older files move
+up to <path>.2 ... <path>.<backups>, the oldest is dropped), as with
+logging's RotatingFileHandler. read_log() reads them back oldest first.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from json.encoder import encode_basestring
+
+
+def _quote(value):
+    # Lines are formatted by hand: a full json.dumps per turn costs several
+    # times more than the turn itself.
+    return encode_basestring(value) if isinstance(value, str) else json.dumps(value)
+
+
+class TrafficRecorder:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._last_flush = time.monotonic()
+
+    def record(self, timestamp, session_id, text, node_before, node_after, latency,
+               intent_before=None, intent_after=None):
+        """
+        Appends one turn; latency is in seconds.
+        """
+        line = (f"[{timestamp:.6f},{_quote(session_id)},{_quote(text)},{_quote(node_before)},"
+                f"{_quote(node_after)},{int(latency * 1e6)},{_quote(intent_before)},{_quote(intent_after)}]\n")
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._size += len(line)
+            self.records += 1
+            if self._size >= self.max_bytes:
+                self._rotate()
+            elif time.monotonic() - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._size = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def log_files(path):
+    """
+    Returns the existing files of a rotated log, oldest first.
+    """
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def _read_file(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line of a log that is still being written may be partial.
+                continue
+            yield tuple(record)
+
+
+def read_log(*paths):
+    """
+    Yields (timestamp, session id, input, node before, node after,
+    latency us, intent before, intent after) records from one or more
+    recorded logs (e.g. one per worker process), merged in timestamp
+    order. Records from older logs end after latency us.
+    """
+    streams = []
+    for path in paths:
+        streams.append(record for name in log_files(path) for record in _read_file(name))
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=lambda record: record[0])
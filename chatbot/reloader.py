@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import threading
+from chatbot.compiled_tree import compiled_path_for
+from chatbot.graph import DEFAULT_WORKFLOW_PATH, load_graph
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class WorkflowWatcher:
+    """
+    Polls the workflow file's mtime/size from a daemon thread and, when it
+    changes, builds the new graph in that thread and hands it to every
+    subscriber. Requests never wait for a reload: they keep using the graph
+    they started with until the swap, which is a single attribute store.
+
+    With compile_in_subprocess (the default) the compiled tree is rebuilt by
+    a child process, so compiling a large tree does not compete with request
+    threads for the GIL; the watcher then only has to mmap the result.
+    """
+
+    def __init__(self, path=None, interval=1.0, compile_in_subprocess=True):
+        self.path = os.path.realpath(path or DEFAULT_WORKFLOW_PATH)
+        self.interval = interval
+        self.compile_in_subprocess = compile_in_subprocess
+        self.reloads = 0
+        self.failures = 0
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_seen = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def subscribe(self, callback):
+        """
+        callback(graph) is called from the watcher thread after each reload.
+        """
+        self._subscribers.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='workflow-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Reloads if the file changed since the last check. Returns True when a
+        new graph was published.
+        """
+        signature = self._signature()
+        if signature is None or signature == self._last_seen:
+            return False
+        self._last_seen = signature
+        try:
+            if self.compile_in_subprocess:
+                self._compile_in_subprocess()
+            # Comes back with its fuzzy and retrieval indexes built.
+            graph = load_graph(self.path, strict=True)
+        except Exception as e:
+            # A half-written or invalid file must not replace a working tree.
+            self.failures += 1
+            print(f"Workflow reload failed, keeping the current tree: {e}")
+            return False
+        self.reloads += 1
+        for callback in list(self._subscribers):
+            callback(graph)
+        return True
+
+    def _compile_in_subprocess(self):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [_PROJECT_ROOT, env.get('PYTHONPATH')]))
+        result = subprocess.run(
+            [sys.executable, '-m', 'chatbot.compiled_tree', 'compile', self.path, compiled_path_for(self.path)],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            output = (result.stderr or result.stdout).strip().splitlines()
+            raise RuntimeError(output[-1] if output else f"compiler exited with {result.returncode}")
@@ -0,0 +1,136 @@
+"""
+Re-drives a recorded traffic log (see chatbot.recorder) against a tree and
+reports where the paths diverge from the recording, plus latency
+percentiles for the recording and the replay. Run it before shipping tree
+edits:
+
+    python -m chatbot.replayer traffic.log [more logs...] [--tree path] [--timing fast|original]
+                               [--speed 1.0] [--show 20] [--allow-divergence]
+
+Exits with status 1 when any turn diverges, unless --allow-divergence.
+"""
+import argparse
+import sys
+import time
+from chatbot.engine import ChatbotEngine
+from chatbot.recorder import read_log
+
+
+def percentiles(values, points=(50, 95, 99)):
+    values = sorted(values)
+    if not values:
+        return {f"p{p}": 0.0 for p in points} | {'max': 0.0}
+    result = {f"p{p}": values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+    result['max'] = values[-1]
+    return result
+
+
+class ReplayReport:
+    def __init__(self):
+        self.turns = 0
+        self.divergences = []         # (record, node reached, intent reached) for each diverging turn
+        self.diverged_sessions = set()
+        self.recorded_latency = []    # microseconds
+        self.replayed_latency = []
+
+    def to_dict(self, show=20):
+        return {
+            'turns': self.turns,
+            'divergent_turns': len(self.divergences),
+            'divergent_sessions': len(self.diverged_sessions),
+            'recorded_latency_us': percentiles(self.recorded_latency),
+            'replayed_latency_us': percentiles(self.replayed_latency),
+            'first_divergences': [
+                {'session': record[1], 'input': record[2], 'from': record[3],
+                 'expected': record[4], 'got': got,
+                 'expected_intent': _intents(record)[1], 'got_intent': got_intent}
+                for record, got, got_intent in self.divergences[:show]
+            ],
+        }
+
+
+def _intents(record):
+    # (intent before, intent after); None for logs recorded without them.
+    return tuple(record[6:8]) if len(record) >= 8 else (None, None)
+
+
+def replay_log(records, engine, timing='fast', speed=1.0):
+    """
+    Replays records through engine.respond and returns a ReplayReport.
+    Each session starts from the node and intent it was recorded at; a
+    turn diverges when it ends on a different node, or with a different
+    intent, than recorded (logs without intents compare nodes only). With
+    timing='original' turns are spaced as recorded (divided by speed);
+    'fast' sends them back to back.
+    """
+    report = ReplayReport()
+    sessions = {}
+    first_ts = started = None
+    for record in records:
+        timestamp, session_id, text, node_before, node_after, latency_us = record[:6]
+        intent_before, intent_after = _intents(record)
+        has_intents = len(record) >= 8
+        if timing == 'original':
+            if first_ts is None:
+                first_ts, started = timestamp, time.monotonic()
+            delay = (timestamp - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        session = sessions.get(session_id)
+        if session is None:
+            # The recording may start mid-conversation.
+            session = sessions[session_id] = engine.new_session(session_id)
+            session.current_node = node_before
+            session.current_intent = intent_before
+        start = time.perf_counter()
+        engine.respond(text, session)
+        report.replayed_latency.append((time.perf_counter() - start) * 1e6)
+        report.recorded_latency.append(latency_us)
+        report.turns += 1
+        if session.current_node != node_after or (has_intents and session.current_intent != intent_after):
+            report.divergences.append((record, session.current_node, session.current_intent))
+            report.diverged_sessions.add(session_id)
+            # Carry on from the recorded path so one edit does not cascade.
+            if node_after == 'root':
+                session.reset()
+            session.current_node = node_after
+            session.current_intent = intent_after
+    return report
+
+
+def format_report(report, show=20):
+    data = report.to_dict(show)
+    lines = [f"{data['turns']} turns replayed, {data['divergent_turns']} diverged "
+             f"in {data['divergent_sessions']} sessions"]
+    for name in ('recorded', 'replayed'):
+        p = data[f'{name}_latency_us']
+        lines.append(f"{name:>9} latency us: p50 {p['p50']:.0f}  p95 {p['p95']:.0f}  "
+                     f"p99 {p['p99']:.0f}  max {p['max']:.0f}")
+    for d in data['first_divergences']:
+        if d['expected'] == d['got']:
+            lines.append(f"  [{d['session']}] {d['input']!r} at {d['from']}: "
+                         f"recorded intent {d['expected_intent']}, now {d['got_intent']}")
+        else:
+            lines.append(f"  [{d['session']}] {d['input']!r} at {d['from']}: "
+                         f"recorded {d['expected']}, now {d['got']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded chat traffic against a tree")
+    parser.add_argument('logs', nargs='+', help="recorded traffic logs (rotated files are picked up)")
+    parser.add_argument('--tree', default=None, help="path to troubleshooting_tree.json")
+    parser.add_argument('--timing', choices=('fast', 'original'), default='fast')
+    parser.add_argument('--speed', type=float, default=1.0, help="speed-up factor for --timing original")
+    parser.add_argument('--show', type=int, default=20, help="divergences to list")
+    parser.add_argument('--allow-divergence', action='store_true', help="exit 0 even if paths diverge")
+    args = parser.parse_args(argv)
+
+    engine = ChatbotEngine(workflow_path=args.tree)
+    report = replay_log(read_log(*args.logs), engine, args.timing, args.speed)
+    print(format_report(report, args.show))
+    return 0 if args.allow_divergence or not report.divergences else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+BM25 index over the text of the tree's question nodes (id, prompt,
+response), used as a fallback stage to jump straight to the most relevant
+step of a flow.
+
+NumPy is optional: with it, each query term's postings are scored as one
+vector operation; without it the same top hits are found in pure Python by
+scoring only the documents that can still reach the top k. NumPy is what
+keeps queries under a millisecond on very large trees (see
+benchmarks/bench_retrieval.py).
+"""
+import heapq
+import math
+import threading
+from chatbot.nlp_utils import normalize
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised on installs without numpy
+    np = None
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by can do doe for from has have how i if in is it
+    its me my no not of on or so that the there this to up was what when with you your
+""".split())
+
+# Cached per-term weights are reused while the document count and average
+# length stay within this relative distance of the values they were computed with.
+STATS_TOLERANCE = 0.01
+
+# The pure-Python search takes its first threshold from this many of each
+# term's best documents, plus every document of the rarest term when it has
+# at most RARE_TERM_DOCS of them.
+SEED_DOCS = 16
+RARE_TERM_DOCS = 256
+
+# Past this many groups of terms to intersect, the pure-Python search scores
+# every posting instead.
+MAX_TERM_GROUPS = 64
+
+
+def node_text(node_id, node_data):
+    return ' '.join(filter(None, (node_id, node_data.get('prompt'), node_data.get('response'))))
+
+
+def _terms(text):
+    return [t for t in normalize(text).stemmed.split() if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index: term -> {doc slot: term frequency}. Documents can be
+    added, replaced and removed one at a time; only the postings of the
+    terms they contain are touched, and the per-term data used for scoring
+    (weight arrays with NumPy, weight bounds without) is rebuilt lazily for
+    those terms only.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, use_numpy=None):
+        self.k1 = k1
+        self.b = b
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+        self._lock = threading.RLock()
+        self._slots = {}          # doc id -> slot
+        self._doc_ids = []        # slot -> doc id (None when free)
+        self._doc_terms = []      # slot -> {term: tf}
+        self._doc_text = []       # slot -> indexed text, to skip unchanged docs on sync
+        self._free = []
+        self._postings = {}       # term -> {slot: tf}
+        self._arrays = {}         # term -> cached scoring data, see _term_weights and _term_bound
+        self._doc_len = np.zeros(16, dtype=np.float32) if self.use_numpy else []
+        self._total_len = 0
+        # The tree mapping index_graph_nodes last brought this index in line with.
+        self.source = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slots
+
+    def add(self, doc_id, text):
+        """
+        Indexes text under doc_id, replacing any previous version.
+        """
+        with self._lock:
+            slot = self._slots.get(doc_id)
+            if slot is not None:
+                if self._doc_text[slot] == text:
+                    return
+                self._unindex(slot)
+            else:
+                slot = self._free.pop() if self._free else self._new_slot()
+                self._slots[doc_id] = slot
+                self._doc_ids[slot] = doc_id
+            terms = {}
+            for term in _terms(text):
+                terms[term] = terms.get(term, 0) + 1
+            length = sum(terms.values())
+            self._doc_terms[slot] = terms
+            self._doc_text[slot] = text
+            self._set_len(slot, length)
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[slot] = tf
+                self._arrays.pop(term, None)
+
+    def remove(self, doc_id):
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None:
+                return
+            self._unindex(slot)
+            self._doc_ids[slot] = None
+            self._doc_terms[slot] = {}
+            self._doc_text[slot] = None
+            self._free.append(slot)
+
+    def sync(self, docs):
+        """
+        Brings the index in line with docs, an iterable of (doc id, text):
+        new and changed documents are (re)indexed, missing ones removed.
+        """
+        with self._lock:
+            seen = set()
+            for doc_id, text in docs:
+                seen.add(doc_id)
+                self.add(doc_id, text)
+            for doc_id in [d for d in self._slots if d not in seen]:
+                self.remove(doc_id)
+
+    def _new_slot(self):
+        slot = len(self._doc_ids)
+        self._doc_ids.append(None)
+        self._doc_terms.append({})
+        self._doc_text.append(None)
+        if self.use_numpy:
+            if slot >= len(self._doc_len):
+                grown = np.zeros(len(self._doc_len) * 2, dtype=np.float32)
+                grown[:slot] = self._doc_len[:slot]
+                self._doc_len = grown
+        else:
+            self._doc_len.append(0)
+        return slot
+
+    def _set_len(self, slot, length):
+        self._doc_len[slot] = length
+
+    def _unindex(self, slot):
+        for term in self._doc_terms[slot]:
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_len -= int(self._doc_len[slot])
+        self._set_len(slot, 0)
+
+    def _cached(self, term, n_docs, avgdl):
+        # Scoring data depends on the corpus statistics, so it is reused only
+        # while N and the average document length are within STATS_TOLERANCE.
+        cached = self._arrays.get(term)
+        if cached is not None:
+            cached_n, cached_avgdl = cached[-2:]
+            if (abs(n_docs - cached_n) <= STATS_TOLERANCE * cached_n
+                    and abs(avgdl - cached_avgdl) <= STATS_TOLERANCE * cached_avgdl):
+                return cached
+        return None
+
+    def _term_weights(self, term, n_docs, avgdl):
+        """
+        Returns (slots, BM25 weights) for term, cached until the corpus
+        statistics drift.
+        """
+        cached = self._cached(term, n_docs, avgdl)
+        if cached is not None:
+            return cached[0], cached[1]
+        postings = self._postings[term]
+        slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+        tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+        k1, b = self.k1, self.b
+        norm = k1 * (1 - b + b * self._doc_len[slots] / avgdl)
+        weights = (self._idf(term, n_docs) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self._arrays[term] = (slots, weights, n_docs, avgdl)
+        return slots, weights
+
+    def _term_bound(self, term, n_docs, avgdl):
+        """
+        Returns (idf, highest weight, slots of the SEED_DOCS best documents,
+        avgdl) for term, cached like _term_weights. Documents are scored with
+        the idf and avgdl returned here, so the highest weight stays a true
+        bound until the cache entry is replaced.
+        """
+        cached = self._cached(term, n_docs, avgdl)
+        if cached is not None:
+            return cached[:4]
+        k1, b = self.k1, self.b
+        doc_len = self._doc_len
+        idf = self._idf(term, n_docs)
+        best = heapq.nlargest(SEED_DOCS, ((idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[slot] / avgdl)), slot)
+                                          for slot, tf in self._postings[term].items()))
+        bound = (idf, best[0][0], [slot for _, slot in best], avgdl)
+        self._arrays[term] = bound + (n_docs, avgdl)
+        return bound
+
+    def search(self, query, k=3):
+        """
+        Returns up to k (doc id, score) pairs, best first.
+        """
+        with self._lock:
+            n_docs = len(self._slots)
+            if not n_docs:
+                return []
+            terms = [t for t in dict.fromkeys(_terms(query)) if t in self._postings]
+            if not terms:
+                return []
+            avgdl = self._total_len / n_docs or 1.0
+            if self.use_numpy:
+                return self._search_numpy(terms, n_docs, avgdl, k)
+            return self._search_python(terms, n_docs, avgdl, k)
+
+    def _idf(self, term, n_docs):
+        df = len(self._postings[term])
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _search_numpy(self, terms, n_docs, avgdl, k):
+        if len(terms) == 1:
+            slots, scores = self._term_weights(terms[0], n_docs, avgdl)
+        else:
+            # Accumulate into a dense score vector; within one term slots are unique.
+            dense = np.zeros(len(self._doc_ids), dtype=np.float32)
+            for term in terms:
+                term_slots, weights = self._term_weights(term, n_docs, avgdl)
+                dense[term_slots] += weights
+            slots, scores = None, dense
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        hits = []
+        for i in top:
+            if scores[i] <= 0:
+                break
+            hits.append((self._doc_ids[int(i if slots is None else slots[i])], float(scores[i])))
+        return hits
+
+    def _search_python(self, terms, n_docs, avgdl, k):
+        """
+        Exact top k without scoring every posting. The best documents of
+        each term give a first k-th score, the threshold; a document can only
+        reach it if the highest weights of the query terms it contains add up
+        to it, so only the documents containing such a group of terms (an
+        intersection of postings, usually small) are scored.
+        """
+        k1, b = self.k1, self.b
+        doc_len = self._doc_len
+        bounds = sorted((self._term_bound(term, n_docs, avgdl) + (self._postings[term],) for term in terms),
+                        key=lambda bound: -bound[1])
+        top = []  # min-heap of (score, -slot): ties go to the lower slot
+        seen = set()
+
+        def offer(slot):
+            if slot in seen:
+                return
+            seen.add(slot)
+            score = 0.0
+            for idf, _, _, term_avgdl, postings in bounds:
+                tf = postings.get(slot)
+                if tf:
+                    score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[slot] / term_avgdl))
+            if len(top) < k:
+                heapq.heappush(top, (score, -slot))
+            elif (score, -slot) > top[0]:
+                heapq.heapreplace(top, (score, -slot))
+
+        for bound in bounds:
+            for slot in bound[2]:
+                offer(slot)
+        rarest = min(bounds, key=lambda bound: len(bound[4]))[4]
+        if len(rarest) <= RARE_TERM_DOCS:
+            for slot in rarest:
+                offer(slot)
+
+        # Groups of terms (indexes into bounds) whose highest weights reach
+        # the threshold; the slack absorbs float rounding in the sums.
+        threshold = top[0][0] - 1e-9 if len(top) == k else 0.0
+        highest = [bound[1] for bound in bounds]
+        remaining = [sum(highest[i:]) for i in range(len(highest) + 1)]
+        groups = []
+
+        def collect(start, group, total):
+            for i in range(start, len(bounds)):
+                if total + remaining[i] < threshold or len(groups) > MAX_TERM_GROUPS:
+                    return
+                if total + highest[i] >= threshold:
+                    groups.append(group + [i])
+                else:
+                    collect(i + 1, group + [i], total + highest[i])
+
+        collect(0, [], 0.0)
+        if len(groups) > MAX_TERM_GROUPS:
+            for bound in bounds:
+                for slot in bound[4]:
+                    offer(slot)
+        else:
+            for group in groups:
+                postings = sorted((bounds[i][4] for i in group), key=len)
+                slots = postings[0]
+                for other in postings[1:]:
+                    slots = [slot for slot in slots if slot in other]
+                for slot in slots:
+                    offer(slot)
+        return [(self._doc_ids[-slot], score) for score, slot in sorted(top, reverse=True)]
+
+
+def index_graph_nodes(nodes, index=None, changes=None):
+    """
+    Builds (or incrementally syncs) a BM25Index over the nodes of a tree
+    the fallback may jump to: terminal answers are left out, so a vague
+    message cannot land straight on a fix meant for another problem.
+
+    changes, when given, is (changed ids, removed ids) between index.source
+    and nodes; only those nodes are then looked at, instead of every node.
+    """
+    if index is None:
+        index = BM25Index()
+    if changes is None:
+        index.sync((node_id, node_text(node_id, node_data)) for node_id, node_data in nodes.items()
+                   if not node_data.get('terminal'))
+    else:
+        changed, removed = changes
+        with index._lock:
+            for node_id in removed:
+                index.remove(node_id)
+            for node_id in changed:
+                node_data = nodes[node_id]
+                if node_data.get('terminal'):
+                    index.remove(node_id)
+                else:
+                    index.add(node_id, node_text(node_id, node_data))
+    index.source = nodes
+    return index
@@ -0,0 +1,372 @@
+"""
+Search index for the admin tools: finds nodes by any part of their id,
+edge keywords, prompt or response.
+
+Every distinct word is a term. A trigram index over the terms finds the
+ones containing a query word, whatever its position, and each term's
+postings list the nodes it appears in, per field. Queries of one or two
+characters match the start of terms instead, through a sorted copy of
+the vocabulary. Results are ranked by field and by how well the word
+matched: id words, then keywords, then prompt and response text; exact,
+then prefix, then substring. The whole query typed as (part of) an id
+ranks that node first. Nodes can be added, changed and removed one at a
+time.
+"""
+import bisect
+import heapq
+import operator
+import re
+import threading
+
+_WORDS = re.compile(r'[^\W_]+')
+
+# Field weights: a match in the words of the node id beats one in its
+# keywords, which beats one in the prompt or response text.
+ID_WORD = 3
+KEYWORD = 2
+TEXT = 1
+
+# Added to a node's score when the whole query is its id, or appears in it.
+ID_MATCH_BONUS = 100
+ID_SUBSTRING_BONUS = 6
+
+# Query words matching more (term, field) postings than this are checked
+# node by node rather than by set intersection.
+MAX_SET_CHECKS = 64
+
+
+def _grams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def node_terms(node_id, node_data):
+    """
+    Returns {term: field weight} for one node.
+    """
+    terms = {}
+
+    def add(words, weight):
+        for word in words:
+            if terms.get(word, 0) < weight:
+                terms[word] = weight
+
+    add(_WORDS.findall(node_id.lower()), ID_WORD)
+    for keyword in (node_data.get('edges') or {}):
+        add(_WORDS.findall(str(keyword).lower()), KEYWORD)
+    for field in ('prompt', 'response'):
+        text = node_data.get(field)
+        if text:
+            add(_WORDS.findall(str(text).lower()), TEXT)
+    return terms
+
+
+def _signature(node_data):
+    # Only these fields are indexed; other changes need no re-indexing.
+    edges = node_data.get('edges')
+    return (node_data.get('prompt'), node_data.get('response'),
+            tuple(edges) if isinstance(edges, dict) else None)
+
+
+def _first_ranked(nodes, count):
+    """
+    The count nodes that rank first among equal scores: shorter ids, then
+    alphabetical.
+    """
+    if count <= 0:
+        return []
+    ranked = sorted(nodes, key=len)
+    if count < len(ranked):
+        # Only the ids as long as the last one kept need ordering by name.
+        ranked = ranked[:bisect.bisect_right(ranked, len(ranked[count - 1]), key=len)]
+    ranked.sort()
+    ranked.sort(key=len)
+    return ranked[:count]
+
+
+def _size(posting):
+    return 0 if posting is None else (1 if isinstance(posting, str) else len(posting))
+
+
+class NodeSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._term_ids = {}       # term -> term id
+        self._terms = []          # term id -> term
+        # weight -> term id -> None, a node id, or a set of node ids. Split
+        # by field so every node of one posting has the same score.
+        self._postings = {ID_WORD: [], KEYWORD: [], TEXT: []}
+        self._grams = {}          # trigram -> [term id]; terms are never removed from it
+        self._docs = {}           # node id -> (signature, term ids, their weights)
+        self._sorted = []         # vocabulary in order, for short prefix queries
+        self._unsorted = []       # terms added since _sorted was last merged
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, node_id):
+        return node_id in self._docs
+
+    def _term_id(self, term):
+        tid = self._term_ids.get(term)
+        if tid is None:
+            tid = self._term_ids[term] = len(self._terms)
+            self._terms.append(term)
+            for postings in self._postings.values():
+                postings.append(None)
+            for gram in _grams(term):
+                grams = self._grams.get(gram)
+                if grams is None:
+                    self._grams[gram] = [tid]
+                else:
+                    grams.append(tid)
+            self._unsorted.append(term)
+        return tid
+
+    def add(self, node_id, node_data):
+        """
+        Indexes node_id, replacing its previous version; unchanged nodes
+        are skipped.
+        """
+        signature = _signature(node_data)
+        with self._lock:
+            previous = self._docs.get(node_id)
+            if previous is not None:
+                if previous[0] == signature:
+                    return
+                self._unindex(node_id, previous[1], previous[2])
+            terms = node_terms(node_id, node_data)
+            tids = tuple(self._term_id(term) for term in terms)
+            for tid, weight in zip(tids, terms.values()):
+                postings = self._postings[weight]
+                posting = postings[tid]
+                if posting is None:
+                    postings[tid] = node_id
+                elif isinstance(posting, str):
+                    postings[tid] = {posting, node_id}
+                else:
+                    posting.add(node_id)
+            self._docs[node_id] = (signature, tids, tuple(terms.values()))
+
+    def _unindex(self, node_id, tids, weights):
+        for tid, weight in zip(tids, weights):
+            postings = self._postings[weight]
+            posting = postings[tid]
+            if isinstance(posting, str):
+                postings[tid] = None
+            else:
+                posting.discard(node_id)
+                if len(posting) == 1:
+                    postings[tid] = next(iter(posting))
+
+    def remove(self, node_id):
+        with self._lock:
+            previous = self._docs.pop(node_id, None)
+            if previous is not None:
+                self._unindex(node_id, previous[1], previous[2])
+
+    def sync(self, tree):
+        """
+        Brings the index in line with tree ({node id: node data}): new and
+        changed nodes are (re)indexed, missing ones removed.
+        """
+        with self._lock:
+            for node_id, node_data in tree.items():
+                if isinstance(node_data, dict):
+                    self.add(node_id, node_data)
+            for node_id in [n for n in self._docs if n not in tree]:
+                self.remove(node_id)
+
+    def _prefix_terms(self, word):
+        if self._unsorted:
+            # Timsort merges the sorted run and the new terms in about linear time.
+            self._sorted.extend(self._unsorted)
+            self._sorted.sort()
+            self._unsorted = []
+        terms = self._sorted
+        start = bisect.bisect_left(terms, word)
+        end = bisect.bisect_left(terms, word + '\U0010ffff', start)
+        term_ids = self._term_ids
+        return [term_ids[term] for term in terms[start:end]]
+
+    def _matching_terms(self, word):
+        """
+        Returns {term id: quality} for the terms matching word: quality 2
+        for the term itself, 1 for a prefix, 0 for a substring.
+        """
+        terms = self._terms
+        if len(word) < 3:
+            return {tid: 2 if terms[tid] == word else 1 for tid in self._prefix_terms(word)}
+        lists = []
+        for gram in _grams(word):
+            grams = self._grams.get(gram)
+            if grams is None:
+                return {}
+            lists.append(grams)
+        # Check candidates of the rarest trigram directly; cheaper than intersecting.
+        matches = {}
+        for tid in min(lists, key=len):
+            term = terms[tid]
+            position = term.find(word)
+            if position >= 0:
+                matches[tid] = 2 if len(term) == len(word) else (1 if position == 0 else 0)
+        return matches
+
+    def _levels(self, terms):
+        """
+        The postings of the terms matching one word, grouped by score, best
+        first: [(score, postings, term ids, node count)]. A score stands for
+        one field and one match quality.
+        """
+        levels = {}
+        for weight, postings in self._postings.items():
+            for tid, quality in terms.items():
+                posting = postings[tid]
+                if posting is not None:
+                    level = levels.setdefault(weight * 3 + quality, ([], set()))
+                    level[0].append(posting)
+                    level[1].add(tid)
+        return [(score, postings, tids, sum(map(_size, postings)))
+                for score, (postings, tids) in sorted(levels.items(), reverse=True)]
+
+    def search(self, query, limit=None):
+        """
+        Returns the node ids matching every word of query, best first
+        (ties: shorter id, then alphabetical); at most limit of them.
+
+        A node's score is the sum of its best match for each word. Each
+        word's matches are grouped by score, and the combinations of one
+        group per word are visited best first: the nodes in all groups of
+        a combination not met before score its sum. With a limit, the
+        search stops once no combination left could beat the limit-th
+        score, and where a combination ties with it only the best-ranked
+        of its nodes are kept, so the result never depends on set order.
+        """
+        lowered = query.strip().lower()
+        words = set(_WORDS.findall(lowered))
+        if not words:
+            return []
+        with self._lock:
+            matched = []
+            for word in words:
+                word_levels = self._levels(self._matching_terms(word))
+                if not word_levels:
+                    return []
+                matched.append((word, word_levels))
+            # The id bonus needs the whole query inside the id. Words of three
+            # letters or more then match an id word; so do shorter ones if the
+            # id is exactly the query, otherwise they may sit inside one.
+            short = [len(word) < 3 for word, _ in matched]
+            # Where a single word matched an id word, the id contains the query.
+            whole = len(matched) == 1 and lowered == matched[0][0]
+            levels = [word_levels for _, word_levels in matched]
+
+            scores = {}
+            kth = None
+            unions = {}
+            first = (0,) * len(levels)
+            heap = [(-sum(word_levels[0][0] for word_levels in levels), first)]
+            queued = {first}
+            while heap:
+                score, combination = heapq.heappop(heap)
+                score = -score
+                for i, level in enumerate(combination):
+                    if level + 1 < len(levels[i]):
+                        following = combination[:i] + (level + 1,) + combination[i + 1:]
+                        if following not in queued:
+                            queued.add(following)
+                            step = levels[i][level][0] - levels[i][level + 1][0]
+                            heapq.heappush(heap, (step - score, following))
+                chosen = [levels[i][level] for i, level in enumerate(combination)]
+                in_id = [level[0] >= ID_WORD * 3 for level in chosen]
+                if all(in_id):
+                    bonus = ID_MATCH_BONUS
+                elif all(map(operator.or_, in_id, short)):
+                    bonus = ID_SUBSTRING_BONUS
+                else:
+                    bonus = 0
+                if limit is not None and len(scores) >= limit:
+                    if kth is None or kth[0] != len(scores):
+                        kth = len(scores), heapq.nlargest(limit, scores.values())[-1]
+                    if score + ID_MATCH_BONUS < kth[1]:
+                        break
+                    if score + bonus < kth[1]:
+                        continue
+
+                candidates = self._combination(combination, chosen, unions) - scores.keys()
+                if not candidates:
+                    continue
+                base = score
+                if bonus:
+                    if whole and in_id[0]:
+                        base += ID_SUBSTRING_BONUS
+                        special = []
+                        if len(lowered) in map(len, candidates):
+                            special = [node_id for node_id in candidates if len(node_id) == len(lowered)]
+                    else:
+                        special = [node_id for node_id in candidates if lowered in node_id.lower()]
+                    for node_id in special:
+                        candidates.discard(node_id)
+                        scores[node_id] = score + self._bonus(node_id, lowered)
+                # The rest all score the same: past the nodes already ranked
+                # above them, keep the best-ranked few.
+                if limit is not None:
+                    room = limit - sum(1 for total in scores.values() if total > base)
+                    if room < len(candidates):
+                        candidates = _first_ranked(candidates, room)
+                scores.update(dict.fromkeys(candidates, base))
+
+        if limit is not None:
+            return heapq.nsmallest(limit, scores, key=lambda node_id: (-scores[node_id], len(node_id), node_id))
+        # Best score first, then shorter id, then alphabetical: three stable
+        # sorts on C-level keys beat one sort on a Python key function.
+        ranked = sorted(scores)
+        ranked.sort(key=len)
+        ranked.sort(key=scores.__getitem__, reverse=True)
+        return ranked
+
+    @staticmethod
+    def _bonus(node_id, lowered):
+        return ID_MATCH_BONUS if len(node_id) == len(lowered) else ID_SUBSTRING_BONUS
+
+    def _combination(self, combination, chosen, unions):
+        """
+        Returns a new set of the nodes found in every chosen level, one
+        level per query word. unions caches each level's nodes by (word,
+        level), for the level the others are matched against.
+        """
+        start = min(range(len(chosen)), key=lambda i: chosen[i][3])
+        key = start, combination[start]
+        nodes = unions.get(key)
+        if nodes is None:
+            postings = chosen[start][1]
+            if len(postings) == 1 and not isinstance(postings[0], str):
+                nodes = postings[0]
+            else:
+                nodes = set()
+                for posting in postings:
+                    if isinstance(posting, str):
+                        nodes.add(posting)
+                    else:
+                        nodes |= posting
+            unions[key] = nodes
+        nodes = set(nodes)
+        for i, (score, postings, tids, _) in enumerate(chosen):
+            if i == start or not nodes:
+                continue
+            if len(postings) <= MAX_SET_CHECKS:
+                # A few terms: intersect a whole posting at a time.
+                found = set()
+                for posting in postings:
+                    if isinstance(posting, str):
+                        if posting in nodes:
+                            found.add(posting)
+                    else:
+                        found |= posting & nodes
+            else:
+                # Broad words (two-letter prefixes): check node by node.
+                weight = score // 3
+                docs = self._docs
+                found = {node_id for node_id in nodes
+                         if any(w == weight and tid in tids for tid, w in zip(docs[node_id][1], docs[node_id][2]))}
+            nodes = found
+        return nodes
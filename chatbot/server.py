@@ -0,0 +1,230 @@
+"""
+Asyncio chat server serving many sessions from one engine and one shared
+tree. Each connection speaks either protocol, detected from its first line:
+
+  line protocol   request:  <session id> TAB <message> LF
+                  reply:    {"session": ..., "response": ...} LF
+  HTTP/1.1        POST /chat with {"session": ..., "text": ...}
+                  GET /health
+
+    python -m chatbot.server [--host 127.0.0.1] [--port 8765] [--tree path] [--workers N] [--record LOG]
+                             [--metrics-port 9108]
+
+With --workers N the tree is loaded once and N forked worker processes
+answer the messages; see chatbot.worker_pool.
+"""
+import argparse
+import asyncio
+import json
+import re
+from chatbot.engine import ChatbotEngine
+
+_HTTP_REQUEST_LINE = re.compile(rb'^([A-Z]+) (\S+) HTTP/(1\.[01])\r?\n$')
+_MAX_BODY = 64 * 1024
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 431: 'Request Header Fields Too Large'}
+
+
+class _LineTooLong(Exception):
+    # A line over the stream's 64 KiB limit: nothing after it can be framed.
+    pass
+
+
+async def _readline(reader):
+    try:
+        return await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError) as e:
+        # StreamReader.readline reports an overrun as ValueError.
+        raise _LineTooLong(str(e)) from e
+
+
+def _content_length(headers):
+    """
+    The request's Content-Length as an int, or None when it is not a
+    plain non-negative decimal number.
+    """
+    value = headers.get('content-length', '0') or '0'
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+class ChatServer:
+    def __init__(self, engine=None, host='127.0.0.1', port=8765):
+        self.engine = engine or ChatbotEngine()
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        # Report the real port when started with port=0.
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                first = await _readline(reader)
+            except _LineTooLong:
+                await self._send_line(writer, {'error': 'line too long'})
+                return
+            if not first:
+                return
+            match = _HTTP_REQUEST_LINE.match(first)
+            if match:
+                await self._serve_http(match, reader, writer)
+            else:
+                await self._serve_lines(first, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def chat(self, session_id, text):
+        self.requests += 1
+        return await self.engine.respond_async(session_id, text)
+
+    async def _serve_lines(self, line, reader, writer):
+        while line:
+            session_id, sep, text = line.decode('utf-8', 'replace').rstrip('\r\n').partition('\t')
+            if sep:
+                reply = {'session': session_id, 'response': await self.chat(session_id, text)}
+            else:
+                reply = {'error': "expected '<session id>\\t<message>'"}
+            await self._send_line(writer, reply)
+            try:
+                line = await _readline(reader)
+            except _LineTooLong:
+                await self._send_line(writer, {'error': 'line too long'})
+                return
+
+    async def _send_line(self, writer, reply):
+        writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    async def _serve_http(self, match, reader, writer):
+        while match:
+            method, path, version = match.group(1).decode(), match.group(2).decode(), match.group(3)
+            headers = {}
+            try:
+                while True:
+                    header = await _readline(reader)
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+            except _LineTooLong:
+                await self._send(writer, 431, {'error': 'header line too long'}, keep_alive=False)
+                return
+
+            length = _content_length(headers)
+            if length is None:
+                await self._send(writer, 400, {'error': 'bad Content-Length'}, keep_alive=False)
+                return
+            if length > _MAX_BODY:
+                await self._send(writer, 413, {'error': 'body too large'}, keep_alive=False)
+                return
+            body = await reader.readexactly(length) if length else b''
+            status, payload = await self._route(method, path, body)
+
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == b'1.1' else connection == 'keep-alive'
+            await self._send(writer, status, payload, keep_alive)
+            if not keep_alive:
+                return
+            try:
+                line = await _readline(reader)
+            except _LineTooLong:
+                await self._send(writer, 431, {'error': 'request line too long'}, keep_alive=False)
+                return
+            match = _HTTP_REQUEST_LINE.match(line) if line else None
+
+    async def _route(self, method, path, body):
+        if path == '/health':
+            health = {'status': 'ok', 'nodes': len(self.engine.graph)}
+            if self.engine.cache is not None:
+                health['cache'] = self.engine.cache.stats()
+            return 200, health
+        if path != '/chat':
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            data = json.loads(body or b'{}')
+            session_id, text = str(data['session']), str(data['text'])
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': 'expected JSON {"session": ..., "text": ...}'}
+        return 200, {'session': session_id, 'response': await self.chat(session_id, text)}
+
+    async def _send(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Troubleshooter chat server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tree', default=None, help="path to troubleshooting_tree.json")
+    parser.add_argument('--no-reload', action='store_true', help="do not watch the tree for edits")
+    parser.add_argument('--workers', type=int, default=0, help="pre-fork N worker processes (POSIX)")
+    parser.add_argument('--record', default=None, metavar='LOG',
+                        help="record traffic for chatbot.replayer (per-worker LOG.workerN with --workers)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve Prometheus metrics on this port (summed over the workers with --workers)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 0:
+        from chatbot.worker_pool import serve_with_workers
+        serve_with_workers(args.workers, args.host, args.port, args.tree, hot_reload=not args.no_reload,
+                           record=args.record, metrics_port=args.metrics_port)
+        return
+
+    engine = ChatbotEngine(workflow_path=args.tree)
+    if not args.no_reload:
+        engine.enable_hot_reload()
+    if args.record:
+        engine.start_recording(args.record)
+    if args.metrics_port is not None:
+        from chatbot.metrics import start_metrics_server
+        start_metrics_server(engine, args.host, args.metrics_port)
+    server = ChatServer(engine, args.host, args.port)
+
+    async def run():
+        await server.start()
+        print(f"Serving on {server.host}:{server.port} (line protocol and HTTP)", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop_recording()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+class Session:
+    """
+    Per-user conversation state. Holds only references into the shared
+    WorkflowGraph (node ids), so an extra session costs a few hundred bytes.
+    history lists the node ids visited since the last reset.
+    """
+    __slots__ = ('session_id', 'current_node', 'current_intent', 'history')
+
+    def __init__(self, session_id=None, current_node='root', current_intent=None, history=None):
+        self.session_id = session_id
+        self.current_node = current_node
+        self.current_intent = current_intent
+        self.history = history if history is not None else []
+
+    def reset(self):
+        self.current_node = 'root'
+        self.current_intent = None
+        self.history.clear()
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'current_node': self.current_node,
+            'current_intent': self.current_intent,
+            'history': list(self.history),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('session_id'), data.get('current_node', 'root'),
+                   data.get('current_intent'), list(data.get('history', [])))
+
+    def __repr__(self):
+        return (f"Session(session_id={self.session_id!r}, current_node={self.current_node!r}, "
+                f"current_intent={self.current_intent!r})")
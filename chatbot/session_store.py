@@ -0,0 +1,231 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from chatbot.session import Session
+
+
+class SessionStore:
+    """
+    Interface for session persistence. Implementations keep hit/miss/eviction
+    counters; get() returns None for unknown or expired sessions.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def put(self, session):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def get_or_create(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            session = Session(session_id)
+        return session
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'sessions': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU store with idle TTL. Entries are kept in access order, so
+    the idle ones are always at the front and eviction pops from there in O(1).
+    """
+
+    def __init__(self, max_sessions=10000, ttl=1800, clock=time.monotonic):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries and len(entries) > self.max_sessions:
+            entries.popitem(last=False)
+            self.evictions += 1
+        if self.ttl is None:
+            return
+        cutoff = now - self.ttl
+        while entries:
+            _, last_seen = next(iter(entries.values()))
+            if last_seen >= cutoff:
+                break
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id):
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[session_id] = (entry[0], now)
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session):
+        now = self.clock()
+        with self._lock:
+            self._entries[session.session_id] = (session, now)
+            self._entries.move_to_end(session.session_id)
+            self._evict(now)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-backed store in WAL mode, shared by every worker process that opens
+    the same file. Writes are buffered and committed in batches, either every
+    batch_size puts or every flush_interval seconds; a daemon thread commits
+    what an idle store still holds. A session written by one process is
+    visible to the others after the next flush. flush_interval=None leaves
+    the flushing to put() and close().
+    """
+
+    def __init__(self, path, ttl=1800, batch_size=100, flush_interval=1.0, clock=time.time):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._pending = {}
+        self._last_flush = clock()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval is not None:
+            self._thread = threading.Thread(target=self._run, name='session-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if not self._pending or self.clock() - self._last_flush < self.flush_interval:
+                    continue
+                try:
+                    self._flush_locked()
+                except sqlite3.Error as e:
+                    # The writes stay pending for the next attempt.
+                    print(f"Session flush failed, will retry: {e}")
+
+    def __len__(self):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, session_id):
+        now = self.clock()
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is not None:
+                self.hits += 1
+                return Session.from_dict(json.loads(pending[0]))
+            row = self._conn.execute(
+                "SELECT state, last_seen FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and row[1] < now - self.ttl:
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return Session.from_dict(json.loads(row[0]))
+
+    def put(self, session):
+        now = self.clock()
+        state = json.dumps(session.to_dict(), separators=(',', ':'))
+        with self._lock:
+            self._pending[session.session_id] = (state, now)
+            if len(self._pending) >= self.batch_size or (
+                    self.flush_interval is not None and now - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        now = self.clock()
+        self._last_flush = now
+        pending, self._pending = self._pending, {}
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if pending:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (session_id, state, last_seen) VALUES (?, ?, ?)",
+                    [(sid, state, seen) for sid, (state, seen) in pending.items()],
+                )
+            if self.ttl is not None:
+                # Uses the last_seen index, so only the expired rows are touched.
+                cursor = conn.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+                self.evictions += max(cursor.rowcount, 0)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            self._pending = {**pending, **self._pending}
+            raise
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,245 @@
+"""
+Tk widgets for the GUIs. Kept apart from the engine modules so servers and
+the command-line tools never import tkinter.
+"""
+import tkinter as tk
+import tkinter.font as tkfont
+from chatbot.virtual_list import VirtualListModel
+from chatbot.transcript import Transcript, TranscriptWindow, SCROLLBACK, PAGE
+
+
+class VirtualListbox(tk.Frame):
+    """
+    A Listbox that only holds the rows in view. The ids live in a
+    VirtualListModel; scrolling and refreshing re-fill the few visible
+    rows instead of inserting every id. Selection is by id and survives
+    set_items(). Generates <<VirtualListSelect>> when the user selects a row.
+
+    Listbox options (font, colors, width, height...) are passed through.
+    """
+
+    WHEEL_ROWS = 3
+
+    def __init__(self, master, bg=None, **listbox_options):
+        super().__init__(master, bg=bg)
+        self.model = VirtualListModel(visible_rows=listbox_options.get('height', 25))
+        # exportselection off: selecting text elsewhere must not drop the selection.
+        self.listbox = tk.Listbox(self, exportselection=False, bg=bg, **listbox_options)
+        self.scrollbar = tk.Scrollbar(self, command=self._on_scrollbar)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+        self._shown = None
+        self._row_height = None
+
+        self.listbox.bind('<<ListboxSelect>>', self._on_click)
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        # X11 reports the wheel as buttons 4 and 5.
+        self.listbox.bind('<Button-4>', lambda e: self._scroll(-self.WHEEL_ROWS))
+        self.listbox.bind('<Button-5>', lambda e: self._scroll(self.WHEEL_ROWS))
+        for key, rows in (('<Up>', -1), ('<Down>', 1)):
+            self.listbox.bind(key, lambda e, rows=rows: self._move(rows))
+        for key, pages in (('<Prior>', -1), ('<Next>', 1)):
+            self.listbox.bind(key, lambda e, pages=pages: self._move(pages * max(1, self.model.visible_rows - 1)))
+        self.listbox.bind('<Home>', lambda e: self._move(-len(self.model)))
+        self.listbox.bind('<End>', lambda e: self._move(len(self.model)))
+
+    @property
+    def selected(self):
+        return self.model.selected
+
+    def set_items(self, items):
+        self.model.set_items(items)
+        self._shown = None
+        self._render()
+
+    def select(self, item):
+        self.model.select(item)
+        self._render()
+
+    def _render(self):
+        model = self.model
+        rows = model.visible()
+        # Only touch the Listbox when the rows in view changed.
+        key = (model.top, len(rows), rows[0] if rows else None, rows[-1] if rows else None)
+        if key != self._shown:
+            self.listbox.delete(0, tk.END)
+            if rows:
+                self.listbox.insert(tk.END, *rows)
+            self._shown = key
+        self.listbox.selection_clear(0, tk.END)
+        row = model.selected_row
+        if row is not None and model.top <= row < model.top + len(rows):
+            self.listbox.selection_set(row - model.top)
+            self.listbox.activate(row - model.top)
+        self.scrollbar.set(*model.yview())
+
+    def _scroll(self, rows):
+        self.model.scroll(rows)
+        self._render()
+        return 'break'
+
+    def _move(self, rows):
+        before = self.model.selected
+        self.model.move_selection(rows)
+        self._render()
+        if self.model.selected != before:
+            self.event_generate('<<VirtualListSelect>>')
+        return 'break'
+
+    def _on_scrollbar(self, command, *args):
+        if command == 'moveto':
+            self.model.moveto(float(args[0]))
+        elif command == 'scroll':
+            amount, unit = int(args[0]), args[1]
+            if unit == 'pages':
+                self.model.scroll_pages(amount)
+            else:
+                self.model.scroll(amount)
+        self._render()
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas.
+        steps = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        return self._scroll(-steps * self.WHEEL_ROWS)
+
+    def _on_click(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        row = self.model.top + selection[0]
+        if row != self.model.selected_row:
+            self.model.select_row(row)
+            self.event_generate('<<VirtualListSelect>>')
+
+    def _on_resize(self, event):
+        if self._row_height is None:
+            font = tkfont.Font(font=self.listbox.cget('font'))
+            self._row_height = font.metrics('linespace') + 2 * int(self.listbox.cget('selectborderwidth')) or 1
+        rows = max(1, (event.height - 2 * int(self.listbox.cget('borderwidth'))) // self._row_height)
+        if rows != self.model.visible_rows:
+            self.model.set_visible_rows(rows)
+            self._render()
+
+
+class ChatTranscript(tk.Frame):
+    """
+    A read-only Text showing at most scrollback messages of a Transcript.
+    Scrolling to the top or bottom of what is shown pages in older or
+    newer messages and drops as many from the other end; a new message
+    scrolls to the end. When all that is shown fits on screen there is
+    nothing to scroll, and the mouse wheel pages instead.
+
+    Each shown message starts at a mark named msg<index>. Marks have right
+    gravity at rest, so text inserted in front of a message leaves its mark
+    at the start of the message. Text options (font, colors, wrap...) are
+    passed through.
+    """
+
+    def __init__(self, master, transcript=None, scrollback=SCROLLBACK, page=PAGE, bg=None, **text_options):
+        super().__init__(master, bg=bg)
+        self.transcript = transcript if transcript is not None else Transcript()
+        self.window = TranscriptWindow(self.transcript, scrollback, page)
+        self.text = tk.Text(self, state='disabled', bg=bg, yscrollcommand=self._on_yview, **text_options)
+        self.scrollbar = tk.Scrollbar(self, command=self.text.yview)
+        self.text.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+        self.text.bind('<MouseWheel>', lambda event: self._on_wheel(event.delta > 0), add='+')
+        self.text.bind('<Button-4>', lambda event: self._on_wheel(True), add='+')
+        self.text.bind('<Button-5>', lambda event: self._on_wheel(False), add='+')
+        self.tag_configure = self.text.tag_configure
+        self._paging = None
+        self._render()
+
+    def add_message(self, sender, message):
+        self.transcript.append(sender, message)
+        drop = self.window.appended()
+        if drop is None:
+            # Scrolled back: jump to the latest messages
+            self._render()
+            return
+        self.text.config(state='normal')
+        if drop:
+            self._drop_top(drop)
+        self._insert(len(self.transcript) - 1, tk.END)
+        self.text.see(tk.END)
+        self.text.config(state='disabled')
+
+    def clear(self):
+        self.transcript.clear()
+        self._render()
+
+    def _render(self):
+        start, end = self.window.follow()
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        for name in self.text.mark_names():
+            if name.startswith('msg'):
+                self.text.mark_unset(name)
+        for index in range(start, end):
+            self._insert(index, tk.END)
+        self.text.see(tk.END)
+        self.text.config(state='disabled')
+
+    def _insert(self, index, where):
+        # where is '1.0' or END; END inserts before the Text's final newline.
+        name = f"msg{index}"
+        self.text.mark_set(name, '1.0' if where == '1.0' else 'end-1c')
+        self.text.mark_gravity(name, 'left')
+        args = []
+        for text, tag in self.transcript.segments(index):
+            args += [text, tag or '']
+        self.text.insert(where, *args)
+        self.text.mark_gravity(name, 'right')
+
+    def _drop_top(self, count):
+        first = self.window.start - count
+        self.text.delete('1.0', f"msg{self.window.start}")
+        for index in range(first, self.window.start):
+            self.text.mark_unset(f"msg{index}")
+
+    def _drop_bottom(self, count):
+        self.text.delete(f"msg{self.window.end}", tk.END)
+        for index in range(self.window.end, self.window.end + count):
+            self.text.mark_unset(f"msg{index}")
+
+    def _on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        first, last = float(first), float(last)
+        # With both ends in view at once, paging in older messages would
+        # show the bottom and page the newer ones back, forever.
+        if self._paging is not None or (first <= 0.0 and last >= 1.0):
+            return
+        if first <= 0.0 and self.window.start > 0:
+            self._paging = self.after_idle(self._page, True)
+        elif last >= 1.0 and not self.window.at_bottom:
+            self._paging = self.after_idle(self._page, False)
+
+    def _on_wheel(self, older):
+        first, last = self.text.yview()
+        if self._paging is None and first <= 0.0 and last >= 1.0:
+            self._paging = self.after_idle(self._page, older)
+
+    def _page(self, older):
+        self._paging = None
+        change = self.window.older() if older else self.window.newer()
+        if change is None:
+            return
+        (first, last), drop = change
+        self.text.config(state='normal')
+        # Keep the line at the top of the view where it is on screen
+        self.text.mark_set('view', '@0,0')
+        self.text.mark_gravity('view', 'right')
+        if older:
+            for index in reversed(range(first, last)):
+                self._insert(index, '1.0')
+            if drop:
+                self._drop_bottom(drop)
+        else:
+            for index in range(first, last):
+                self._insert(index, tk.END)
+            if drop:
+                self._drop_top(drop)
+        self.text.yview('view')
+        self.text.mark_unset('view')
+        self.text.config(state='disabled')
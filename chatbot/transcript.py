@@ -0,0 +1,134 @@
+"""
+Chat transcript for the user GUI. Every message of the session lives here
+in compact form (time, sender, text); the Text widget only holds a window
+of them, so adding a message costs the same at the 10,000th as at the
+10th, and export streams from here rather than copying the widget.
+"""
+import datetime
+import time
+from array import array
+
+# Messages rendered in the widget at most, and how many more are paged
+# in when the view reaches the top or bottom of the window.
+SCROLLBACK = 200
+PAGE = 50
+
+USER = 0
+BOT = 1
+
+_LABELS = {USER: "👤 You: ", BOT: "🤖 Bot: "}
+_TAGS = {USER: 'user', BOT: 'bot'}
+
+
+class Transcript:
+    def __init__(self):
+        self._times = array('d')
+        self._senders = bytearray()
+        self._texts = []
+
+    def __len__(self):
+        return len(self._texts)
+
+    def append(self, sender, text, when=None):
+        """
+        Adds a message from "You" (the user) or anyone else (the bot);
+        returns its index.
+        """
+        self._times.append(time.time() if when is None else when)
+        self._senders.append(USER if sender == "You" else BOT)
+        self._texts.append(text)
+        return len(self._texts) - 1
+
+    def clear(self):
+        self._times = array('d')
+        self._senders = bytearray()
+        self._texts = []
+
+    def segments(self, index):
+        """
+        The (text, tag) pieces message index is displayed as.
+        """
+        stamp = datetime.datetime.fromtimestamp(self._times[index]).strftime("%H:%M:%S")
+        sender = self._senders[index]
+        return ((f"[{stamp}] ", 'timestamp'), (_LABELS[sender], _TAGS[sender]),
+                (f"{self._texts[index]}\n\n", None))
+
+    def format(self, index):
+        return ''.join(text for text, _ in self.segments(index))
+
+    def write(self, f):
+        """
+        Writes the whole transcript to the text file f, one message at a time.
+        """
+        for index in range(len(self._texts)):
+            f.write(self.format(index))
+
+
+class TranscriptWindow:
+    """
+    Which messages of a Transcript are rendered: indexes start to end
+    (exclusive), at most size of them. Each call returns what the widget
+    must do to match.
+    """
+
+    def __init__(self, transcript, size=SCROLLBACK, page=PAGE):
+        self.transcript = transcript
+        self.size = max(1, size)
+        self.page = max(1, min(page, self.size))
+        self.start = self.end = 0
+
+    @property
+    def at_bottom(self):
+        return self.end == len(self.transcript)
+
+    def follow(self):
+        """
+        Moves the window to the latest messages; returns (start, end).
+        """
+        self.end = len(self.transcript)
+        self.start = max(0, self.end - self.size)
+        return self.start, self.end
+
+    def appended(self):
+        """
+        Call after a message is appended. Returns the number of messages
+        to drop from the top before rendering the new one, or None when
+        the window was scrolled back and must be re-rendered from follow().
+        """
+        if self.end != len(self.transcript) - 1:
+            return None
+        self.end += 1
+        drop = max(0, self.end - self.start - self.size)
+        self.start += drop
+        return drop
+
+    def older(self):
+        """
+        Pages in messages before the window. Returns ((first, last) to
+        insert at the top, number to drop from the bottom), or None when
+        the window already starts at the first message.
+        """
+        if self.start == 0:
+            return None
+        first = max(0, self.start - self.page)
+        added = (first, self.start)
+        self.start = first
+        drop = max(0, self.end - self.start - self.size)
+        self.end -= drop
+        return added, drop
+
+    def newer(self):
+        """
+        Pages in messages after the window. Returns ((first, last) to
+        append at the bottom, number to drop from the top), or None when
+        the window already ends at the latest message.
+        """
+        total = len(self.transcript)
+        if self.end == total:
+            return None
+        last = min(total, self.end + self.page)
+        added = (self.end, last)
+        self.end = last
+        drop = max(0, self.end - self.start - self.size)
+        self.start += drop
+        return added, drop
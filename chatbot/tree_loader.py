@@ -0,0 +1,268 @@
+"""
+Loads the workflow file for the admin GUI on a daemon thread and diffs it
+against the previous load, so the Tk event loop never waits for the disk
+or the parser. Edits run on the same thread, in the order they were asked
+for, and are saved from there.
+
+json.load would parse the whole file in one C call that holds the GIL
+throughout, freezing the UI thread just the same; the top-level object is
+parsed one node at a time instead, letting the interpreter switch threads
+between nodes. Progress, results and errors are put on loader.events for
+the UI thread to drain:
+
+    ('progress', stage, fraction)    stage: reading, parsing, diffing, indexing
+    ('loaded', TreeDiff)
+    ('indexed', None)                the search index is up to date
+    ('error', message)               a load failed
+    ('saved', message, TreeDiff)     an edit ran; the diff covers what it changed
+    ('save-error', message)          an edit raised
+"""
+import gc
+import json
+import os
+import queue
+import re
+import threading
+from collections import deque
+from json.decoder import scanstring
+from chatbot.workflow_manager import WORKFLOW_PATH, WorkflowRepository
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Bytes read, or nodes handled, between two progress events.
+READ_CHUNK = 4 * 1024 * 1024
+PROGRESS_EVERY = 20000
+
+
+def iter_object(text, decoder=None):
+    """
+    Yields (key, value, end offset) for each entry of the JSON object in
+    text, parsing one value per step.
+    """
+    decoder = decoder or json.JSONDecoder()
+    match = _WHITESPACE.match
+    pos = match(text, 0).end()
+    if text[pos:pos + 1] != '{':
+        raise json.JSONDecodeError("Expecting '{'", text, pos)
+    pos = match(text, pos + 1).end()
+    if text[pos:pos + 1] == '}':
+        return
+    while True:
+        if text[pos:pos + 1] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+        key, pos = scanstring(text, pos + 1)
+        pos = match(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+        value, pos = decoder.raw_decode(text, match(text, pos + 1).end())
+        yield key, value, pos
+        pos = match(text, pos).end()
+        delimiter = text[pos:pos + 1]
+        if delimiter == '}':
+            break
+        if delimiter != ',':
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+        pos = match(text, pos + 1).end()
+    if match(text, pos + 1).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, pos + 1)
+
+
+class TreeDiff:
+    def __init__(self, tree, added, changed, removed):
+        self.tree = tree
+        self.nodes = list(tree)
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        # Nodes whose details may look different: the ones that changed
+        # and the targets of edges that were added or removed.
+        self.touched = set()
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+class TreeLoader:
+    """
+    Each load is handed to a WorkflowRepository (repository, or one of the
+    loader's own), which keeps the incoming-edge index in step with only
+    the nodes that changed.
+
+    With freeze_first set, what the first load built is moved to the
+    permanent generation (gc.freeze) so that later collections skip it.
+    That is for a process, like the admin GUI, whose largest long-lived
+    data is the tree it starts with; it happens once, and trees loaded
+    afterwards are collected as usual.
+    """
+
+    def __init__(self, path=None, index=None, repository=None, freeze_first=False):
+        self.path = path or WORKFLOW_PATH
+        # A chatbot.search_index.NodeSearchIndex to keep in step, if any.
+        self.index = index
+        self.repository = repository or WorkflowRepository(self.path, load=False)
+        self.events = queue.Queue()
+        self.freeze_first = freeze_first
+        self._loaded_once = False
+        self._lock = threading.Lock()
+        self._thread = None
+        # Queued jobs: None for a load, (method, args, kwargs) for an edit
+        self._jobs = deque()
+
+    def load(self):
+        """
+        Starts a load in the background. Asking again while one runs
+        queues a single reload after it.
+        """
+        self._queue(None)
+
+    def edit(self, method, *args, **kwargs):
+        """
+        Queues repository.<method>(*args, **kwargs), e.g. 'add_node', to run
+        in the background after the loads and edits queued before it. Its
+        reply comes back in a 'saved' event.
+        """
+        self._queue((method, args, kwargs))
+
+    def _queue(self, job):
+        with self._lock:
+            if job is None and None in self._jobs:
+                return
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tree-loader', daemon=True)
+                self._thread.start()
+
+    @property
+    def loading(self):
+        """
+        True while a load or an edit is queued or running.
+        """
+        return self._thread is not None
+
+    def incoming_edges(self, node_id):
+        """
+        Returns the (parent id, keyword) pairs of every edge pointing at
+        node_id, as of the last load.
+        """
+        return self.repository.incoming_edges(node_id)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                job = self._jobs.popleft()
+            if job is None:
+                try:
+                    self._load_once()
+                except Exception as e:
+                    self.events.put(('error', str(e)))
+            else:
+                try:
+                    self._edit(*job)
+                except Exception as e:
+                    self.events.put(('save-error', str(e)))
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _progress(self, stage, fraction):
+        self.events.put(('progress', stage, fraction))
+
+    def _read(self):
+        size = os.path.getsize(self.path)
+        chunks = []
+        done = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                done += len(chunk)
+                if size > READ_CHUNK:
+                    self._progress('reading', min(1.0, done / size))
+        return ''.join(chunks)
+
+    def _load_once(self):
+        # The parser allocates one container per JSON object, each of which
+        # counts towards a collection; a full one scans the old tree, the
+        # new one and the index alike, holding the GIL for 100 ms and more
+        # at 100k nodes. Collection pauses for the load only.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._load_and_diff()
+            if self.freeze_first and not self._loaded_once:
+                gc.freeze()
+            self._loaded_once = True
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _load_and_diff(self):
+        mtime = self._mtime()
+        text = self._read()
+        tree = {}
+        total = len(text)
+        for count, (node_id, node_data, end) in enumerate(iter_object(text), 1):
+            tree[node_id] = node_data
+            if count % PROGRESS_EVERY == 0:
+                self._progress('parsing', end / total)
+        del text
+
+        old = self.repository.tree
+        added, changed = [], []
+        for count, (node_id, node_data) in enumerate(tree.items(), 1):
+            previous = old.get(node_id)
+            if previous is None:
+                added.append(node_id)
+            elif previous == node_data:
+                # Keep the old object: dropping the old tree then frees only
+                # the nodes that changed, rather than all of them in one go.
+                tree[node_id] = previous
+            else:
+                changed.append(node_id)
+            if count % PROGRESS_EVERY == 0:
+                self._progress('diffing', count / len(tree))
+        removed = [node_id for node_id in old if node_id not in tree]
+
+        diff = TreeDiff(tree, added, changed, removed)
+        diff.touched = self.repository.adopt(tree, mtime, added + changed, removed)
+        diff.touched.update(added, changed, removed)
+        self.events.put(('loaded', diff))
+
+        if self.index is not None and diff:
+            self._reindex(diff, progress=True)
+            self.events.put(('indexed', None))
+
+    def _reindex(self, diff, progress=False):
+        work = len(diff.added) + len(diff.changed) + len(diff.removed)
+        for count, node_id in enumerate(diff.added + diff.changed, 1):
+            node_data = diff.tree[node_id]
+            if isinstance(node_data, dict):
+                self.index.add(node_id, node_data)
+            if progress and count % PROGRESS_EVERY == 0:
+                self._progress('indexing', count / work)
+        for node_id in diff.removed:
+            self.index.remove(node_id)
+
+    def _edit(self, method, args, kwargs):
+        repository = self.repository
+        # A file changed elsewhere is picked up the way a load does it; the
+        # repository's own refresh() would parse it in one GIL-holding call.
+        if not self._loaded_once or self._mtime() != repository.mtime:
+            self._load_once()
+        message = getattr(repository, method)(*args, **kwargs)
+        added, changed, removed, targets = repository.saved_changes()
+        # A copy: the repository's tree changes under later edits.
+        diff = TreeDiff(dict(repository.tree), added, changed, removed)
+        diff.touched = targets
+        diff.touched.update(added, changed, removed)
+        if self.index is not None and diff:
+            self._reindex(diff)
+        self.events.put(('saved', message, diff))
@@ -0,0 +1,328 @@
+"""
+Static checks for troubleshooting_tree.json, linear in nodes + edges:
+
+  errors     missing root, malformed nodes or edges, edges to missing
+             nodes, non-terminal nodes without edges, terminal nodes with edges
+  warnings   nodes unreachable from root and the intents, cycles (strongly
+             connected components, found with an iterative Tarjan), nodes
+             that can never reach a terminal node, intents without a node,
+             terminal nodes without a response, prompts missing
+
+Edges back to root are "start over" links and are left out of the cycle
+check. Run it from the command line or the admin tool; workflow_manager
+also runs it before every save (see SAVE_CHECK there).
+
+    python -m chatbot.validator [tree.json] [--json] [--show 10]
+
+Exits with status 1 when the tree has errors.
+"""
+import argparse
+import json
+import sys
+from chatbot.nlp_utils import INTENT_KEYWORDS
+
+ERROR = 'error'
+WARNING = 'warning'
+
+
+class TreeReport:
+    def __init__(self):
+        self.issues = []      # (severity, code, node id, message)
+        self.stats = {}
+
+    def add(self, severity, code, node_id, message):
+        self.issues.append((severity, code, node_id, message))
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue[0] == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue[0] == WARNING]
+
+    @property
+    def ok(self):
+        return not any(issue[0] == ERROR for issue in self.issues)
+
+    def counts(self):
+        counts = {}
+        for severity, code, _, _ in self.issues:
+            counts[(severity, code)] = counts.get((severity, code), 0) + 1
+        return counts
+
+    def to_dict(self, show=None):
+        return {
+            'ok': self.ok,
+            'errors': len(self.errors),
+            'warnings': len(self.warnings),
+            'stats': self.stats,
+            'issues': [{'severity': severity, 'code': code, 'node': node_id, 'message': message}
+                       for severity, code, node_id, message in self.issues[:show]],
+        }
+
+
+def strongly_connected_components(offsets, targets, skip=None):
+    """
+    Tarjan's algorithm over nodes 0..n-1, with explicit stacks so deep
+    chains cannot hit the recursion limit. The successors of v are
+    targets[offsets[v]:offsets[v + 1]]; edges into skip are ignored.
+    Yields only the components that contain a cycle: more than one node,
+    or a node with an edge to itself.
+    """
+    n = len(offsets) - 1
+    order = [0] * n         # discovery order + 1; 0 = not visited yet
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 1
+    for start in range(n):
+        if order[start]:
+            continue
+        order[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack[start] = True
+        # Depth-first path, and the next edge to look at for each node on it.
+        path = [start]
+        positions = [offsets[start]]
+        while path:
+            v = path[-1]
+            p = positions[-1]
+            end = offsets[v + 1]
+            while p < end:
+                w = targets[p]
+                p += 1
+                if w == skip:
+                    continue
+                if not order[w]:
+                    break
+                if on_stack[w] and order[w] < low[v]:
+                    low[v] = order[w]
+            else:
+                path.pop()
+                positions.pop()
+                if path:
+                    parent = path[-1]
+                    if low[v] < low[parent]:
+                        low[parent] = low[v]
+                if low[v] == order[v]:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    if w == v:
+                        if v in targets[offsets[v]:end]:
+                            yield [v]
+                        continue
+                    component = [w]
+                    while w != v:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                    yield component
+                continue
+            positions[-1] = p
+            order[w] = low[w] = counter
+            counter += 1
+            stack.append(w)
+            on_stack[w] = True
+            path.append(w)
+            positions.append(offsets[w])
+
+
+def _reach(offsets, targets, starts):
+    seen = [False] * (len(offsets) - 1)
+    depth = 0
+    frontier = [v for v in starts if not seen[v]]
+    for v in frontier:
+        seen[v] = True
+    # Level by level, to report the tree's depth as well.
+    while frontier:
+        following = []
+        for v in frontier:
+            for p in range(offsets[v], offsets[v + 1]):
+                w = targets[p]
+                if not seen[w]:
+                    seen[w] = True
+                    following.append(w)
+        if following:
+            depth += 1
+        frontier = following
+    return seen, depth
+
+
+def _reverse(offsets, targets, in_degree):
+    # Counting sort of the edges by target.
+    reverse_offsets = [0] * (len(offsets))
+    total = 0
+    for w, n in enumerate(in_degree):
+        total += n
+        reverse_offsets[w + 1] = total
+    fill = reverse_offsets[:-1]
+    sources = [0] * total
+    for v in range(len(offsets) - 1):
+        for p in range(offsets[v], offsets[v + 1]):
+            w = targets[p]
+            sources[fill[w]] = v
+            fill[w] += 1
+    return reverse_offsets, sources
+
+
+def _degree_stats(degrees, ids):
+    if not degrees:
+        return {'max': 0, 'max_node': None, 'mean': 0.0, 'zero': 0}
+    top = max(range(len(degrees)), key=degrees.__getitem__)
+    return {'max': degrees[top], 'max_node': ids[top], 'mean': round(sum(degrees) / len(degrees), 3),
+            'zero': degrees.count(0)}
+
+
+def validate_tree(tree, intents=None, root='root'):
+    """
+    Checks a tree given as {node id: node dict} and returns a TreeReport.
+    intents are the node ids flows start at (defaults to INTENT_KEYWORDS).
+    """
+    report = TreeReport()
+    intents = INTENT_KEYWORDS if intents is None else intents
+    ids = list(tree)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    # Edges as flat lists rather than a list per node: millions of small
+    # lists would keep the garbage collector busy for most of the run.
+    offsets = [0]
+    targets = []
+    in_degree = [0] * len(ids)
+    out_degree = []
+    terminals = []
+
+    if root not in index:
+        report.add(ERROR, 'missing_root', root, f"The tree has no '{root}' node.")
+
+    for i, node_id in enumerate(ids):
+        node = tree[node_id]
+        if not isinstance(node, dict):
+            report.add(ERROR, 'bad_node', node_id, "Node is not an object.")
+            out_degree.append(0)
+            offsets.append(len(targets))
+            continue
+        edges = node.get('edges') or {}
+        if not isinstance(edges, dict):
+            report.add(ERROR, 'bad_edges', node_id, "Edges are not a keyword -> node object.")
+            edges = {}
+        out_degree.append(len(edges))
+        if node.get('terminal'):
+            terminals.append(i)
+            if edges:
+                report.add(ERROR, 'terminal_with_edges', node_id,
+                           f"Terminal node has {len(edges)} edges that can never be followed.")
+            if not node.get('response'):
+                report.add(WARNING, 'missing_response', node_id, "Terminal node has no response.")
+        else:
+            if not edges and node_id != root:
+                report.add(ERROR, 'no_edges', node_id, "Non-terminal node has no edges: users get stuck here.")
+            if not node.get('prompt'):
+                report.add(WARNING, 'missing_prompt', node_id, "Non-terminal node has no prompt.")
+        for keyword, target in edges.items():
+            j = index.get(target) if isinstance(target, str) else None
+            if j is None:
+                report.add(ERROR, 'dangling_edge', node_id, f"Edge '{keyword}' points to missing node {target!r}.")
+                continue
+            targets.append(j)
+            in_degree[j] += 1
+        offsets.append(len(targets))
+
+    starts = [index[root]] if root in index else []
+    for intent in intents:
+        if intent in index:
+            starts.append(index[intent])
+        else:
+            report.add(WARNING, 'missing_intent_node', intent, f"Intent '{intent}' has no node to start at.")
+    reachable, depth = _reach(offsets, targets, starts)
+    for i, seen in enumerate(reachable):
+        if not seen:
+            report.add(WARNING, 'unreachable', ids[i], "Not reachable from root or any intent.")
+
+    # Nodes that can reach a terminal, found backwards from the terminals.
+    reverse_offsets, sources = _reverse(offsets, targets, in_degree)
+    can_finish, _ = _reach(reverse_offsets, sources, terminals)
+    del reverse_offsets, sources
+    root_index = index.get(root)
+    for i, finishes in enumerate(can_finish):
+        # Root is left by intents rather than edges.
+        if not finishes and offsets[i + 1] > offsets[i] and i != root_index:
+            report.add(WARNING, 'no_exit', ids[i], "No path from this node reaches a terminal node.")
+
+    cycles = 0
+    for component in strongly_connected_components(offsets, targets, skip=root_index):
+        cycles += 1
+        names = [ids[i] for i in component[:5]]
+        more = f" and {len(component) - 5} more" if len(component) > 5 else ""
+        report.add(WARNING, 'cycle', names[0],
+                   f"Cycle through {len(component)} node(s): {', '.join(names)}{more}.")
+
+    report.stats = {
+        'nodes': len(ids),
+        'edges': sum(out_degree),
+        'terminals': len(terminals),
+        'reachable': sum(reachable),
+        'depth': depth,
+        'cycles': cycles,
+        'out_degree': _degree_stats(out_degree, ids),
+        'in_degree': _degree_stats(in_degree, ids),
+    }
+    return report
+
+
+def validate_file(path=None):
+    from chatbot.workflow_manager import WORKFLOW_PATH
+    with open(path or WORKFLOW_PATH, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    if not isinstance(tree, dict):
+        report = TreeReport()
+        report.add(ERROR, 'bad_tree', None, "The tree is not a JSON object.")
+        return report
+    return validate_tree(tree)
+
+
+def format_report(report, show=10):
+    """
+    Summary line, statistics and up to show issues of each kind.
+    """
+    stats = report.stats
+    lines = [f"{len(report.errors)} errors, {len(report.warnings)} warnings"]
+    if stats:
+        lines.append(f"{stats['nodes']} nodes, {stats['edges']} edges, {stats['terminals']} terminal, "
+                     f"{stats['reachable']} reachable, depth {stats['depth']}, {stats['cycles']} cycles")
+        for name in ('out_degree', 'in_degree'):
+            d = stats[name]
+            lines.append(f"{name.replace('_', '-')}: max {d['max']} ({d['max_node']}), "
+                         f"mean {d['mean']}, {d['zero']} nodes at 0")
+    shown = {}
+    for severity, code, node_id, message in report.issues:
+        shown[code] = shown.get(code, 0) + 1
+        if shown[code] <= show:
+            lines.append(f"  {severity} {code} [{node_id}] {message}")
+    for (severity, code), n in report.counts().items():
+        if n > show:
+            lines.append(f"  ... {n - show} more {code}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a troubleshooting tree for structural problems")
+    parser.add_argument('tree', nargs='?', default=None, help="path to troubleshooting_tree.json")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--show', type=int, default=10, help="issues to list per kind")
+    args = parser.parse_args(argv)
+
+    try:
+        report = validate_file(args.tree)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read tree: {e}")
+        return 2
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(format_report(report, args.show))
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
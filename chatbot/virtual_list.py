@@ -0,0 +1,125 @@
+"""
+Model behind a virtualized list: the full array of row ids lives here and
+only the rows inside the visible window are handed to the widget, so a
+refresh or a scroll costs the same at 100 rows as at a million.
+Selection is kept by id, so it survives refreshes and filtering.
+"""
+
+
+class VirtualListModel:
+    def __init__(self, items=(), visible_rows=25):
+        self.items = list(items)
+        self.visible_rows = max(1, visible_rows)
+        self.top = 0
+        self.selected = None
+        self._selected_row = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def set_items(self, items):
+        """
+        Replaces the rows. A selected id that is still present stays
+        selected and keeps its place on screen; otherwise the view stays
+        at the same row number.
+        """
+        offset = self._selected_row - self.top if self._selected_row is not None else None
+        self.items = items if isinstance(items, list) else list(items)
+        self._selected_row = self.row_of(self.selected)
+        if self._selected_row is None:
+            self.selected = None
+            self.scroll_to(self.top)
+        elif offset is not None and 0 <= offset < self.visible_rows:
+            self.scroll_to(self._selected_row - offset)
+        else:
+            self.ensure_visible(self._selected_row)
+
+    def row_of(self, item):
+        if item is None:
+            return None
+        row = self._selected_row
+        # Refreshes usually leave the row where it was, or a few rows off:
+        # look there before scanning the whole list.
+        if row is not None:
+            if row < len(self.items) and self.items[row] == item:
+                return row
+            try:
+                return self.items.index(item, max(0, row - 256), row + 257)
+            except ValueError:
+                pass
+        try:
+            return self.items.index(item)
+        except ValueError:
+            return None
+
+    def set_visible_rows(self, rows):
+        self.visible_rows = max(1, rows)
+        self.scroll_to(self.top)
+
+    def max_top(self):
+        return max(0, len(self.items) - self.visible_rows)
+
+    def scroll_to(self, row):
+        self.top = min(max(0, row), self.max_top())
+        return self.top
+
+    def scroll(self, rows):
+        return self.scroll_to(self.top + rows)
+
+    def scroll_pages(self, pages):
+        return self.scroll_to(self.top + pages * max(1, self.visible_rows - 1))
+
+    def moveto(self, fraction):
+        """
+        Scrolls so fraction (0..1) of the rows are above the view, as a
+        scrollbar's 'moveto' command asks.
+        """
+        return self.scroll_to(int(round(fraction * len(self.items))))
+
+    def yview(self):
+        """
+        (first, last) fractions of the rows in view, for Scrollbar.set.
+        """
+        if not self.items:
+            return 0.0, 1.0
+        total = len(self.items)
+        return self.top / total, min(total, self.top + self.visible_rows) / total
+
+    def visible(self):
+        return self.items[self.top:self.top + self.visible_rows]
+
+    def ensure_visible(self, row):
+        if row < self.top:
+            self.scroll_to(row)
+        elif row >= self.top + self.visible_rows:
+            self.scroll_to(row - self.visible_rows + 1)
+
+    def select_row(self, row):
+        """
+        Selects the row at index row (clamped to the list) and scrolls it
+        into view; returns the selected id, or None for an empty list.
+        """
+        if not self.items:
+            self.selected = self._selected_row = None
+            return None
+        row = min(max(0, row), len(self.items) - 1)
+        self._selected_row = row
+        self.selected = self.items[row]
+        self.ensure_visible(row)
+        return self.selected
+
+    def select(self, item):
+        row = self.row_of(item)
+        if row is None:
+            self.selected = self._selected_row = None
+            return None
+        return self.select_row(row)
+
+    def move_selection(self, rows):
+        if self._selected_row is None:
+            return self.select_row(self.top)
+        return self.select_row(self._selected_row + rows)
+
+    @property
+    def selected_row(self):
+        return self._selected_row
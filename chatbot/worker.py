@@ -0,0 +1,90 @@
+"""
+One engine thread for the chat window. Messages are queued and answered in
+the order they were sent, one at a time, so the session never sees two
+turns at once; replies wait on a queue for the UI thread to drain, all
+that are ready in one go.
+
+cancel() makes every unanswered message stale: queued ones are skipped,
+and the reply of the one being answered is dropped.
+"""
+import itertools
+import queue
+import threading
+
+
+class EngineWorker:
+    def __init__(self, engine, session=None):
+        self.engine = engine
+        self.session = session
+        self._requests = queue.Queue()
+        self._replies = queue.Queue()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name='engine-worker', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """
+        Messages submitted and neither drained nor cancelled yet.
+        """
+        return self._pending
+
+    def submit(self, message):
+        """
+        Queues message; returns its request id, which increases with every call.
+        """
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending += 1
+            self._requests.put((request_id, self._generation, message))
+        return request_id
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            self._pending = 0
+
+    def drain(self):
+        """
+        Returns [(request id, message, reply, error)] for every reply
+        ready, in order; error is the exception respond() raised, if any.
+        """
+        ready = []
+        while True:
+            try:
+                reply = self._replies.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                if reply[0] != self._generation:
+                    continue
+                self._pending -= 1
+            ready.append(reply[1:])
+        return ready
+
+    def stop(self, timeout=None):
+        """
+        Drops what is still queued and ends the thread once the current
+        message is answered.
+        """
+        self.cancel()
+        self._requests.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            request_id, generation, message = request
+            if generation != self._generation:
+                continue
+            reply = error = None
+            try:
+                reply = self.engine.respond(message, self.session)
+            except Exception as e:
+                error = e
+            self._replies.put((generation, request_id, message, reply, error))
@@ -0,0 +1,403 @@
+"""
+Pre-fork worker mode for chatbot.server (POSIX only).
+
+The supervisor loads and compiles the tree once, opens the listening socket
+and forks N workers, which inherit both. Every worker accepts connections on
+the shared socket itself, so no message passes through the supervisor. The
+compiled tree is memory-mapped, so every worker reads the same page-cache
+pages, and the Python objects built before the fork (intent matcher, typo
+corrector, retrieval index) are shared copy-on-write.
+
+A session's state lives in one worker's store, the one chosen by a stable
+hash of its session id. A message for a session owned by another worker is
+forwarded to the owner over a Unix socket, one JSON array per line:
+    request  [request id, session id, text]
+    reply    [request id, response]
+The supervisor opens every worker's peer socket before forking and keeps it,
+so a worker that dies is replaced on the same socket: connections made in
+between wait in its backlog, and only the requests the dead worker had in
+hand fail. The sessions it held are lost.
+
+The supervisor runs the only reload watcher and sends each worker a
+'reload' line over its control socket when the tree changes. A worker exits
+when its control socket closes. With metrics on, each worker serves its own
+on a loopback port and the supervisor serves their sum.
+"""
+import asyncio
+import gc
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import zlib
+from chatbot.engine import ChatbotEngine
+from chatbot.graph import load_graph
+from chatbot.server import ChatServer
+
+
+def worker_for(session_id, n_workers):
+    # crc32 is stable across processes, unlike hash() with randomization.
+    return zlib.crc32(session_id.encode('utf-8')) % n_workers
+
+
+class _WorkerLink:
+    """
+    Forwards requests to the worker listening on the Unix socket at path,
+    connecting on first use and again after that worker is replaced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.pending = {}
+        self.next_id = 0
+        self.task = None
+        self._connecting = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._connecting:
+            if self.writer is None:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self.task = asyncio.get_running_loop().create_task(self._read_replies(reader, writer))
+                self.writer = writer
+
+    async def _read_replies(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                req_id, response = json.loads(line)
+                future = self.pending.pop(req_id, None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except ConnectionError:
+            pass
+        finally:
+            # The next request connects again, to the replacement worker.
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("worker exited"))
+            self.pending.clear()
+
+    async def request(self, session_id, text):
+        if self.writer is None:
+            await self._connect()
+        self.next_id += 1
+        req_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = future
+        try:
+            self.writer.write(json.dumps([req_id, session_id, text]).encode('utf-8') + b'\n')
+            await self.writer.drain()
+        except ConnectionError:
+            self.pending.pop(req_id, None)
+            raise
+        return await future
+
+
+class WorkerChatServer(ChatServer):
+    """
+    ChatServer of worker `index`: accepts on the shared listening socket,
+    answers the sessions it owns and forwards the others to their owner.
+    peer_paths are the Unix sockets of all the workers; this one answers
+    forwarded requests on peer_listener, bound to its own path.
+    """
+
+    def __init__(self, engine, index, n_workers, listener, peer_paths, peer_listener):
+        host, port = listener.getsockname()[:2]
+        super().__init__(engine, host, port)
+        self.index = index
+        self.n_workers = n_workers
+        self.listener = listener
+        self.links = {j: _WorkerLink(path) for j, path in enumerate(peer_paths) if j != index}
+        self.peer_listener = peer_listener
+        self.peer_server = None
+        self.forwarded = 0
+        self._tasks = []
+
+    async def start(self):
+        self.peer_server = await asyncio.start_unix_server(self._serve_peer, sock=self.peer_listener)
+        self.server = await asyncio.start_server(self.handle_connection, sock=self.listener)
+        return self
+
+    async def chat(self, session_id, text):
+        owner = worker_for(session_id, self.n_workers)
+        if owner == self.index:
+            return await super().chat(session_id, text)
+        self.forwarded += 1
+        try:
+            return await self.links[owner].request(session_id, text)
+        except OSError as e:
+            return f"Sorry, I encountered an error: {e}"
+
+    async def _serve_peer(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                req_id, session_id, text = json.loads(line)
+                try:
+                    response = await super().chat(session_id, text)
+                except Exception as e:
+                    response = f"Sorry, I encountered an error: {e}"
+                writer.write(json.dumps([req_id, response]).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled: the worker is stopping with the other worker still connected.
+            pass
+        finally:
+            writer.close()
+
+    async def _watch_control(self, sock):
+        reader, writer = await asyncio.open_connection(sock=sock)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip() == b'reload':
+                await self._reload()
+        # The supervisor is stopping (or gone).
+        writer.close()
+        self.peer_server.close()
+        self.server.close()
+
+    async def _reload(self):
+        # Parsing and indexing the new tree runs off the event loop, which
+        # keeps answering on the current graph meanwhile.
+        path = self.engine.graph.path or self.engine.workflow_path
+        try:
+            graph = await asyncio.get_running_loop().run_in_executor(None, lambda: load_graph(path, strict=True))
+        except Exception as e:
+            print(f"Workflow reload failed, keeping the current tree: {e}")
+            return
+        if graph is not self.engine.graph:
+            self.engine.swap_graph(graph)
+
+    async def run(self, control):
+        await self.start()
+        self._tasks.append(asyncio.get_running_loop().create_task(self._watch_control(control)))
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        tasks = self._tasks + [link.task for link in self.links.values() if link.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _worker_main(server, control, record=None, metrics_port=None):
+    """
+    Serves connections and forwarded requests until the control socket closes.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Exit through the finally below, so the traffic log is flushed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    engine = server.engine
+    if record:
+        engine.start_recording(record)
+    if metrics_port is not None:
+        from chatbot.metrics import start_metrics_server
+        start_metrics_server(engine, port=metrics_port)
+    try:
+        asyncio.run(server.run(control))
+    finally:
+        engine.stop_recording()
+
+
+# A worker that dies sooner than this after its start is replaced only once
+# this much time has passed, so a worker failing at startup does not spin.
+RESPAWN_DELAY = 1.0
+
+
+class WorkerPool:
+    def __init__(self, engine, n_workers, listener, record=None, metrics_port=None):
+        self.engine = engine
+        self.n_workers = n_workers
+        # Bound and listening; every worker accepts on it.
+        self.listener = listener
+        # Each worker records to its own <record>.worker<i> log.
+        self.record = record
+        # Worker i serves its own metrics on metrics_port + i.
+        self.metrics_port = metrics_port
+        self.restarts = 0
+        self.pids = []
+        self.controls = []
+        self.peer_paths = []
+        self.peer_listeners = []
+        self._started = []
+        self._directory = None
+
+    def start(self):
+        """
+        Forks the workers. The listener must stay open in the supervisor:
+        replacement workers inherit it too.
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("worker mode needs os.fork (POSIX)")
+        n = self.n_workers
+        self._directory = tempfile.mkdtemp(prefix='chatbot-workers-')
+        for index in range(n):
+            path = os.path.join(self._directory, f"worker{index}.sock")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(path)
+            sock.listen(128)
+            self.peer_paths.append(path)
+            self.peer_listeners.append(sock)
+        self.pids = [None] * n
+        self.controls = [None] * n
+        self._started = [0.0] * n
+        self._fork(range(n))
+        return self
+
+    def _fork(self, indexes):
+        # Built once here, the typo corrector and retrieval index are shared
+        # by every worker instead of rebuilt by each on its first fallback.
+        self.engine.graph.warm()
+        # Keep the shared tree out of the collector's reach so GC passes in the
+        # workers do not touch (and un-share) its pages.
+        gc.collect()
+        gc.freeze()
+        try:
+            for index in indexes:
+                self._spawn(index)
+        finally:
+            gc.unfreeze()
+
+    def _spawn(self, index):
+        parent_sock, child_sock = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            parent_sock.close()
+            for control in self.controls:
+                if control is not None:
+                    control.close()
+            for j, sock in enumerate(self.peer_listeners):
+                if j != index:
+                    sock.close()
+            code = 0
+            try:
+                server = WorkerChatServer(self.engine, index, self.n_workers, self.listener, self.peer_paths,
+                                          self.peer_listeners[index])
+                record = f"{self.record}.worker{index}" if self.record else None
+                metrics_port = self.metrics_port + index if self.metrics_port is not None else None
+                _worker_main(server, child_sock, record, metrics_port)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        child_sock.close()
+        if self.controls[index] is not None:
+            self.controls[index].close()
+        self.pids[index] = pid
+        self.controls[index] = parent_sock
+        self._started[index] = time.monotonic()
+
+    def reload(self, graph=None):
+        """
+        Tells every worker to load the tree again. Takes the graph a
+        WorkflowWatcher passes its subscribers, which is not sent over.
+        """
+        for control in self.controls:
+            if control is None:
+                continue
+            try:
+                control.sendall(b'reload\n')
+            except OSError:
+                pass
+
+    def respawn(self):
+        """
+        Reaps the workers that have exited and forks their replacements.
+        Returns the indexes of the workers replaced.
+        """
+        replaced = []
+        for index, pid in enumerate(self.pids):
+            if pid is not None:
+                done, status = os.waitpid(pid, os.WNOHANG)
+                if not done:
+                    continue
+                print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+                      f"replacing it", flush=True)
+                self.pids[index] = None
+            if time.monotonic() - self._started[index] >= RESPAWN_DELAY:
+                replaced.append(index)
+        if replaced:
+            self._fork(replaced)
+            self.restarts += len(replaced)
+        return replaced
+
+    def supervise(self, interval=0.5):
+        """
+        Keeps the pool full, checking every interval seconds, until stopped.
+        """
+        while True:
+            time.sleep(interval)
+            self.respawn()
+
+    def wait(self):
+        """
+        Blocks until every worker has exited.
+        """
+        for pid in self.pids:
+            if pid is None:
+                continue
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    def stop(self):
+        """
+        Closes the control sockets (workers exit on EOF) and reaps the workers.
+        """
+        for control in self.controls:
+            if control is not None:
+                control.close()
+        self.wait()
+        for sock in self.peer_listeners:
+            sock.close()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        self.pids = []
+        self.controls = []
+        self.peer_paths = []
+        self.peer_listeners = []
+        self._directory = None
+
+
+def serve_with_workers(n_workers, host='127.0.0.1', port=8765, tree=None, hot_reload=True, record=None,
+                       metrics_port=None):
+    engine = ChatbotEngine(workflow_path=tree)
+    listener = socket.create_server((host, port))
+    port = listener.getsockname()[1]
+    # The workers serve their metrics on the ports above metrics_port, which
+    # serves the sum.
+    worker_metrics_port = metrics_port + 1 if metrics_port is not None else None
+    pool = WorkerPool(engine, n_workers, listener, record=record, metrics_port=worker_metrics_port).start()
+    if metrics_port is not None:
+        from chatbot.metrics import start_worker_metrics_server
+        start_worker_metrics_server(range(worker_metrics_port, worker_metrics_port + n_workers), host, metrics_port)
+    if hot_reload:
+        # One watcher for all workers. Its own load of the new tree also
+        # vets it: a file that fails to load is never announced.
+        engine.enable_hot_reload().subscribe(pool.reload)
+    print(f"Serving on {host}:{port} with {n_workers} workers (line protocol and HTTP)", flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        pool.supervise()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.disable_hot_reload()
+        pool.stop()
+        listener.close()
@@ -1,8 +1,70 @@
+import copy
 import json
 import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from chatbot.validator import validate_tree
 
 WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), '../data/troubleshooting_tree.json')
 
+# Tree check run before every save: 'warn' prints the problems found,
+# 'strict' also refuses to save a tree with errors, 'off' skips it.
+SAVE_CHECK = 'warn'
+
+_MISSING = object()
+
+def check_before_save(tree, mode=None):
+    """
+    Validates tree (chatbot.validator) and returns False when it must not
+    be saved, which only happens in strict mode.
+    """
+    mode = mode or SAVE_CHECK
+    if mode == 'off':
+        return True
+    report = validate_tree(tree)
+    if report.issues:
+        print(f"Tree check: {len(report.errors)} errors, {len(report.warnings)} warnings "
+              f"(python -m chatbot.validator for details)")
+        for severity, code, node_id, message in report.errors[:5]:
+            print(f"  {code} [{node_id}] {message}")
+    if mode == 'strict' and not report.ok:
+        print("Not saving a tree with errors (strict check).")
+        return False
+    return True
+
+def _atomic_write_json(path, data):
+    """
+    Writes data next to path, fsyncs it and renames it over path, so readers
+    only ever see the old or the new file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tree-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file as 0600; keep the permissions of the file we replace.
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
 def load_tree():
     try:
         with open(WORKFLOW_PATH, 'r', encoding='utf-8') as f:
@@ -11,62 +73,303 @@ def load_tree():
         print(f"Error loading tree: {e}")
         return {}
 
-def save_tree(tree):
+def save_tree(tree, check=None):
+    if not check_before_save(tree, check):
+        return False
     try:
-        with open(WORKFLOW_PATH, 'w', encoding='utf-8') as f:
-            json.dump(tree, f, indent=4)
+        _atomic_write_json(WORKFLOW_PATH, tree)
         return True
     except Exception as e:
         print(f"Error saving tree: {e}")
         return False
 
-def add_node(node_id, prompt=None, response=None, edges=None, terminal=False):
-    tree = load_tree()
 
-    if node_id in tree:
-        return f"Node '{node_id}' already exists."
+def _edges(node_data):
+    # A node's (keyword, target) pairs; hand-edited files may hold anything.
+    edges = node_data.get('edges') if isinstance(node_data, dict) else None
+    return list(edges.items()) if isinstance(edges, dict) else []
 
-    node_data = {}
-    if terminal:
-        node_data['response'] = response or "Response here."
-        node_data['terminal'] = True
-    else:
-        node_data['prompt'] = prompt or "Prompt here."
-        node_data['edges'] = edges or {}
 
-    tree[node_id] = node_data
-    success = save_tree(tree)
-    return f"Node '{node_id}' added." if success else "Failed to save tree."
+class WorkflowRepository:
+    """
+    Keeps the tree in memory and persists it atomically once per transaction:
 
-def edit_node(node_id, updates):
-    tree = load_tree()
-    node = tree.get(node_id)
+        with repo.transaction():
+            repo.add_node(...)
+            repo.edit_node(...)
 
-    if not node:
-        return f"Node '{node_id}' not found."
+    Each method called outside a transaction runs in its own. If the file
+    changes on disk, refresh() picks it up before the next edit.
 
-    node.update(updates)
-    success = save_tree(tree)
-    return f"Node '{node_id}' updated." if success else "Failed to save changes."
+    With load=False the tree stays empty until load(), or until a caller
+    that parsed the file itself hands it over with adopt().
 
-def delete_node(node_id):
-    tree = load_tree()
+    Edits replace node dicts rather than change them, so a tree handed to
+    another thread keeps its nodes as they were.
+    """
+
+    def __init__(self, path=None, check=None, load=True):
+        self.path = path or WORKFLOW_PATH
+        # Save check mode; None follows SAVE_CHECK.
+        self.check = check
+        self.tree = {}
+        # node id -> {(parent id, keyword)} for every edge pointing at it
+        self.incoming = {}
+        self.mtime = None
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._journal = None
+        self._last_save_ok = True
+        # Journal of the last transaction written, see saved_changes()
+        self._saved = {}
+        if load:
+            self.load()
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        with self._lock:
+            self.mtime = self._stat_mtime()
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.tree = json.load(f)
+            except Exception as e:
+                print(f"Error loading tree: {e}")
+                self.tree = {}
+            self.incoming = {}
+            for node_id, node_data in self.tree.items():
+                self._index_edges(node_id, node_data)
+            return self.tree
+
+    def adopt(self, tree, mtime, changed=None, removed=()):
+        """
+        Takes over tree, parsed from the file as it was at mtime. changed
+        and removed list the nodes added or modified, and dropped, since
+        the current tree; only their edges are re-indexed, and the targets
+        of those edges are returned. Without them the incoming-edge index
+        is rebuilt.
+        """
+        with self._lock:
+            targets = set()
+            if changed is None:
+                self.incoming = {}
+                for node_id, node_data in tree.items():
+                    targets.update(self._index_edges(node_id, node_data))
+            else:
+                for node_id in list(changed) + list(removed):
+                    previous = self.tree.get(node_id)
+                    if previous is not None:
+                        targets.update(self._unindex_edges(node_id, previous))
+                for node_id in changed:
+                    targets.update(self._index_edges(node_id, tree[node_id]))
+            self.tree = tree
+            self.mtime = mtime
+            return targets
+
+    def _index_edges(self, node_id, node_data):
+        edges = _edges(node_data)
+        for keyword, target in edges:
+            self.incoming.setdefault(target, set()).add((node_id, keyword))
+        return [target for _, target in edges]
+
+    def _unindex_edges(self, node_id, node_data):
+        edges = _edges(node_data)
+        for keyword, target in edges:
+            parents = self.incoming.get(target)
+            if parents is not None:
+                parents.discard((node_id, keyword))
+                if not parents:
+                    del self.incoming[target]
+        return [target for _, target in edges]
+
+    def refresh(self):
+        """
+        Reloads the tree if another writer changed the file since our last
+        load or save. Ignored inside a transaction.
+        """
+        with self._lock:
+            if self._depth == 0 and self._stat_mtime() != self.mtime:
+                self.load()
+
+    def save(self):
+        with self._lock:
+            # A strict check failing rolls the transaction back like a failed write.
+            if not check_before_save(self.tree, self.check):
+                return False
+            try:
+                _atomic_write_json(self.path, self.tree)
+                self.mtime = self._stat_mtime()
+                return True
+            except Exception as e:
+                print(f"Error saving tree: {e}")
+                return False
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups edits so they are written once, atomically, when the outermost
+        transaction exits. An exception or a failed write rolls back every
+        edit made in the transaction.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self.refresh()
+                self._journal = {}
+                self._saved = {}
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                journal, self._journal = self._journal, None
+                self._last_save_ok = self.save() if journal else True
+                if self._last_save_ok:
+                    self._saved = journal
+                else:
+                    self._journal = journal
+                    self._rollback()
+
+    def saved_changes(self):
+        """
+        Returns (added, changed, removed, edge targets) for the last
+        transaction written: the ids of the nodes it touched and the
+        targets of every edge it added or removed.
+        """
+        with self._lock:
+            added, changed, removed, targets = [], [], [], set()
+            for node_id, original in self._saved.items():
+                current = self.tree.get(node_id)
+                if current is None:
+                    removed.append(node_id)
+                elif original is _MISSING:
+                    added.append(node_id)
+                else:
+                    changed.append(node_id)
+                for node_data in (original, current):
+                    if node_data is not _MISSING and node_data is not None:
+                        targets.update(target for _, target in _edges(node_data))
+            return added, changed, removed, targets
 
-    if node_id not in tree:
-        return f"Node '{node_id}' not found."
+    def _rollback(self):
+        for node_id, original in self._journal.items():
+            current = self.tree.pop(node_id, None)
+            if current is not None:
+                self._unindex_edges(node_id, current)
+            if original is not _MISSING:
+                self.tree[node_id] = original
+                self._index_edges(node_id, original)
+        self._journal = None
 
-    del tree[node_id]
+    def _touch(self, node_id):
+        # Remember a node's state the first time a transaction modifies it.
+        if node_id not in self._journal:
+            original = self.tree.get(node_id, _MISSING)
+            self._journal[node_id] = original if original is _MISSING else copy.deepcopy(original)
 
-    # Remove references from other nodes
-    for nid, ndata in tree.items():
-        if 'edges' in ndata:
-            to_remove = [k for k, v in ndata['edges'].items() if v == node_id]
-            for key in to_remove:
-                del ndata['edges'][key]
+    def _result(self, ok_msg, fail_msg):
+        if self._depth == 0 and not self._last_save_ok:
+            return fail_msg
+        return ok_msg
 
-    success = save_tree(tree)
-    return f"Node '{node_id}' deleted." if success else "Failed to save changes."
+    def get_node(self, node_id):
+        return self.tree.get(node_id)
+
+    def list_nodes(self):
+        return list(self.tree.keys())
+
+    def incoming_edges(self, node_id):
+        """
+        Returns the (parent id, keyword) pairs of every edge pointing at
+        node_id. Takes no lock: the set is copied in one C call, so another
+        thread editing the tree meanwhile is not waited for.
+        """
+        return sorted(self.incoming.get(node_id, ()))
+
+    def add_node(self, node_id, prompt=None, response=None, edges=None, terminal=False):
+        with self.transaction():
+            if node_id in self.tree:
+                return f"Node '{node_id}' already exists."
+
+            node_data = {}
+            if terminal:
+                node_data['response'] = response or "Response here."
+                node_data['terminal'] = True
+            else:
+                node_data['prompt'] = prompt or "Prompt here."
+                node_data['edges'] = edges or {}
+
+            self._touch(node_id)
+            self.tree[node_id] = node_data
+            self._index_edges(node_id, node_data)
+        return self._result(f"Node '{node_id}' added.", "Failed to save tree.")
+
+    def edit_node(self, node_id, updates):
+        with self.transaction():
+            node = self.tree.get(node_id)
+            if not node:
+                return f"Node '{node_id}' not found."
+
+            self._touch(node_id)
+            self._unindex_edges(node_id, node)
+            node = self.tree[node_id] = {**node, **updates}
+            self._index_edges(node_id, node)
+        return self._result(f"Node '{node_id}' updated.", "Failed to save changes.")
+
+    def delete_node(self, node_id):
+        with self.transaction():
+            if node_id not in self.tree:
+                return f"Node '{node_id}' not found."
+
+            self._touch(node_id)
+            self._unindex_edges(node_id, self.tree.pop(node_id))
+
+            # Remove references from other nodes, found through the incoming-edge index
+            for parent, keyword in self.incoming.pop(node_id, ()):
+                self._touch(parent)
+                parent_data = self.tree[parent]
+                edges = {k: v for k, v in parent_data['edges'].items() if k != keyword}
+                self.tree[parent] = {**parent_data, 'edges': edges}
+        return self._result(f"Node '{node_id}' deleted.", "Failed to save changes.")
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+def get_repository(path=None):
+    """
+    Returns the shared repository for path (defaults to WORKFLOW_PATH).
+    """
+    path = os.path.realpath(path or WORKFLOW_PATH)
+    with _repositories_lock:
+        repo = _repositories.get(path)
+        if repo is None:
+            repo = _repositories[path] = WorkflowRepository(path)
+        return repo
+
+def add_node(node_id, prompt=None, response=None, edges=None, terminal=False):
+    return get_repository().add_node(node_id, prompt=prompt, response=response, edges=edges, terminal=terminal)
+
+def edit_node(node_id, updates):
+    return get_repository().edit_node(node_id, updates)
+
+def delete_node(node_id):
+    return get_repository().delete_node(node_id)
 
 def list_nodes():
-    tree = load_tree()
-    return list(tree.keys())
\ No newline at end of file
+    repo = get_repository()
+    repo.refresh()
+    return repo.list_nodes()
+
+def incoming_edges(node_id):
+    repo = get_repository()
+    repo.refresh()
+    return repo.incoming_edges(node_id)
@@ -1,13 +1,29 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, messagebox
 import datetime
-import threading
+import argparse
 from chatbot.engine import ChatbotEngine
+from chatbot.profiler import add_profile_arguments, setup_profiling
+from chatbot.transcript import SCROLLBACK
+from chatbot.tk_widgets import ChatTranscript
+from chatbot.worker import EngineWorker
+
+# How often replies are picked up while messages are being answered
+RESPONSE_POLL_MS = 50
 
 class ModernChatbotGUI:
-    def __init__(self):
+    def __init__(self, profile=None, profile_output=None, scrollback=SCROLLBACK):
         self.root = tk.Tk()
+        # Messages kept in the chat widget; older ones are paged in on scroll
+        self.scrollback = scrollback
         self.engine = ChatbotEngine()
+        # Pick up edits made with the admin tools without restarting
+        self.engine.enable_hot_reload()
+        # --profile, TROUBLESHOOTER_PROFILE or the admin tool's profile command
+        self.profiling = setup_profiling(self.engine, profile, profile_output)
+        # Answers messages one at a time, in the order they were sent
+        self.worker = EngineWorker(self.engine)
+        self._drain_job = None
         self.setup_window()
         self.setup_styles()
         self.create_widgets()
@@ -153,15 +169,15 @@ class ModernChatbotGUI:
                                   relief='solid')
         chat_frame.pack(fill='both', expand=True, pady=(0, 10))
         
-        # Chat display with scrollbar
-        self.chat_display = scrolledtext.ScrolledText(chat_frame,
-                                                     wrap=tk.WORD,
-                                                     font=('Consolas', 11),
-                                                     bg=self.colors['chat_bg'],
-                                                     fg='#2C3E50',
-                                                     state='disabled',
-                                                     borderwidth=0,
-                                                     highlightthickness=0)
+        # Chat display with scrollbar; the whole conversation lives in its transcript
+        self.chat_display = ChatTranscript(chat_frame,
+                                           scrollback=self.scrollback,
+                                           wrap=tk.WORD,
+                                           font=('Consolas', 11),
+                                           bg=self.colors['chat_bg'],
+                                           fg='#2C3E50',
+                                           borderwidth=0,
+                                           highlightthickness=0)
         self.chat_display.pack(fill='both', expand=True, padx=5, pady=5)
         
         # Configure text tags for different message types
@@ -268,23 +284,8 @@ class ModernChatbotGUI:
         
     def add_message(self, sender, message):
         """Add a message to the chat display"""
-        self.chat_display.config(state='normal')
-        
-        # Add timestamp
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.chat_display.insert(tk.END, f"[{timestamp}] ", 'timestamp')
-        
-        # Add sender and message
-        if sender == "You":
-            self.chat_display.insert(tk.END, f"👤 You: ", 'user')
-        else:
-            self.chat_display.insert(tk.END, f"🤖 Bot: ", 'bot')
-            
-        self.chat_display.insert(tk.END, f"{message}\n\n")
-        
-        # Auto-scroll to bottom
-        self.chat_display.see(tk.END)
-        self.chat_display.config(state='disabled')
+        # Stamped, rendered and auto-scrolled to the bottom by the widget
+        self.chat_display.add_message(sender, message)
         
     def send_message(self):
         """Send message and get response"""
@@ -298,36 +299,38 @@ class ModernChatbotGUI:
         # Clear input
         self.input_text.delete("1.0", tk.END)
         
-        # Update status
-        self.update_status("Processing...", '#F39C12')
-        
-        # Disable send button
-        self.send_button.config(state='disabled')
-        
-        # Process in separate thread to avoid blocking GUI
-        threading.Thread(target=self.process_message, args=(message,), daemon=True).start()
+        # Queue for the engine worker; messages sent while others wait are answered in order
+        self.worker.submit(message)
+        self.show_pending()
+        if self._drain_job is None:
+            self._drain_job = self.root.after(RESPONSE_POLL_MS, self.drain_responses)
+        
+    def drain_responses(self):
+        """Show every reply the worker has ready, in the main thread"""
+        self._drain_job = None
+        for _, _, response, error in self.worker.drain():
+            if error is not None:
+                response = f"Sorry, I encountered an error: {str(error)}"
+            self.add_message("Bot", response)
+        if self.worker.pending:
+            self.show_pending()
+            self._drain_job = self.root.after(RESPONSE_POLL_MS, self.drain_responses)
+        else:
+            self.update_status("Ready", '#2ECC71')
+            self.input_text.focus_set()
         
-    def process_message(self, message):
-        """Process message in separate thread"""
-        try:
-            response = self.engine.respond(message)
-            self.root.after(0, self.handle_response, response)
-        except Exception as e:
-            error_msg = f"Sorry, I encountered an error: {str(e)}"
-            self.root.after(0, self.handle_response, error_msg)
-            
-    def handle_response(self, response):
-        """Handle bot response in main thread"""
-        self.add_message("Bot", response)
-        self.update_status("Ready", '#2ECC71')
-        self.send_button.config(state='normal')
-        self.input_text.focus_set()
+    def show_pending(self):
+        """Show how many messages are waiting for a reply"""
+        pending = self.worker.pending
+        queued = f" ({pending} queued)" if pending > 1 else ""
+        self.update_status(f"Processing...{queued}", '#F39C12')
         
     def clear_chat(self):
         """Clear the chat display"""
-        self.chat_display.config(state='normal')
-        self.chat_display.delete("1.0", tk.END)
-        self.chat_display.config(state='disabled')
+        # Replies to messages that are no longer shown are dropped
+        self.worker.cancel()
+        self.update_status("Ready", '#2ECC71')
+        self.chat_display.clear()
         self.add_welcome_message()
         
     def export_chat(self):
@@ -339,9 +342,9 @@ class ModernChatbotGUI:
                 filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
             )
             if filename:
-                chat_content = self.chat_display.get("1.0", tk.END)
+                # Streamed from the transcript: includes messages scrolled out of the widget
                 with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(chat_content)
+                    self.chat_display.transcript.write(f)
                 messagebox.showinfo("Success", f"Chat exported to {filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export chat: {str(e)}")
@@ -364,10 +367,21 @@ class ModernChatbotGUI:
     def run(self):
         """Run the application"""
         self.input_text.focus_set()  # Focus on input field
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.worker.stop(timeout=1.0)
+            path = self.profiling.stop()
+            if path:
+                print(f"Profile written to {path}")
 
-def main():
-    app = ModernChatbotGUI()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Troubleshooter chat window")
+    parser.add_argument('--scrollback', type=int, default=SCROLLBACK,
+                        help=f"messages kept in the chat window; older ones load on scroll (default {SCROLLBACK})")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    app = ModernChatbotGUI(args.profile, args.profile_output, args.scrollback)
     app.run()
 
 if __name__ == '__main__':
@@ -1,24 +1,39 @@
+import argparse
 import sys
 from chatbot.engine import ChatbotEngine
+from chatbot.profiler import add_profile_arguments, setup_profiling
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Troubleshooter command-line chat")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
     print("\n==============================")
     print(" Welcome to Smart Troubleshooter")
     print("==============================")
     print("Type 'exit' to quit.\n")
 
     engine = ChatbotEngine()
-
-    while True:
-        user_input = input("You: ").strip()
-
-        if user_input.lower() in ['exit', 'quit']:
-            print("\nBot: Goodbye! Stay safe.")
-            break
-
-        response = engine.respond(user_input)
-        print(f"Bot: {response}\n")
+    # Pick up edits made with the admin tools without restarting
+    engine.enable_hot_reload()
+    # Also lets the admin tool switch profiling on and off at runtime
+    profiling = setup_profiling(engine, args.profile, args.profile_output)
+
+    try:
+        while True:
+            user_input = input("You: ").strip()
+
+            if user_input.lower() in ['exit', 'quit']:
+                print("\nBot: Goodbye! Stay safe.")
+                break
+
+            response = engine.respond(user_input)
+            print(f"Bot: {response}\n")
+    finally:
+        path = profiling.stop()
+        if path:
+            print(f"Profile written to {path}")
 
 
 if __name__ == "__main__":
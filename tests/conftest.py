@@ -0,0 +1,9 @@
+"""
+Makes the chatbot package and the benchmark scripts importable; run the
+suite from the project root with `python -m pytest`.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
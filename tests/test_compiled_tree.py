@@ -0,0 +1,40 @@
+import json
+import os
+import pytest
+from chatbot.compiled_tree import _HEADER, _SECTIONS, compiled_path_for, load_compiled
+
+TREE = {
+    'root': {'prompt': "What issue are you facing?", 'edges': {'wifi': 'wifi_issue'}},
+    'wifi_issue': {'response': "Restart the router.", 'terminal': True},
+}
+
+
+def damage_truncate(path):
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 13)
+
+
+def damage_offsets(path):
+    # Overwrites the header's section offsets with garbage.
+    with open(path, 'r+b') as f:
+        f.seek(_HEADER.size - 8 * len(_SECTIONS))
+        f.write(b'\xff' * 24)
+
+
+@pytest.mark.parametrize('damage', [damage_truncate, damage_offsets])
+def test_corrupt_compiled_tree_is_rebuilt(tmp_path, damage):
+    json_path = str(tmp_path / 'tree.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(TREE, f)
+    load_compiled(json_path).close()
+    bin_path = compiled_path_for(json_path)
+    size = os.path.getsize(bin_path)
+    damage(bin_path)
+
+    tree = load_compiled(json_path)
+    try:
+        assert list(tree) == ['root', 'wifi_issue']
+        assert dict(tree['root']['edges']) == {'wifi': 'wifi_issue'}
+    finally:
+        tree.close()
+    assert os.path.getsize(bin_path) == size
@@ -0,0 +1,13 @@
+import random
+import stress_engine_worker as stress
+
+
+def test_replies_ordered_and_consistent_under_load():
+    messages = stress.make_messages(200, random.Random(25))
+    expected, session = stress.sequential(messages)
+    assert stress.run_ordered(messages, expected, session, typists=4, poll=0.005)
+
+
+def test_cancel_drops_every_stale_reply():
+    messages = stress.make_messages(200, random.Random(26))
+    assert stress.run_cancel(messages, poll=0.005)
@@ -0,0 +1,8 @@
+import bench_normalize
+from chatbot.graph import DEFAULT_WORKFLOW_PATH, WorkflowGraph
+
+
+def test_corpus_through_respond():
+    graph = WorkflowGraph.from_file(DEFAULT_WORKFLOW_PATH, compiled=False, strict=True)
+    failures = bench_normalize.check_corpus(bench_normalize.load_corpus(), graph)
+    assert not failures, [(case['stage'], case['input'], got) for case, got in failures]
@@ -0,0 +1,55 @@
+from chatbot import engine as engine_module
+from chatbot.engine import ChatbotEngine
+from chatbot.metrics import OUTCOMES, WorkerMetrics, parse, render
+
+
+def test_every_engine_outcome_is_counted():
+    # Outcome constants are the module's NAME = 'name' strings.
+    outcomes = {value for name, value in vars(engine_module).items()
+                if name.isupper() and isinstance(value, str) and value == name.lower()}
+    assert len(outcomes) == 7
+    assert outcomes <= set(OUTCOMES)
+
+
+def test_retrieval_jump_is_exported():
+    engine = ChatbotEngine()
+    engine.enable_metrics()
+    assert engine.respond("battery draining")
+    assert engine.metrics.snapshot()['outcomes']['jump'] == 1
+    text = render(engine)
+    assert 'chatbot_turns_total{outcome="jump"} 1' in text
+    assert 'chatbot_retrieval_jumps_total 1' in text
+
+
+class _FakeWorkers(WorkerMetrics):
+    # Serves canned expositions instead of scraping worker ports.
+    def __init__(self, expositions):
+        super().__init__(range(len(expositions)))
+        self.expositions = expositions
+
+    def _scrape(self, url):
+        text = self.expositions[self.urls.index(url)]
+        if text is None:
+            raise ConnectionRefusedError(url)
+        return parse(text)
+
+
+def _exposition(messages, started):
+    return (f"# HELP chatbot_messages_total Messages.\n# TYPE chatbot_messages_total counter\n"
+            f"chatbot_messages_total {messages}\n"
+            f"# HELP chatbot_tree_nodes Nodes.\n# TYPE chatbot_tree_nodes gauge\nchatbot_tree_nodes 17\n"
+            f"# HELP chatbot_start_time_seconds Start.\n# TYPE chatbot_start_time_seconds gauge\n"
+            f"chatbot_start_time_seconds {started}\n")
+
+
+def test_worker_totals_survive_a_replaced_worker():
+    workers = _FakeWorkers([_exposition(10, 1.5), _exposition(5, 2.5)])
+    text = workers.render()
+    assert 'chatbot_messages_total 15' in text
+    assert 'chatbot_tree_nodes 17' in text
+    assert 'chatbot_start_time_seconds 1.5' in text
+    workers.expositions[1] = None
+    assert 'chatbot_messages_total 15' in workers.render()
+    assert 'chatbot_workers_up 1' in workers.render()
+    workers.expositions[1] = _exposition(2, 9.0)
+    assert 'chatbot_messages_total 17' in workers.render()
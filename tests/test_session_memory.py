@@ -0,0 +1,6 @@
+import bench_session_memory
+
+
+def test_session_memory_within_budget():
+    _, _, per_session, _ = bench_session_memory.measure(2000)
+    assert per_session <= bench_session_memory.DEFAULT_BUDGET
@@ -0,0 +1,22 @@
+import sqlite3
+import time
+from chatbot.session import Session
+from chatbot.session_store import SQLiteSessionStore
+
+
+def test_idle_store_flushes_pending_writes(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SQLiteSessionStore(path, flush_interval=0.05)
+    try:
+        store.put(Session('alice'))
+        # No further put() comes; the flush thread has to commit it.
+        deadline = time.monotonic() + 5
+        with sqlite3.connect(path) as conn:
+            while True:
+                rows = conn.execute("SELECT session_id FROM sessions").fetchall()
+                if rows or time.monotonic() > deadline:
+                    break
+                time.sleep(0.02)
+        assert rows == [('alice',)]
+    finally:
+        store.close()
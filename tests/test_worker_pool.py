@@ -0,0 +1,51 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+from conftest import ROOT
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="worker mode needs os.fork")
+
+
+def chat(port, session_id, text):
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+        stream = sock.makefile('rwb')
+        stream.write(f"{session_id}\t{text}\n".encode('utf-8'))
+        stream.flush()
+        return json.loads(stream.readline())['response']
+
+
+def workers_of(pid):
+    out = subprocess.run(['pgrep', '-P', str(pid)], capture_output=True, text=True).stdout
+    return sorted(int(p) for p in out.split())
+
+
+def test_dead_worker_is_replaced():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, '-m', 'chatbot.server', '--port', str(port), '--workers', '2'],
+                              cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        assert server.stdout.readline().startswith("Serving on")
+        before = workers_of(server.pid)
+        assert len(before) == 2
+        os.kill(before[0], signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            after = workers_of(server.pid)
+            if len(after) == 2 and before[0] not in after:
+                break
+            time.sleep(0.1)
+        assert len(after) == 2 and before[0] not in after
+        # Sessions of both workers are answered, forwarded ones included.
+        for i in range(8):
+            assert not chat(port, f"user{i}", "wifi").startswith("Sorry, I encountered an error")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.communicate(timeout=10)
+    assert server.returncode == 0